@@ -21,20 +21,250 @@
 # SOFTWARE.
 
 import argparse
-from lsdscc import HypothesisSet, ReferenceSet
-from lsdscc import compute_score_on_corpus
+import json
+import os
+import sys
+
+
+def print_scores(scores, fmt=None, intervals=None, tests=None):
+    from lsdscc.systems import format_score_table
+
+    if fmt is None and len(scores) == 1:
+        ((name, score),) = scores.items()
+        interval = intervals and intervals[name]
+        for header, field in (('MaxBLEU', 'max_bleu'), ('MDS', 'mds'), ('PDS', 'pds')):
+            if interval:
+                print('%s: %f [%f, %f]' % (header, getattr(score, field), getattr(interval.low, field),
+                                           getattr(interval.high, field)))
+            else:
+                print('%s: %f' % (header, getattr(score, field)))
+    else:
+        sys.stdout.write(format_score_table(scores, fmt or 'text', intervals, tests))
+
+
+def merge_main(argv):
+    parser = argparse.ArgumentParser(prog='lsdscc_metrics.py merge',
+                                     description='merge the partial aggregates of the shards of a run')
+    parser.add_argument('partial_file', nargs='+', help='files written by --shard, one per shard')
+    parser.add_argument('--format', '-f', choices=('text', 'json', 'csv'),
+                        help='print a table with a row per system in this format. '
+                             'default to text if several systems are given')
+    args = parser.parse_args(argv)
+
+    from lsdscc.shard import load_partial, merge_partials
+
+    try:
+        merged = merge_partials([load_partial(filename) for filename in args.partial_file])
+    except (OSError, ValueError, KeyError) as e:
+        parser.error(str(e))
+    print_scores({name: accumulator.mean() for name, accumulator in merged.items()}, args.format)
+
 
 if __name__ == '__main__':
-    parser = argparse.ArgumentParser(description='evaluate diversity oriented metrics of LSDSCC')
-    parser.add_argument('hypothesis_file', help='file containing responses to be evaluated')
+    # A hypothesis file named merge must be given as ./merge, or after other files.
+    if sys.argv[1:2] == ['merge']:
+        merge_main(sys.argv[2:])
+        sys.exit(0)
+
+    parser = argparse.ArgumentParser(description='evaluate diversity oriented metrics of LSDSCC. '
+                                                 'run "%(prog)s merge -h" to merge the outputs of --shard. '
+                                                 'a first hypothesis file named merge must be given as ./merge')
+    parser.add_argument('hypothesis_file', nargs='+',
+                        help='files containing responses to be evaluated, one per system. '
+                             'glob patterns are expanded. "-" means stdin')
     parser.add_argument('--eos', '-e', help='end-of-sentence indicator to use in the response file')
     parser.add_argument('--reference_file', '-r', help='custom reference corpus to use. (in json format)')
+    parser.add_argument('--jobs', '-j', type=int, default=1,
+                        help='number of worker processes. -1 means all the CPUs')
+    parser.add_argument('--cache_dir', help='where to cache compiled reference corpora. '
+                                            'default to $LSDSCC_CACHE_DIR or ~/.cache/lsdscc')
+    parser.add_argument('--no_cache', action='store_true',
+                        help='parse the json reference corpus without the cache')
+    parser.add_argument('--score_cache', help='sqlite file to cache the scores of hypotheses across runs')
+    parser.add_argument('--score_cache_size', type=int, default=1000000,
+                        help='max number of entries in the score cache')
+    parser.add_argument('--prune', action='store_true',
+                        help='skip the reference groups that cannot be the best one of a hypothesis. '
+                             'helps with many groups per query')
+    parser.add_argument('--format', '-f', choices=('text', 'json', 'csv'),
+                        help='print a table with a row per system in this format. '
+                             'default to text if several systems are given')
+    parser.add_argument('--export', help='write the scores of each query and the alignment of each hypothesis '
+                                         'to this file while scoring. a single hypothesis file only')
+    parser.add_argument('--export_format', choices=('jsonl', 'csv', 'npz'),
+                        help='format of --export. default to the suffix of the file')
+    parser.add_argument('--confidence_interval', '--ci', action='store_true',
+                        help='report the bootstrap confidence interval of each score')
+    parser.add_argument('--significance', choices=('bootstrap', 'randomization'),
+                        help='test each system against the first one with the paired bootstrap '
+                             'or approximate randomization and report the p-values')
+    parser.add_argument('--resamples', type=int, default=1000,
+                        help='number of resamples of the confidence intervals and the tests')
+    parser.add_argument('--confidence', type=float, default=0.95,
+                        help='confidence level of the intervals')
+    parser.add_argument('--seed', type=int, default=0, help='random seed of the resampling')
+    parser.add_argument('--sample', type=int,
+                        help='estimate the scores from a stratified sample of this many queries, '
+                             'reported with their standard errors. a single hypothesis file only')
+    parser.add_argument('--target_error', type=float,
+                        help='grow the sample until the standard error of every score is at most this')
+    parser.add_argument('--stratify', choices=('groups', 'references', 'none'), default='groups',
+                        help='stratify the sample by the number of groups or references of each query')
+    parser.add_argument('--shard', help='score only shard i/N (i from 0) of the queries and write its partial '
+                                        'aggregate in json, to be combined by the merge subcommand')
+    parser.add_argument('--shard_output', default='-', help='where to write the partial aggregate. default to stdout')
+    parser.add_argument('--profile', action='store_true',
+                        help='report the time of each stage and the slowest queries in json to stderr')
+    parser.add_argument('--profile_output', help='write the profile to this file instead. implies --profile')
+    parser.add_argument('--profile_slowest', type=int, default=10,
+                        help='number of slowest queries in the profile')
+    parser.add_argument('--profile_memory', action='store_true',
+                        help='also trace the peak memory with tracemalloc. slow')
     args = parser.parse_args()
 
-    hypothesis_corpus = HypothesisSet.load_corpus(args.hypothesis_file, args.eos)
-    reference_corpus = ReferenceSet.load_json_corpus(args.reference_file)
-    score = compute_score_on_corpus(hypothesis_corpus, reference_corpus)
+    # Imported after the arguments are parsed so that --help and usage errors are fast.
+    from lsdscc import HypothesisSet, ReferenceSet
+    from lsdscc.compiled import load_cached_reference_corpus
+    from lsdscc.instrument import Profiler
+    from lsdscc.systems import compute_query_scores_on_files, compute_score_on_files, expand_hypothesis_files
+
+    try:
+        hypothesis_files = expand_hypothesis_files(args.hypothesis_file)
+    except ValueError as e:
+        parser.error(str(e))
+    if args.jobs == 0:
+        parser.error('--jobs must be positive or -1')
+    if args.export and (len(hypothesis_files) > 1 or args.jobs != 1):
+        parser.error('--export takes a single hypothesis file and --jobs 1')
+    if args.export and not args.export_format:
+        args.export_format = os.path.splitext(args.export)[1].lstrip('.')
+        if args.export_format not in ('jsonl', 'csv', 'npz'):
+            parser.error('cannot tell the format of --export %s, use --export_format' % args.export)
+    resampling = args.confidence_interval or args.significance
+    if resampling and args.export:
+        parser.error('--export cannot be combined with --confidence_interval or --significance')
+    if args.significance and len(hypothesis_files) < 2:
+        parser.error('--significance takes at least two hypothesis files')
+    if args.shard:
+        from lsdscc.shard import parse_shard
+        try:
+            shard, n_shards = parse_shard(args.shard)
+        except ValueError as e:
+            parser.error(str(e))
+        if resampling or args.export:
+            parser.error('--shard cannot be combined with --export, --confidence_interval or --significance')
+        if '-' in hypothesis_files:
+            parser.error('--shard needs hypothesis files, not stdin')
+    sampling = args.sample is not None or args.target_error is not None
+    if sampling:
+        if len(hypothesis_files) > 1 or '-' in hypothesis_files:
+            parser.error('--sample and --target_error take a single hypothesis file, not stdin')
+        if resampling or args.export or args.shard:
+            parser.error('--sample and --target_error cannot be combined with --export, --shard, '
+                         '--confidence_interval or --significance')
+        if args.sample is not None and args.sample < 1 or args.target_error is not None and args.target_error <= 0:
+            parser.error('--sample and --target_error must be positive')
+    if not 0 < args.confidence < 1:
+        parser.error('--confidence must be between 0 and 1')
+    if args.resamples < 1:
+        parser.error('--resamples must be positive')
+
+    profiler = None
+    if args.profile or args.profile_output or args.profile_memory:
+        profiler = Profiler(args.profile_slowest, args.profile_memory)
+        profiler.start()
+
+    cache = None
+    if args.score_cache:
+        from lsdscc.cache import ScoreCache
+        cache = ScoreCache(args.score_cache, args.score_cache_size)
+
+    reference_digest = None
+    if args.shard:
+        from lsdscc.compiled import file_digest
+        from lsdscc.data import default_reference_set
+        # Recorded in the partial aggregate. The cache is keyed by the same digest.
+        reference_digest = file_digest(args.reference_file or default_reference_set)
+
+    if args.no_cache:
+        if args.shard or sampling:
+            # The number of queries is needed to find the shard or the sample.
+            reference_corpus = ReferenceSet.load_json_corpus(args.reference_file)
+        else:
+            reference_corpus = ReferenceSet.iter_json_corpus(args.reference_file)
+    else:
+        reference_corpus = load_cached_reference_corpus(args.reference_file, args.cache_dir, reference_digest)
+
+    # The reference corpus is loaded and indexed once for all the systems. When serial, the
+    # corpora are streamed so that only one query is held in memory.
+    if args.shard:
+        from lsdscc.shard import Partial, save_partial, score_shard
+        # The files are memory-mapped so that only the lines of the shard are read.
+        accumulators = score_shard({filename: HypothesisSet.open_corpus(filename, args.eos)
+                                    for filename in hypothesis_files},
+                                   reference_corpus, shard, n_shards, n_jobs=args.jobs, cache=cache,
+                                   prune=args.prune)
+        save_partial(args.shard_output,
+                     Partial(shard, n_shards, len(reference_corpus), reference_digest, accumulators))
+    elif sampling:
+        from lsdscc.sampling import DEFAULT_SAMPLE_SIZE, estimate_score_on_corpus
+        # Only the lines of the sampled queries are read.
+        estimate = estimate_score_on_corpus(HypothesisSet.open_corpus(hypothesis_files[0], args.eos),
+                                            reference_corpus, args.sample or DEFAULT_SAMPLE_SIZE,
+                                            args.target_error, None if args.stratify == 'none' else args.stratify,
+                                            seed=args.seed, n_jobs=args.jobs, cache=cache, prune=args.prune)
+    elif args.export:
+        from lsdscc.export import export_results_on_corpus
+        score = export_results_on_corpus(HypothesisSet.iter_corpus(hypothesis_files[0], args.eos),
+                                         reference_corpus, args.export, args.export_format,
+                                         cache=cache, prune=args.prune)
+        scores = {hypothesis_files[0]: score}
+    elif resampling:
+        # The scores of each query are computed once and then resampled.
+        query_scores = compute_query_scores_on_files(hypothesis_files, reference_corpus, args.eos,
+                                                     n_jobs=args.jobs, cache=cache, prune=args.prune)
+    else:
+        scores = compute_score_on_files(hypothesis_files, reference_corpus, args.eos, n_jobs=args.jobs,
+                                        cache=cache, prune=args.prune)
+
+    if profiler is not None:
+        profiler.stop()
+
+    intervals = tests = None
+    if resampling:
+        from lsdscc.significance import SIGNIFICANCE_TESTS, bootstrap_confidence_interval
+        from lsdscc.metrics import ScoreAccumulator
+        scores = {}
+        for name, values in query_scores.items():
+            accumulator = ScoreAccumulator()
+            for score in values:
+                accumulator.add(score)
+            scores[name] = accumulator.mean()
+        if args.confidence_interval:
+            intervals = {name: bootstrap_confidence_interval(values, args.resamples, args.confidence, args.seed)
+                         for name, values in query_scores.items()}
+        if args.significance:
+            test = SIGNIFICANCE_TESTS[args.significance]
+            baseline = query_scores[hypothesis_files[0]]
+            tests = {name: test(baseline, values, args.resamples, args.seed)
+                     for name, values in query_scores.items() if name != hypothesis_files[0]}
+
+    if sampling:
+        for header, field in (('MaxBLEU', 'max_bleu'), ('MDS', 'mds'), ('PDS', 'pds')):
+            print('%s: %f +- %f' % (header, getattr(estimate.score, field), getattr(estimate.standard_error, field)))
+        print('estimated on %d of %d queries' % (estimate.n_sampled, estimate.n_queries), file=sys.stderr)
+    elif not args.shard:
+        print_scores(scores, args.format, intervals, tests)
+
+    if cache is not None:
+        cache.close()
+        print('score cache: %(hits)d hits, %(misses)d misses, hit rate %(hit_rate).3f' % cache.stats(),
+              file=sys.stderr)
 
-    print('MaxBLEU: %f' % score.max_bleu)
-    print('MDS: %f' % score.mds)
-    print('PDS: %f' % score.pds)
+    if profiler is not None:
+        if args.profile_output:
+            with open(args.profile_output, 'w') as f:
+                json.dump(profiler.report(), f, indent=2)
+        else:
+            json.dump(profiler.report(), sys.stderr, indent=2)
+            print(file=sys.stderr)
@@ -20,8 +20,81 @@
 # OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
 # SOFTWARE.
 
-from lsdscc.metrics import *
-from lsdscc.ds import *
-from lsdscc.data import default_reference_set
+"""
+The submodules and their public names are loaded on first access (PEP 562), so that importing
+the package (e.g., for ``--help`` of the command line script) does not import numpy.
+"""
+import importlib
 
 __version__ = "0.3.6"
+
+_LAZY_NAMES = {
+    "LSDSCCScore": "lsdscc.metrics",
+    "QueryResult": "lsdscc.metrics",
+    "compute_score_on_hypothesis_set": "lsdscc.metrics",
+    "compute_result_on_hypothesis_set": "lsdscc.metrics",
+    "compute_score_on_corpus": "lsdscc.metrics",
+    "compute_score_on_systems": "lsdscc.metrics",
+    "compute_query_scores_on_systems": "lsdscc.metrics",
+    "iter_scores_on_corpus": "lsdscc.metrics",
+    "iter_results_on_corpus": "lsdscc.metrics",
+    "ScoreAccumulator": "lsdscc.metrics",
+    "ascore_corpus": "lsdscc.aio",
+    "aiter_scores_on_corpus": "lsdscc.aio",
+    "HypothesisSet": "lsdscc.ds",
+    "ReferenceSet": "lsdscc.ds",
+    "ReferenceIndex": "lsdscc.index",
+    "Profiler": "lsdscc.instrument",
+    "default_reference_set": "lsdscc.data",
+}
+
+# The submodules that are imported on first access as attributes of the package, like
+# ``lsdscc.metrics`` after ``import lsdscc``.
+_SUBMODULES = frozenset(
+    [
+        "aio",
+        "align",
+        "batch",
+        "bleu",
+        "cache",
+        "compact",
+        "compiled",
+        "data",
+        "details",
+        "ds",
+        "export",
+        "index",
+        "instrument",
+        "mapped",
+        "memo",
+        "metrics",
+        "multi_bleu",
+        "nltk_compat",
+        "parallel",
+        "sampling",
+        "server",
+        "shard",
+        "significance",
+        "systems",
+    ]
+)
+
+__all__ = list(_LAZY_NAMES)
+
+
+def __getattr__(name):
+    try:
+        module = _LAZY_NAMES[name]
+    except KeyError:
+        if name in _SUBMODULES:
+            return importlib.import_module(__name__ + "." + name)
+        raise AttributeError(
+            "module %r has no attribute %r" % (__name__, name)
+        ) from None
+    value = getattr(importlib.import_module(module), name)
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(_LAZY_NAMES))
@@ -0,0 +1,264 @@
+# MIT License
+#
+# Copyright (c) 2019 Cong Feng.
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+"""
+The asyncio module: coroutine variants of the metric functions that do not block the
+event loop.
+
+The queries are scored in chunks on an executor (the default executor of the loop unless
+one is given). At most ``max_pending`` chunks are in flight and no more of the corpora is
+read until one of them finishes, so a slow consumer holds the producer back. When the
+iteration is cancelled or closed, the chunks that have not started are cancelled.
+"""
+import asyncio
+import collections
+import copy
+import functools
+
+from lsdscc.metrics import ScoreAccumulator, compute_score_on_hypothesis_set
+
+__all__ = [
+    "ascore_hypothesis_set",
+    "aiter_scores_on_corpus",
+    "ascore_corpus",
+]
+
+DEFAULT_CHUNK_SIZE = 16
+DEFAULT_MAX_PENDING = 8
+
+
+async def ascore_hypothesis_set(
+    hypothesis_set,
+    reference_set,
+    aligner=None,
+    index=None,
+    cache=None,
+    prune=False,
+    executor=None,
+):
+    """
+    Compute the three metrics on a hypothesis set on an executor.
+    See ``compute_score_on_hypothesis_set``.
+
+    :param executor: an optional ``concurrent.futures.Executor``. Default to the default
+    executor of the event loop.
+    :return: LSDSCCScore.
+    """
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(
+        executor,
+        functools.partial(
+            compute_score_on_hypothesis_set,
+            hypothesis_set,
+            reference_set,
+            aligner,
+            index,
+            cache,
+            prune,
+        ),
+    )
+
+
+def _score_chunk(chunk, aligner, cache, prune):
+    """
+    Score a chunk of (query_id, hypothesis_set, reference_set) on an executor.
+
+    :return: (a list of (query_id, LSDSCCScore), cache_stats)
+    """
+    if cache is not None:
+        # A connection of our own, whether the worker is a process or a thread.
+        cache = copy.copy(cache)
+    try:
+        scores = [
+            (
+                query_id,
+                compute_score_on_hypothesis_set(
+                    hypothesis_set, reference_set, aligner, cache=cache, prune=prune
+                ),
+            )
+            for query_id, hypothesis_set, reference_set in chunk
+        ]
+    finally:
+        if cache is not None:
+            # The cache it is copied from evicts when it is closed.
+            cache.close(evict=False)
+    cache_stats = (cache.hits, cache.misses) if cache is not None else (0, 0)
+    return scores, cache_stats
+
+
+async def _aiterate(iterable):
+    """
+    Iterate over an iterable or an async iterable.
+    """
+    if hasattr(iterable, "__aiter__"):
+        async for item in iterable:
+            yield item
+    else:
+        for item in iterable:
+            yield item
+
+
+async def _anext(iterator, default):
+    try:
+        return await iterator.__anext__()
+    except StopAsyncIteration:
+        return default
+
+
+async def _achunks(hypothesis_corpus, reference_corpus, chunk_size):
+    """
+    Zip the corpora into chunks of (query_id, hypothesis_set, reference_set).
+    """
+    hypotheses = _aiterate(hypothesis_corpus)
+    references = _aiterate(reference_corpus)
+    missing = object()
+    chunk = []
+    query_id = 0
+    while True:
+        hypothesis_set = await _anext(hypotheses, missing)
+        reference_set = await _anext(references, missing)
+        if hypothesis_set is missing and reference_set is missing:
+            break
+        assert (
+            hypothesis_set is not missing and reference_set is not missing
+        ), "len of hypotheses and references should match!"
+        chunk.append((query_id, hypothesis_set, reference_set))
+        query_id += 1
+        if len(chunk) == chunk_size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+async def aiter_scores_on_corpus(
+    hypothesis_corpus,
+    reference_corpus,
+    aligner=None,
+    cache=None,
+    prune=False,
+    executor=None,
+    chunk_size=DEFAULT_CHUNK_SIZE,
+    max_pending=DEFAULT_MAX_PENDING,
+    ordered=True,
+):
+    """
+    Asynchronously compute the three metrics on each hypothesis set of a corpus,
+    yielding the scores as the chunks of queries finish.
+
+    Both corpora can be iterables or async iterables, e.g., an async generator of the
+    hypothesis sets being generated, so that the evaluation overlaps with the generation.
+    The aligner (and the hypothesis and reference sets) must be picklable if the executor
+    runs processes.
+
+    :param hypothesis_corpus: an iterable or async iterable of hypothesis_set.
+    :param reference_corpus: an iterable or async iterable of reference_set.
+    :param aligner: a callable to compute the semantic similarity of a hypothesis
+    and a list of references.
+    :param cache: an optional ScoreCache to look up the scores of the hypotheses.
+    Each chunk opens its own connection to it.
+    :param prune: whether to prune the groups that cannot be the best one of a hypothesis.
+    See ``compute_score_on_hypothesis_set``.
+    :param executor: an optional ``concurrent.futures.Executor``. Default to the default
+    executor of the event loop.
+    :param chunk_size: the number of queries sent to the executor at a time.
+    :param max_pending: the max number of chunks in flight.
+    :param ordered: whether to yield the scores in the order of the corpus. If False,
+    the scores of a chunk are yielded as soon as it finishes.
+    To stop early, close the iterator with ``aclose()`` (e.g., with ``contextlib.aclosing``)
+    so that the pending chunks are cancelled right away.
+    :return: AsyncIterator[Tuple[int, LSDSCCScore]], the position of each query and its score.
+    """
+    if max_pending < 1:
+        raise ValueError("max_pending must be positive")
+    loop = asyncio.get_running_loop()
+    pending = collections.deque()
+
+    async def next_done():
+        # Wait for the next chunk to finish and return its scores.
+        if ordered:
+            future = pending[0]
+            await asyncio.wait([future])
+            pending.popleft()
+            done = [future]
+        else:
+            done, _ = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for future in done:
+                pending.remove(future)
+        scores = []
+        for future in done:
+            chunk_scores, (hits, misses) = future.result()
+            if cache is not None:
+                cache.hits += hits
+                cache.misses += misses
+            scores.extend(chunk_scores)
+        return scores
+
+    chunks = _achunks(hypothesis_corpus, reference_corpus, chunk_size)
+    try:
+        async for chunk in chunks:
+            while len(pending) >= max_pending:
+                for item in await next_done():
+                    yield item
+            pending.append(
+                loop.run_in_executor(
+                    executor, _score_chunk, chunk, aligner, cache, prune
+                )
+            )
+        while pending:
+            for item in await next_done():
+                yield item
+    finally:
+        for future in pending:
+            future.cancel()
+        await chunks.aclose()
+
+
+async def ascore_corpus(
+    hypothesis_corpus,
+    reference_corpus,
+    aligner=None,
+    cache=None,
+    prune=False,
+    executor=None,
+    chunk_size=DEFAULT_CHUNK_SIZE,
+    max_pending=DEFAULT_MAX_PENDING,
+):
+    """
+    Asynchronously compute the three metrics on a corpus.
+    The result is the same as ``compute_score_on_corpus``.
+    See ``aiter_scores_on_corpus`` for the parameters.
+
+    :return: LSDSCCScore.
+    """
+    accumulator = ScoreAccumulator()
+    async for _, score in aiter_scores_on_corpus(
+        hypothesis_corpus,
+        reference_corpus,
+        aligner,
+        cache,
+        prune,
+        executor,
+        chunk_size,
+        max_pending,
+    ):
+        accumulator.add(score)
+    return accumulator.mean()
@@ -20,7 +20,81 @@
 # OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
 # SOFTWARE.
 
-from .bleu import _bleu_without_bp
+"""
+The aligner module.
+
+An aligner is a callable ``aligner(hypothesis, refs)`` scoring a hypothesis against
+a group of references. It may also implement the batch protocol:
+
+  - ``prepare(reference_set)`` (optional) does the per-reference-set precomputation
+    and returns an object that is passed to ``score_matrix``. The metric functions call it
+    once per reference set, passing a ``ReferenceIndex``, which can itself be used as a
+    reference set and caches precomputed tables.
+  - ``score_matrix(hypotheses, prepared)`` returns the scores of all the hypotheses
+    against all the groups as an array-like of shape (n_hypotheses, n_groups).
+  - ``score_matrices(hypothesis_sets, prepared_list)`` (optional) does the same for several
+    hypothesis sets, each against its own prepared reference set, in a single call. The
+    evaluation server uses it to score the requests against different queries together.
+
+The metric functions use the batch protocol when it is available and fall back to
+calling the aligner once per hypothesis and group otherwise.
+"""
+from .bleu import (
+    DEFAULT_MAX_ORDER,
+    _best_group,
+    _bleu_without_bp,
+    _bleu_without_bp_against_groups,
+)
+from .index import ReferenceIndex
+
+_NLTK_WEIGHTS = (0.25, 0.25, 0.25, 0.25)
+
+
+def _prepare(reference_set):
+    """
+    Return the ReferenceIndex of a reference set, which may be one already.
+    """
+    if isinstance(reference_set, ReferenceIndex):
+        return reference_set
+    return ReferenceIndex(reference_set)
+
+
+def _scalar_score_matrix(aligner, hypotheses, reference_set):
+    """
+    Compute a score matrix by calling a scalar aligner on each pair.
+    """
+    import numpy as np
+
+    return np.array(
+        [[aligner(h, refs) for refs in reference_set] for h in hypotheses],
+        dtype=np.float64,
+    ).reshape(-1, len(reference_set))
+
+
+def _smoothing_parameters(smooth_function):
+    """
+    Identify a smoothing function of ``nltk.translate.bleu_score.SmoothingFunction``.
+
+    :param smooth_function: None, the name of a method such as "method1", or a method bound
+        to a SmoothingFunction object.
+    :return: (method, epsilon, alpha, k)
+    """
+    from .nltk_compat import SMOOTHING_METHODS
+
+    epsilon, alpha, k = 0.1, 5, 5
+    if smooth_function is None:
+        method = "method0"
+    elif isinstance(smooth_function, str):
+        method = smooth_function
+    elif hasattr(smooth_function, "__self__"):
+        method = smooth_function.__name__
+        owner = smooth_function.__self__
+        epsilon, alpha, k = owner.epsilon, owner.alpha, owner.k
+    else:
+        method = None
+    if method not in SMOOTHING_METHODS:
+        raise ValueError("unsupported smoothing function: %r" % (smooth_function,))
+    return method, epsilon, alpha, k
 
 
 class BleuAligner:
@@ -31,6 +105,12 @@ class BleuAligner:
     def __init__(self, n=None):
         self.n = n
 
+    def cache_key(self):
+        """
+        Return a string identifying the configuration of this aligner in a score cache.
+        """
+        return "BleuAligner(n=%d)" % (self.n or DEFAULT_MAX_ORDER)
+
     def __call__(self, hypothesis_sentence, reference_corpus):
         return _bleu_without_bp(
             translation_corpus=[hypothesis_sentence],
@@ -39,6 +119,94 @@ class BleuAligner:
             max_order=self.n,
         )
 
+    def score_index(self, hypothesis_sentence, index):
+        """
+        Score a hypothesis against every group of a ``ReferenceIndex``.
+
+        :param hypothesis_sentence: a single hypothesis.
+        :param index: a ReferenceIndex.
+        :return: List[float], one for each group.
+        """
+        return _bleu_without_bp_against_groups(
+            translation=hypothesis_sentence,
+            merged_ref_ngram_counts_list=index.merged_ngrams(self.n),
+            smooth=True,
+            max_order=self.n,
+        )
+
+    def best_group(self, hypothesis_sentence, index):
+        """
+        Find the group of a ``ReferenceIndex`` with the highest score, pruning the groups
+        that cannot beat the best one found so far.
+
+        :param hypothesis_sentence: a single hypothesis.
+        :param index: a ReferenceIndex.
+        :return: (the index of the group, its score).
+        """
+        k, score, _ = _best_group(
+            translation=hypothesis_sentence,
+            merged_ref_ngram_counts_list=index.merged_ngrams(self.n),
+            unigram_counts_list=index.merged_ngrams(1),
+            smooth=True,
+            max_order=self.n,
+        )
+        return k, score
+
+    def prepare(self, reference_set):
+        """
+        Return the ReferenceIndex of a reference set.
+        """
+        return _prepare(reference_set)
+
+    def score_matrix(self, hypotheses, reference_set):
+        """
+        Score every hypothesis against every group at once with the vectorized engine.
+
+        :param hypotheses: a list of hypotheses.
+        :param reference_set: a reference set or its ReferenceIndex.
+        :return: np.ndarray of shape (n_hypotheses, n_groups).
+        """
+        from .batch import bleu_score_matrix
+
+        index = _prepare(reference_set)
+        return bleu_score_matrix(
+            hypotheses, index.encoded(self.n), max_order=self.n, smooth=True
+        )
+
+    def score_matrices(self, hypothesis_sets, reference_sets):
+        """
+        Score several hypothesis sets, each against the groups of its own reference set,
+        in a single vectorized pass. The scores are the same as those of ``score_matrix``.
+
+        :param hypothesis_sets: a list of lists of hypotheses.
+        :param reference_sets: the reference set (or its ReferenceIndex) of each.
+        :return: List[np.ndarray], of shape (n_hypotheses, n_groups) for each hypothesis set.
+        """
+        from .batch import bleu_score_matrices
+
+        encoded_list = [
+            _prepare(reference_set).encoded(self.n) for reference_set in reference_sets
+        ]
+        return bleu_score_matrices(
+            hypothesis_sets, encoded_list, max_order=self.n, smooth=True
+        )
+
+    def statistics(self, hypotheses, reference_set):
+        """
+        Extract the sufficient statistics of BLEU of every hypothesis against every group,
+        from which the scores of this aligner and of its variants (lower orders, no
+        smoothing, brevity penalty) are computed. ``statistics(...).bleu(n)`` is the same
+        as ``BleuAligner(n).score_matrix(...)``.
+
+        :param hypotheses: a list of hypotheses.
+        :param reference_set: a reference set or its ReferenceIndex.
+        :return: lsdscc.batch.BleuStatistics of order ``n``.
+        """
+        from .batch import bleu_statistics
+
+        index = _prepare(reference_set)
+        return bleu_statistics(hypotheses, index.encoded(self.n), max_order=self.n)
+
 
 class NLTKBleuAligner:
     """
@@ -51,6 +219,21 @@ class NLTKBleuAligner:
         self._smooth_function = smooth_function
         self._sentence_bleu = bleu_score.sentence_bleu
 
+    def cache_key(self):
+        """
+        Return a string identifying the configuration of this aligner in a score cache,
+        or None if the smoothing function cannot be identified across runs.
+        """
+        fn = self._smooth_function
+        if fn is None:
+            return "NLTKBleuAligner(smooth_function=None)"
+        name = "%s.%s" % (fn.__module__, getattr(fn, "__qualname__", "<unknown>"))
+        if "<" in name:
+            return None
+        owner = getattr(fn, "__self__", None)
+        params = sorted(vars(owner).items()) if owner is not None else []
+        return "NLTKBleuAligner(smooth_function=%s%r)" % (name, params)
+
     def __call__(self, hypothesis_sentence, reference_corpus):
         return self._sentence_bleu(
             references=reference_corpus,
@@ -58,6 +241,22 @@ class NLTKBleuAligner:
             smoothing_function=self._smooth_function,
         )
 
+    def prepare(self, reference_set):
+        """
+        Return the ReferenceIndex of a reference set.
+        """
+        return _prepare(reference_set)
+
+    def score_matrix(self, hypotheses, reference_set):
+        """
+        Score every hypothesis against every group.
+
+        :param hypotheses: a list of hypotheses.
+        :param reference_set: a reference set or its ReferenceIndex.
+        :return: np.ndarray of shape (n_hypotheses, n_groups).
+        """
+        return _scalar_score_matrix(self, hypotheses, reference_set)
+
 
 class NLTKNistAligner:
     """
@@ -70,7 +269,182 @@ class NLTKNistAligner:
         self._sentence_nist = nist_score.sentence_nist
         self.n = n
 
+    def cache_key(self):
+        """
+        Return a string identifying the configuration of this aligner in a score cache.
+        """
+        return "NLTKNistAligner(n=%d)" % self.n
+
     def __call__(self, hypothesis_sentence, reference_corpus):
         return self._sentence_nist(
             references=reference_corpus, hypothesis=hypothesis_sentence, n=self.n
         )
+
+    def prepare(self, reference_set):
+        """
+        Return the ReferenceIndex of a reference set.
+        """
+        return _prepare(reference_set)
+
+    def score_matrix(self, hypotheses, reference_set):
+        """
+        Score every hypothesis against every group.
+
+        :param hypotheses: a list of hypotheses.
+        :param reference_set: a reference set or its ReferenceIndex.
+        :return: np.ndarray of shape (n_hypotheses, n_groups).
+        """
+        return _scalar_score_matrix(self, hypotheses, reference_set)
+
+
+class NativeBleuAligner:
+    """
+    An Aligner that reproduces ``nltk.translate.bleu_score.sentence_bleu`` without calling
+    nltk. It scores a whole hypothesis set at once on the encoded tables of a ReferenceIndex
+    and agrees with ``NLTKBleuAligner`` to within floating point rounding.
+    """
+
+    def __init__(self, smooth_function=None, weights=_NLTK_WEIGHTS):
+        """
+        :param smooth_function: None, the name of a method of ``SmoothingFunction`` such as
+            "method1", or such a method bound to a SmoothingFunction object, whose epsilon,
+            alpha and k are used.
+        :param weights: weights for unigrams, bigrams, trigrams and so on.
+        """
+        self.method, self.epsilon, self.alpha, self.k = _smoothing_parameters(
+            smooth_function
+        )
+        self.weights = tuple(weights)
+
+    def cache_key(self):
+        """
+        Return a string identifying the configuration of this aligner in a score cache.
+        """
+        params = (self.method, self.epsilon, self.alpha, self.k, self.weights)
+        return (
+            "NativeBleuAligner(method=%s, epsilon=%r, alpha=%r, k=%r, weights=%r)"
+            % params
+        )
+
+    def __call__(self, hypothesis_sentence, reference_corpus):
+        return float(self.score_matrix([hypothesis_sentence], [reference_corpus])[0, 0])
+
+    def prepare(self, reference_set):
+        """
+        Return the ReferenceIndex of a reference set.
+        """
+        return _prepare(reference_set)
+
+    def score_matrix(self, hypotheses, reference_set):
+        """
+        Score every hypothesis against every group at once.
+
+        :param hypotheses: a list of hypotheses.
+        :param reference_set: a reference set or its ReferenceIndex.
+        :return: np.ndarray of shape (n_hypotheses, n_groups).
+        """
+        from .nltk_compat import nltk_bleu_score_matrix
+
+        max_order = len(self.weights)
+        if self.method in ("method5", "method7"):
+            max_order = max(max_order, 5)
+        index = _prepare(reference_set)
+        return nltk_bleu_score_matrix(
+            hypotheses,
+            index.encoded(max_order),
+            weights=self.weights,
+            method=self.method,
+            epsilon=self.epsilon,
+            alpha=self.alpha,
+            k=self.k,
+        )
+
+
+class NativeNistAligner:
+    """
+    An Aligner that reproduces ``nltk.translate.nist_score.sentence_nist`` without calling
+    nltk. The information weights of each group are computed once per ReferenceIndex and a
+    whole hypothesis set is scored at once. It agrees with ``NLTKNistAligner`` to within
+    floating point rounding.
+    """
+
+    def __init__(self, n=5):
+        self.n = n
+
+    def cache_key(self):
+        """
+        Return a string identifying the configuration of this aligner in a score cache.
+        """
+        return "NativeNistAligner(n=%d)" % self.n
+
+    def __call__(self, hypothesis_sentence, reference_corpus):
+        return float(self.score_matrix([hypothesis_sentence], [reference_corpus])[0, 0])
+
+    def prepare(self, reference_set):
+        """
+        Return the ReferenceIndex of a reference set.
+        """
+        return _prepare(reference_set)
+
+    def score_matrix(self, hypotheses, reference_set):
+        """
+        Score every hypothesis against every group at once.
+
+        :param hypotheses: a list of hypotheses.
+        :param reference_set: a reference set or its ReferenceIndex.
+        :return: np.ndarray of shape (n_hypotheses, n_groups).
+        """
+        from .nltk_compat import nist_score_matrix
+
+        index = _prepare(reference_set)
+        return nist_score_matrix(
+            hypotheses, index.encoded(self.n), index.nist_tables(self.n)
+        )
+
+
+class MultiBleuAligner:
+    """
+    An Aligner that uses the Multi-BLEU of Madnani et al. (2008) as computed by
+    ``scripts/multi-bleu.pl``, i.e., the cumulative BLEU with BP=1 and no smoothing of a
+    hypothesis against the references of a group. It runs in-process and scores a whole
+    hypothesis set at once. See ``lsdscc.multi_bleu``.
+    """
+
+    def __init__(self, n=4, lowercase=False):
+        """
+        :param n: the order of the BLEU, from 1 to 4 for the BLEU-n reported by the script.
+        :param lowercase: whether to lowercase the tokens like ``multi-bleu.pl -lc``.
+        """
+        self.n = n
+        self.lowercase = lowercase
+
+    def cache_key(self):
+        """
+        Return a string identifying the configuration of this aligner in a score cache.
+        """
+        return "MultiBleuAligner(n=%d, lowercase=%r)" % (self.n, self.lowercase)
+
+    def __call__(self, hypothesis_sentence, reference_corpus):
+        return float(self.score_matrix([hypothesis_sentence], [reference_corpus])[0, 0])
+
+    def prepare(self, reference_set):
+        """
+        Return the ReferenceIndex of a reference set.
+        """
+        return _prepare(reference_set)
+
+    def score_matrix(self, hypotheses, reference_set):
+        """
+        Score every hypothesis against every group at once.
+
+        :param hypotheses: a list of hypotheses.
+        :param reference_set: a reference set or its ReferenceIndex.
+        :return: np.ndarray of shape (n_hypotheses, n_groups).
+        """
+        from .multi_bleu import multi_bleu_score_matrix, perl_lowercase
+
+        index = _prepare(reference_set)
+        if self.lowercase:
+            index = index.lowercased()
+            hypotheses = [perl_lowercase(h) for h in hypotheses]
+        return multi_bleu_score_matrix(hypotheses, index.encoded(self.n), self.n)
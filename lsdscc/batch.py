@@ -0,0 +1,571 @@
+# MIT License
+#
+# Copyright (c) 2019 Cong Feng.
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+"""
+The vectorized BLEU module.
+
+The n-grams of a reference set are integer-encoded once: a token is mapped to its id
+in the vocabulary of the reference set and an n-gram of order k is keyed by
+``rank(its (k-1)-gram prefix) * base + id(its last token)``, where the rank is the
+position of the prefix in the sorted table of order k-1. The keys are exact (no hashing)
+and stay small no matter how large the vocabulary or the order is.
+
+All the hypotheses of a set are concatenated into one flat token array, so the n-grams
+of every hypothesis are looked up in a single ``np.searchsorted`` per order and no padding
+is needed, whatever the lengths of the hypotheses are.
+"""
+import math
+
+import numpy as np
+
+from lsdscc.bleu import DEFAULT_MAX_ORDER
+from lsdscc.bleu import _geo_mean as _scalar_geo_mean
+
+__all__ = [
+    "EncodedReferences",
+    "BleuStatistics",
+    "bleu_score_matrix",
+    "bleu_score_matrices",
+    "bleu_statistics",
+    "corpus_bleu",
+    "match_counts",
+    "match_counts_across",
+    "BREVITY_PENALTIES",
+]
+
+# The reference length of the brevity penalty: the shortest reference of the group or the
+# one closest to the hypothesis in length (the shorter one on ties). None means BP=1.
+BREVITY_PENALTIES = {None, "shortest", "closest"}
+
+_log = np.frompyfunc(math.log, 1, 1)
+_exp = np.frompyfunc(math.exp, 1, 1)
+
+
+def _flatten(sentences, vocab):
+    """
+    Concatenate the token ids of sentences.
+
+    :param sentences: a list of sentences.
+    :param vocab: dict from token to id. Unknown tokens get id 0.
+    :return: (tokens, lengths), the flat token ids and the length of each sentence.
+    """
+    tokens = [vocab.get(token, 0) for sentence in sentences for token in sentence]
+    lengths = [len(sentence) for sentence in sentences]
+    return np.array(tokens, dtype=np.int64), np.array(lengths, dtype=np.int64)
+
+
+def _ngram_positions(lengths, order):
+    """
+    Return the start positions of all n-grams of an order and the sentences they belong to.
+
+    :param lengths: the length of each sentence in the flat token array.
+    :param order: the order of the n-grams.
+    :return: (positions, sentence_ids)
+    """
+    ends = np.cumsum(lengths)
+    sentence_ids = np.repeat(np.arange(len(lengths)), lengths)
+    positions = np.arange(int(ends[-1]) if len(ends) else 0)
+    valid = positions + order <= ends[sentence_ids]
+    return positions[valid], sentence_ids[valid]
+
+
+class EncodedReferences:
+    """
+    The integer-encoded n-gram tables of a reference set.
+
+    For each order, ``tables[k - 1]`` is the sorted array of the keys of all the n-grams
+    of order k in the reference set and ``group_max[k - 1]`` is an array of shape
+    ``(n_groups, len(tables[k - 1]))`` holding the max count of each n-gram among the
+    references of a group. ``reference_counts[k - 1]`` holds the count of each n-gram of
+    order k in each reference as the arrays ``(reference_ids, ranks, counts)``, sorted by
+    reference and then by rank. The references of group g are
+    ``group_offsets[g]:group_offsets[g + 1]`` in the flat order of ``reference_lengths``.
+    """
+
+    def __init__(self, reference_set, max_order=None):
+        max_order = max_order or DEFAULT_MAX_ORDER
+        vocab = {}
+        references = []
+        group_ids = []
+        for group_id, refs in enumerate(reference_set):
+            for ref in refs:
+                for token in ref:
+                    vocab.setdefault(token, len(vocab) + 1)
+                references.append(ref)
+                group_ids.append(group_id)
+        n_groups = len(reference_set)
+        group_ids = np.array(group_ids, dtype=np.int64)
+        tokens, lengths = _flatten(references, vocab)
+
+        self.vocab = vocab
+        self.base = len(vocab) + 1
+        self.max_order = max_order
+        self.n_groups = n_groups
+        self.reference_lengths = lengths
+        self.reference_groups = group_ids
+        self.group_offsets = np.concatenate(
+            [[0], np.cumsum([len(refs) for refs in reference_set], dtype=np.int64)]
+        )
+        self.tables = []
+        self.group_max = []
+        self.reference_counts = []
+
+        prefix_rank = np.zeros(len(tokens), dtype=np.int64)
+        for order in range(1, max_order + 1):
+            positions, sentence_ids = _ngram_positions(lengths, order)
+            keys = prefix_rank[positions] * self.base + tokens[positions + order - 1]
+            table, ranks = np.unique(keys, return_inverse=True)
+            # Count each n-gram per reference and then take the max count per group.
+            pairs, counts = np.unique(
+                sentence_ids * len(table) + ranks, return_counts=True
+            )
+            group_max = np.zeros((n_groups, len(table)), dtype=np.int64)
+            np.maximum.at(
+                group_max,
+                (group_ids[pairs // len(table)], pairs % len(table)),
+                counts,
+            )
+            self.tables.append(table)
+            self.group_max.append(group_max)
+            self.reference_counts.append(
+                (pairs // len(table), pairs % len(table), counts)
+            )
+            prefix_rank = np.full(len(tokens), -1, dtype=np.int64)
+            prefix_rank[positions] = ranks
+
+
+class _ConcatenatedReferences:
+    """
+    The n-gram tables of several EncodedReferences concatenated into one, so that
+    hypotheses against different reference sets are looked up together.
+
+    The n-grams of order k of the i-th reference set come after those of the reference sets
+    before it. An n-gram is keyed as in EncodedReferences, by the rank of its prefix in the
+    concatenated table of order k-1 and its last token, where the prefix of a unigram of the
+    i-th reference set has rank i. A hypothesis against the i-th reference set is encoded
+    with the vocabulary of that set and its n-grams can only be found among its n-grams.
+    ``group_max`` is padded with zeros to the largest number of groups.
+    """
+
+    def __init__(self, encoded_list, max_order):
+        self.base = max(encoded.base for encoded in encoded_list)
+        self.n_groups = max(encoded.n_groups for encoded in encoded_list)
+        self.tables = []
+        self.group_max = []
+        prefix_starts = range(len(encoded_list))
+        for order in range(1, max_order + 1):
+            sizes = [len(encoded.tables[order - 1]) for encoded in encoded_list]
+            starts = np.concatenate([[0], np.cumsum(sizes, dtype=np.int64)])
+            group_max = np.zeros((self.n_groups, starts[-1]), dtype=np.int64)
+            keys = []
+            for i, encoded in enumerate(encoded_list):
+                table = encoded.tables[order - 1]
+                prefixes, last_tokens = np.divmod(table, encoded.base)
+                keys.append((prefixes + prefix_starts[i]) * self.base + last_tokens)
+                group_max[: encoded.n_groups, starts[i] : starts[i + 1]] = (
+                    encoded.group_max[order - 1]
+                )
+            self.tables.append(np.concatenate(keys))
+            self.group_max.append(group_max)
+            prefix_starts = starts
+
+
+def _hypothesis_ngrams(tokens, lengths, encoded, max_order, prefix_rank=None):
+    """
+    Look up the n-grams of flat hypotheses in the tables of the references.
+
+    :param tokens: the flat token ids of the hypotheses.
+    :param lengths: the length of each hypothesis.
+    :param encoded: EncodedReferences of the reference set.
+    :param max_order: the maximum order of n-grams.
+    :param prefix_rank: the rank of the prefix of the unigram at each position.
+        Default to 0 everywhere.
+    :return: an iterator of (order, sentence_ids, ranks) holding the n-grams of each order
+        found in the references, in the order of their positions.
+    """
+    if prefix_rank is None:
+        prefix_rank = np.zeros(len(tokens), dtype=np.int64)
+    for order in range(1, max_order + 1):
+        table = encoded.tables[order - 1]
+        positions, sentence_ids = _ngram_positions(lengths, order)
+        prefixes = prefix_rank[positions]
+        last_tokens = tokens[positions + order - 1]
+        keys = prefixes * encoded.base + last_tokens
+        ranks = np.minimum(np.searchsorted(table, keys), max(len(table) - 1, 0))
+        found = (prefixes >= 0) & (last_tokens > 0)
+        if len(table):
+            found &= table[ranks] == keys
+        else:
+            found[:] = False
+        prefix_rank = np.full(len(tokens), -1, dtype=np.int64)
+        prefix_rank[positions[found]] = ranks[found]
+        yield order, sentence_ids[found], ranks[found]
+
+
+def match_counts(hypothesis_set, encoded, max_order=None):
+    """
+    Count the clipped n-gram matches of every hypothesis against every reference group.
+
+    :param hypothesis_set: a hypothesis set.
+    :param encoded: EncodedReferences of the reference set.
+    :param max_order: the maximum order of n-grams. Must not exceed that of ``encoded``.
+    :return: (matches, possibles, lengths): the number of matches of each order of shape
+        (max_order, n_hypotheses, n_groups), the number of n-grams of each order in each
+        hypothesis of shape (max_order, n_hypotheses) and the length of each hypothesis.
+    """
+    max_order = max_order or DEFAULT_MAX_ORDER
+    assert max_order <= encoded.max_order, "encoded references of a lower order"
+    tokens, lengths = _flatten(hypothesis_set, encoded.vocab)
+    return _match_counts(tokens, lengths, encoded, max_order)
+
+
+def _match_counts(tokens, lengths, encoded, max_order, prefix_rank=None):
+    """
+    The part of ``match_counts`` after the hypotheses are encoded.
+    """
+    n_hypotheses = len(lengths)
+    matches = np.zeros((max_order, n_hypotheses, encoded.n_groups), dtype=np.int64)
+    possibles = np.zeros((max_order, n_hypotheses), dtype=np.int64)
+    for order, sentence_ids, ranks in _hypothesis_ngrams(
+        tokens, lengths, encoded, max_order, prefix_rank
+    ):
+        possibles[order - 1] = np.maximum(lengths - order + 1, 0)
+        table_size = len(encoded.tables[order - 1])
+        # Count each n-gram per hypothesis and clip it by the max count per group.
+        pairs, counts = np.unique(sentence_ids * table_size + ranks, return_counts=True)
+        clipped = np.minimum(
+            counts[:, None], encoded.group_max[order - 1][:, pairs % table_size].T
+        )
+        np.add.at(matches[order - 1], pairs // table_size, clipped)
+    return matches, possibles, lengths
+
+
+def _match_counts_across(hypothesis_sets, encoded_list, max_order):
+    """
+    Count the matches of several hypothesis sets, each against its own reference set.
+
+    :return: (matches, possibles, lengths, spans): the arrays of ``match_counts`` for all the
+        hypotheses, padded to the largest number of groups, and for each hypothesis set the
+        range of its hypotheses and its number of groups.
+    """
+    assert len(hypothesis_sets) == len(encoded_list)
+    # A reference set shared by several hypothesis sets is concatenated once.
+    blocks = {}
+    distinct = []
+    for encoded in encoded_list:
+        assert max_order <= encoded.max_order, "encoded references of a lower order"
+        if id(encoded) not in blocks:
+            blocks[id(encoded)] = len(distinct)
+            distinct.append(encoded)
+    flat = [
+        _flatten(hypothesis_set, encoded.vocab)
+        for hypothesis_set, encoded in zip(hypothesis_sets, encoded_list)
+    ]
+    tokens = np.concatenate([t for t, _ in flat] + [np.zeros(0, dtype=np.int64)])
+    lengths = np.concatenate([n for _, n in flat] + [np.zeros(0, dtype=np.int64)])
+    prefix_rank = np.repeat(
+        [blocks[id(encoded)] for encoded in encoded_list],
+        [len(t) for t, _ in flat],
+    ).astype(np.int64)
+    matches, possibles, lengths = _match_counts(
+        tokens,
+        lengths,
+        _ConcatenatedReferences(distinct, max_order),
+        max_order,
+        prefix_rank,
+    )
+    spans = []
+    start = 0
+    for (_, set_lengths), encoded in zip(flat, encoded_list):
+        spans.append((start, start + len(set_lengths), encoded.n_groups))
+        start += len(set_lengths)
+    return matches, possibles, lengths, spans
+
+
+def match_counts_across(hypothesis_sets, encoded_list, max_order=None):
+    """
+    Count the clipped n-gram matches of several hypothesis sets, each against the groups of
+    its own reference set, in a single vectorized pass.
+
+    :param hypothesis_sets: a list of hypothesis sets.
+    :param encoded_list: the EncodedReferences of the reference set of each hypothesis set.
+    :param max_order: the maximum order of n-grams. Must not exceed that of ``encoded``.
+    :return: a list of (matches, possibles, lengths), the same as ``match_counts`` gives
+        for each hypothesis set.
+    """
+    if not hypothesis_sets:
+        return []
+    max_order = max_order or DEFAULT_MAX_ORDER
+    matches, possibles, lengths, spans = _match_counts_across(
+        hypothesis_sets, encoded_list, max_order
+    )
+    return [
+        (matches[:, start:end, :n_groups], possibles[:, start:end], lengths[start:end])
+        for start, end, n_groups in spans
+    ]
+
+
+def bleu_score_matrices(hypothesis_sets, encoded_list, max_order=None, smooth=True):
+    """
+    Compute the BLEU (with BP=1) of several hypothesis sets, each against the groups of its
+    own reference set, in a single vectorized pass.
+
+    The result is the same as calling ``bleu_score_matrix`` on each, bit for bit.
+
+    :param hypothesis_sets: a list of hypothesis sets.
+    :param encoded_list: the EncodedReferences of the reference set of each hypothesis set.
+    :param max_order: the maximum order of n-grams. Must not exceed that of ``encoded``.
+    :param smooth: whether or not to apply Lin et al. 2004 smoothing.
+    :return: List[np.ndarray], of shape (n_hypotheses, n_groups) for each hypothesis set.
+    """
+    if not hypothesis_sets:
+        return []
+    max_order = max_order or DEFAULT_MAX_ORDER
+    matches, possibles, _, spans = _match_counts_across(
+        hypothesis_sets, encoded_list, max_order
+    )
+    scores = _geo_mean(matches, possibles[:, :, None], max_order, smooth)
+    return [scores[start:end, :n_groups] for start, end, n_groups in spans]
+
+
+def bleu_score_matrix(hypothesis_set, encoded, max_order=None, smooth=True):
+    """
+    Compute the BLEU (with BP=1) of every hypothesis against every reference group.
+
+    The result is the same as calling ``_bleu_without_bp`` on each pair, bit for bit.
+
+    :param hypothesis_set: a hypothesis set.
+    :param encoded: EncodedReferences of the reference set.
+    :param max_order: the maximum order of n-grams. Must not exceed that of ``encoded``.
+    :param smooth: whether or not to apply Lin et al. 2004 smoothing.
+    :return: np.ndarray of shape (n_hypotheses, n_groups).
+    """
+    max_order = max_order or DEFAULT_MAX_ORDER
+    matches, possibles, _ = match_counts(hypothesis_set, encoded, max_order)
+    return _geo_mean(matches, possibles[:, :, None], max_order, smooth)
+
+
+class BleuStatistics:
+    """
+    The sufficient statistics of BLEU of every hypothesis of a set against every reference
+    group: the clipped matches and the possible matches of each order up to ``max_order``,
+    the length of each hypothesis and the reference lengths of each group.
+
+    BLEU of any order up to ``max_order``, with or without smoothing and brevity penalty,
+    is computed from them without looking at the n-grams again.
+    """
+
+    def __init__(
+        self,
+        matches,
+        possibles,
+        hypothesis_lengths,
+        shortest_reference_lengths,
+        closest_reference_lengths,
+    ):
+        """
+        :param matches: the clipped matches of shape (max_order, n_hypotheses, n_groups).
+        :param possibles: the possible matches of shape (max_order, n_hypotheses).
+        :param hypothesis_lengths: the length of each hypothesis.
+        :param shortest_reference_lengths: the length of the shortest reference of each group.
+        :param closest_reference_lengths: the length of the reference of each group closest
+            to each hypothesis, of shape (n_hypotheses, n_groups).
+        """
+        self.matches = matches
+        self.possibles = possibles
+        self.hypothesis_lengths = hypothesis_lengths
+        self.shortest_reference_lengths = shortest_reference_lengths
+        self.closest_reference_lengths = closest_reference_lengths
+
+    def __repr__(self):
+        return "<%s of order %d, %d hypotheses and %d groups>" % (
+            (self.__class__.__name__,) + self.matches.shape
+        )
+
+    @property
+    def max_order(self):
+        return self.matches.shape[0]
+
+    def reference_lengths(self, brevity_penalty):
+        """
+        Return the reference length of each pair for a kind of brevity penalty.
+
+        :param brevity_penalty: "shortest" or "closest".
+        :return: np.ndarray of shape (n_hypotheses, n_groups).
+        """
+        if brevity_penalty == "shortest":
+            return np.broadcast_to(
+                self.shortest_reference_lengths, self.closest_reference_lengths.shape
+            )
+        if brevity_penalty == "closest":
+            return self.closest_reference_lengths
+        raise ValueError("unknown brevity penalty %r" % (brevity_penalty,))
+
+    def brevity_penalty(self, brevity_penalty="closest"):
+        """
+        Compute the brevity penalty of every pair.
+
+        :param brevity_penalty: "shortest" or "closest".
+        :return: np.ndarray of shape (n_hypotheses, n_groups).
+        """
+        return _brevity_penalty(
+            self.hypothesis_lengths[:, None], self.reference_lengths(brevity_penalty)
+        )
+
+    def bleu(self, max_order=None, smooth=True, brevity_penalty=None):
+        """
+        Compute the BLEU of every hypothesis against every group.
+
+        With the default smoothing and no brevity penalty, the result is the same as
+        ``bleu_score_matrix``, bit for bit.
+
+        :param max_order: the maximum order of n-grams. Must not exceed that of the
+            statistics. Default to ``DEFAULT_MAX_ORDER``.
+        :param smooth: whether or not to apply Lin et al. 2004 smoothing.
+        :param brevity_penalty: one of ``BREVITY_PENALTIES``.
+        :return: np.ndarray of shape (n_hypotheses, n_groups).
+        """
+        max_order = _check_order(max_order, self.max_order)
+        if brevity_penalty not in BREVITY_PENALTIES:
+            raise ValueError("unknown brevity penalty %r" % (brevity_penalty,))
+        scores = _geo_mean(
+            self.matches[:max_order],
+            self.possibles[:max_order, :, None],
+            max_order,
+            smooth,
+        )
+        if brevity_penalty is not None:
+            scores = scores * self.brevity_penalty(brevity_penalty)
+        return scores
+
+
+def _check_order(max_order, available):
+    max_order = max_order or DEFAULT_MAX_ORDER
+    if not 0 < max_order <= available:
+        raise ValueError(
+            "order %d is not in the statistics of order %d" % (max_order, available)
+        )
+    return max_order
+
+
+def _brevity_penalty(hypothesis_lengths, reference_lengths):
+    """
+    Compute exp(1 - r / c) if c <= r, or else 1, elementwise. It is 0 if c is 0.
+    """
+    hypothesis_lengths, reference_lengths = np.broadcast_arrays(
+        hypothesis_lengths, reference_lengths
+    )
+    short = hypothesis_lengths <= reference_lengths
+    ratios = np.divide(
+        reference_lengths,
+        hypothesis_lengths,
+        out=np.ones(hypothesis_lengths.shape),
+        where=short & (hypothesis_lengths > 0),
+    )
+    penalty = np.where(short, np.asarray(_exp(1.0 - ratios), dtype=np.float64), 1.0)
+    return np.where(hypothesis_lengths > 0, penalty, 0.0)
+
+
+def bleu_statistics(hypothesis_set, encoded, max_order=None):
+    """
+    Extract the sufficient statistics of BLEU of every hypothesis against every group.
+
+    :param hypothesis_set: a hypothesis set.
+    :param encoded: EncodedReferences of the reference set.
+    :param max_order: the maximum order of n-grams. Must not exceed that of ``encoded``.
+    :return: BleuStatistics.
+    """
+    matches, possibles, lengths = match_counts(hypothesis_set, encoded, max_order)
+    reference_lengths = encoded.reference_lengths
+    group_starts = encoded.group_offsets[:-1]
+    shortest = np.minimum.reduceat(reference_lengths, group_starts)
+    # Rank the references by the distance to each hypothesis, then by their length.
+    scale = int(reference_lengths.max()) + 1
+    distances = np.abs(reference_lengths[None, :] - lengths[:, None])
+    ranks = np.minimum.reduceat(
+        distances * scale + reference_lengths, group_starts, axis=1
+    )
+    return BleuStatistics(matches, possibles, lengths, shortest, ranks % scale)
+
+
+def corpus_bleu(
+    statistics, groups, max_order=None, smooth=False, brevity_penalty="closest"
+):
+    """
+    Compute the corpus BLEU of pairs of hypotheses and groups, by summing their statistics
+    before taking the precisions and the brevity penalty. With the defaults, it is the same
+    as ``nltk.translate.bleu_score.corpus_bleu`` on the references of the groups, except
+    that nltk counts at least one possible n-gram of each order in every hypothesis.
+
+    :param statistics: an iterable of BleuStatistics, e.g., one for each query.
+    :param groups: an iterable of the group of each hypothesis for each BleuStatistics,
+        such as ``AlignmentDetails.aligned_groups``.
+    :param max_order: the maximum order of n-grams. Default to ``DEFAULT_MAX_ORDER``.
+    :param smooth: whether or not to apply Lin et al. 2004 smoothing.
+    :param brevity_penalty: one of ``BREVITY_PENALTIES``.
+    :return: float.
+    """
+    if brevity_penalty not in BREVITY_PENALTIES:
+        raise ValueError("unknown brevity penalty %r" % (brevity_penalty,))
+    max_order = max_order or DEFAULT_MAX_ORDER
+    matches = [0] * max_order
+    possibles = [0] * max_order
+    hypothesis_length = reference_length = 0
+    for stats, hypothesis_groups in zip(statistics, groups):
+        _check_order(max_order, stats.max_order)
+        rows = np.arange(len(hypothesis_groups))
+        hypothesis_groups = np.asarray(hypothesis_groups, dtype=np.int64)
+        for i in range(max_order):
+            matches[i] += int(stats.matches[i, rows, hypothesis_groups].sum())
+            possibles[i] += int(stats.possibles[i].sum())
+        hypothesis_length += int(stats.hypothesis_lengths.sum())
+        if brevity_penalty is not None:
+            reference_lengths = stats.reference_lengths(brevity_penalty)
+            reference_length += int(reference_lengths[rows, hypothesis_groups].sum())
+    score = _scalar_geo_mean(matches, possibles, max_order, smooth)
+    if brevity_penalty is not None:
+        score *= float(_brevity_penalty(hypothesis_length, reference_length))
+    return score
+
+
+def _geo_mean(matches, possibles, max_order, smooth):
+    """
+    The vectorized version of ``lsdscc.bleu._geo_mean``.
+
+    The logarithm and exponent are taken with ``math`` and the log precisions are summed
+    in the same order as the scalar version so that the results are bit-identical.
+    """
+    if smooth:
+        precisions = (matches + 1.0) / (possibles + 1.0)
+    else:
+        precisions = np.divide(
+            matches,
+            possibles,
+            out=np.zeros(matches.shape),
+            where=possibles > 0,
+        )
+    positive = precisions.min(axis=0) > 0
+    p_log_sum = np.zeros(precisions.shape[1:])
+    log_precisions = _log(np.where(positive, precisions, 1.0)).astype(np.float64)
+    for i in range(0, max_order):
+        p_log_sum = p_log_sum + (1.0 / max_order) * log_precisions[i]
+    return np.where(positive, _exp(p_log_sum).astype(np.float64), 0.0)
@@ -0,0 +1,202 @@
+# MIT License
+#
+# Copyright (c) 2019 Cong Feng.
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+"""
+The command line of the benchmark.
+
+Examples::
+
+    # Time every stage and aligner on the default synthetic corpus.
+    python -m lsdscc.benchmark --output before.json
+
+    # Compare against an earlier run. The exit status is 1 on a regression.
+    python -m lsdscc.benchmark --baseline before.json --output after.json
+
+    # A scaling curve over the number of groups.
+    python -m lsdscc.benchmark --sweep n_groups=4,16,64 --aligners bleu --output groups.json
+
+    # The throughput and latency of the evaluation server with 8 clients.
+    python -m lsdscc.benchmark --server --clients 8 --output server.json
+"""
+import argparse
+import json
+import sys
+
+from lsdscc.benchmark.loopback import run_server_benchmark
+from lsdscc.benchmark.runner import (
+    ALIGNERS,
+    RESULTS_VERSION,
+    compare_results,
+    run_benchmark,
+)
+from lsdscc.benchmark.synthetic import SyntheticCorpusConfig
+
+
+def _parse_sweep(text):
+    field, _, values = text.partition("=")
+    if field not in SyntheticCorpusConfig._fields or not values:
+        raise argparse.ArgumentTypeError("expect FIELD=V1,V2,... got %r" % text)
+    field_type = type(SyntheticCorpusConfig._field_defaults[field])
+    return field, [field_type(v) for v in values.split(",")]
+
+
+def _configs(args):
+    config = SyntheticCorpusConfig(
+        **{
+            field: getattr(args, field)
+            for field in SyntheticCorpusConfig._fields
+            if getattr(args, field) is not None
+        }
+    )
+    if args.sweep is None:
+        return [config]
+    field, values = args.sweep
+    return [config._replace(**{field: value}) for value in values]
+
+
+def _print_comparison(rows, file):
+    for row in rows:
+        print(
+            "%-24s %10.4fs %10.4fs %7.2fx%s"
+            % (
+                row["stage"],
+                row["baseline"],
+                row["seconds"],
+                row["ratio"],
+                "  REGRESSION" if row["regression"] else "",
+            ),
+            file=file,
+        )
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        prog="python -m lsdscc.benchmark",
+        description="time the stages of LSDSCC on a synthetic corpus",
+    )
+    defaults = SyntheticCorpusConfig()
+    for field in SyntheticCorpusConfig._fields:
+        default = getattr(defaults, field)
+        parser.add_argument(
+            "--%s" % field,
+            type=type(default),
+            help="default to %r" % (default,),
+        )
+    parser.add_argument(
+        "--sweep",
+        type=_parse_sweep,
+        help="run once for each value of a field, e.g., n_queries=10,100,1000",
+    )
+    parser.add_argument(
+        "--aligners",
+        type=lambda text: text.split(","),
+        default=list(ALIGNERS),
+        help="comma-separated aligners among %s. default to all" % ", ".join(ALIGNERS),
+    )
+    parser.add_argument("--repeats", type=int, default=3, help="runs of each stage")
+    parser.add_argument("--output", "-o", help="where to write the results in json")
+    parser.add_argument(
+        "--baseline",
+        help="results in json to compare against, run with the same configs",
+    )
+    parser.add_argument(
+        "--tolerance",
+        type=float,
+        default=0.1,
+        help="the relative slowdown of a stage counted as a regression. default to 0.1",
+    )
+    parser.add_argument(
+        "--server",
+        action="store_true",
+        help="benchmark the evaluation server on the loopback interface instead",
+    )
+    parser.add_argument(
+        "--clients", type=int, default=4, help="concurrent clients of --server"
+    )
+    parser.add_argument(
+        "--sets_per_request",
+        type=int,
+        default=1,
+        help="hypothesis sets per request of --server",
+    )
+    parser.add_argument(
+        "--rounds", type=int, default=1, help="passes over the corpus of --server"
+    )
+    parser.add_argument(
+        "--max_batch_size", type=int, help="max batch size of the server"
+    )
+    parser.add_argument("--max_wait", type=float, help="max wait of the server")
+    args = parser.parse_args(argv)
+    if args.server and args.baseline:
+        parser.error("--baseline does not apply to --server")
+    unknown = set(args.aligners) - set(ALIGNERS)
+    if unknown:
+        parser.error("unknown aligners: %s" % ", ".join(sorted(unknown)))
+
+    baseline_runs = []
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline_runs = json.load(f)["runs"]
+
+    runs = []
+    regression = False
+    for config in _configs(args):
+        print("config: %r" % (config,), file=sys.stderr)
+        if args.server:
+            server_options = {
+                option: getattr(args, option)
+                for option in ("max_batch_size", "max_wait")
+                if getattr(args, option) is not None
+            }
+            results = run_server_benchmark(
+                config,
+                args.clients,
+                args.sets_per_request,
+                args.rounds,
+                log=sys.stderr,
+                **server_options,
+            )
+            runs.append(results)
+            continue
+        results = run_benchmark(config, args.aligners, args.repeats, log=sys.stderr)
+        runs.append(results)
+        for baseline in baseline_runs:
+            if baseline["config"] == results["config"]:
+                rows = compare_results(results, baseline, args.tolerance)
+                _print_comparison(rows, sys.stderr)
+                regression |= any(row["regression"] for row in rows)
+                break
+        else:
+            if baseline_runs:
+                print("no baseline run with this config", file=sys.stderr)
+
+    output = {"version": RESULTS_VERSION, "runs": runs}
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(output, f, indent=2)
+    else:
+        json.dump(output, sys.stdout, indent=2)
+        print()
+    return 1 if regression else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,164 @@
+# MIT License
+#
+# Copyright (c) 2019 Cong Feng.
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+"""
+The loopback benchmark of the evaluation server.
+
+``run_server_benchmark`` starts an EvaluationServer on a synthetic corpus and has several
+client threads post the hypothesis sets to it. It reports the throughput, the latency of the
+requests seen by the clients and the batching done by the server, together with the time of
+``compute_score_on_corpus`` in process for comparison.
+"""
+import threading
+import time
+
+from lsdscc.benchmark.runner import RESULTS_VERSION, _environment
+from lsdscc.benchmark.synthetic import generate_corpora
+from lsdscc.metrics import ScoreAccumulator, compute_score_on_corpus
+from lsdscc.server import (
+    DEFAULT_MAX_BATCH_SIZE,
+    DEFAULT_MAX_WAIT,
+    EvaluationClient,
+    EvaluationServer,
+    LatencyStats,
+)
+
+__all__ = [
+    "run_server_benchmark",
+]
+
+
+def run_server_benchmark(
+    config,
+    n_clients=4,
+    sets_per_request=1,
+    rounds=1,
+    max_batch_size=DEFAULT_MAX_BATCH_SIZE,
+    max_wait=DEFAULT_MAX_WAIT,
+    log=None,
+):
+    """
+    Time an EvaluationServer on the loopback interface.
+
+    Each round posts every hypothesis set of the corpus once. The requests are spread over
+    the clients, which send them one after another.
+
+    :param config: SyntheticCorpusConfig.
+    :param n_clients: the number of concurrent clients, each on its own thread.
+    :param sets_per_request: the number of hypothesis sets in a request.
+    :param rounds: the number of passes over the corpus.
+    :param max_batch_size: see ``lsdscc.server.MicroBatcher``.
+    :param max_wait: see ``lsdscc.server.MicroBatcher``.
+    :param log: an optional file to report the progress to.
+    :return: dict with the config, the environment and the timings.
+    """
+    hypothesis_corpus, reference_corpus = generate_corpora(config)
+    n_hypothesis_sets = len(hypothesis_corpus) * rounds
+
+    start = time.perf_counter()
+    direct = compute_score_on_corpus(hypothesis_corpus, reference_corpus)
+    direct_seconds = time.perf_counter() - start
+
+    requests = [
+        list(range(i, min(i + sets_per_request, len(hypothesis_corpus))))
+        for _ in range(rounds)
+        for i in range(0, len(hypothesis_corpus), sets_per_request)
+    ]
+    latency = LatencyStats(window=len(requests))
+    scores = [None] * len(hypothesis_corpus)
+    errors = []
+
+    def client(requests):
+        try:
+            with EvaluationClient(url) as evaluation_client:
+                for query_ids in requests:
+                    request_start = time.perf_counter()
+                    chunk_scores = evaluation_client.score(
+                        [hypothesis_corpus[i] for i in query_ids], query_ids
+                    )
+                    latency.add(time.perf_counter() - request_start)
+                    for i, score in zip(query_ids, chunk_scores):
+                        scores[i] = score
+        except Exception as e:
+            errors.append(e)
+
+    start = time.perf_counter()
+    with EvaluationServer(
+        reference_corpus, max_batch_size=max_batch_size, max_wait=max_wait
+    ) as server:
+        startup_seconds = time.perf_counter() - start
+        url = server.url
+        threads = [
+            threading.Thread(target=client, args=(requests[k::n_clients],))
+            for k in range(n_clients)
+        ]
+        start = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        seconds = time.perf_counter() - start
+        server_stats = server.stats()
+    if errors:
+        raise errors[0]
+
+    accumulator = ScoreAccumulator()
+    for score in scores:
+        accumulator.add(score)
+    latency_summary = latency.summary()
+    batches = server_stats["batches"]
+    calls_per_set = batches["aligner_calls"] / n_hypothesis_sets
+    if log is not None:
+        print(
+            "%d requests in %.4fs, %.1f requests/s, p50 %.4fs, p99 %.4fs, "
+            "%d batches of %.1f sets, %.3f aligner calls per set"
+            % (
+                len(requests),
+                seconds,
+                len(requests) / seconds,
+                latency_summary["p50"],
+                latency_summary["p99"],
+                batches["count"],
+                batches["mean_size"],
+                calls_per_set,
+            ),
+            file=log,
+        )
+    return {
+        "version": RESULTS_VERSION,
+        "config": config._asdict(),
+        "environment": _environment(),
+        "n_clients": n_clients,
+        "sets_per_request": sets_per_request,
+        "rounds": rounds,
+        "max_batch_size": max_batch_size,
+        "max_wait": max_wait,
+        "startup_seconds": startup_seconds,
+        "seconds": seconds,
+        "requests": len(requests),
+        "requests_per_second": len(requests) / seconds,
+        "hypothesis_sets_per_second": n_hypothesis_sets / seconds,
+        "latency": latency_summary,
+        "server": server_stats,
+        "aligner_calls_per_set": calls_per_set,
+        "direct_seconds": direct_seconds,
+        "same_as_direct": accumulator.mean() == direct,
+    }
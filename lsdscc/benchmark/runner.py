@@ -0,0 +1,319 @@
+# MIT License
+#
+# Copyright (c) 2019 Cong Feng.
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+"""
+The benchmark runner module.
+
+``run_benchmark`` times the stages of an evaluation on a synthetic corpus:
+
+  - ``load/json``: parsing the corpora with ``ReferenceSet.load_json_corpus`` and
+    ``HypothesisSet.load_corpus``.
+  - ``load/compiled``: loading the compiled reference corpus (see ``lsdscc.compiled``).
+  - ``ngrams``: building the ReferenceIndex of each reference set with its n-gram tables.
+  - ``align/<aligner>``: scoring every hypothesis against every group with an aligner.
+  - ``aggregate``: computing the metrics from the score matrices.
+  - ``corpus/<aligner>``: ``compute_score_on_corpus`` from end to end.
+
+Each stage is run several times and the best time is kept, together with the throughput in
+items (references, hypotheses or pairs) per second. The results are plain dicts ready to be
+dumped to json, and ``compare_results`` checks them against a baseline.
+"""
+import os
+import platform
+import sys
+import tempfile
+import time
+
+import lsdscc
+from lsdscc.benchmark.synthetic import (
+    generate_corpora,
+    write_hypothesis_corpus,
+    write_reference_corpus,
+)
+from lsdscc.compiled import load_reference_corpus, save_reference_corpus
+from lsdscc.compact import CompactReferenceCorpus
+from lsdscc.ds import HypothesisSet, ReferenceSet
+from lsdscc.index import ReferenceIndex
+from lsdscc.memo import ngram_memo
+from lsdscc.metrics import (
+    ScoreAccumulator,
+    _aggregate,
+    _best_scores,
+    _score_matrix,
+    compute_score_on_corpus,
+)
+
+__all__ = [
+    "ALIGNERS",
+    "RESULTS_VERSION",
+    "run_benchmark",
+    "compare_results",
+]
+
+RESULTS_VERSION = 1
+
+
+def _bleu():
+    from lsdscc.align import BleuAligner
+
+    return BleuAligner()
+
+
+def _native_bleu():
+    from lsdscc.align import NativeBleuAligner
+
+    return NativeBleuAligner("method1")
+
+
+def _native_nist():
+    from lsdscc.align import NativeNistAligner
+
+    return NativeNistAligner()
+
+
+def _multi_bleu():
+    from lsdscc.align import MultiBleuAligner
+
+    return MultiBleuAligner()
+
+
+def _nltk_bleu():
+    from nltk.translate.bleu_score import SmoothingFunction
+    from lsdscc.align import NLTKBleuAligner
+
+    return NLTKBleuAligner(SmoothingFunction().method1)
+
+
+def _nltk_nist():
+    from lsdscc.align import NLTKNistAligner
+
+    return NLTKNistAligner()
+
+
+# The aligners to benchmark, by name.
+ALIGNERS = {
+    "bleu": _bleu,
+    "native_bleu": _native_bleu,
+    "native_nist": _native_nist,
+    "multi_bleu": _multi_bleu,
+    "nltk_bleu": _nltk_bleu,
+    "nltk_nist": _nltk_nist,
+}
+
+
+def _time(fn, repeats, setup=None):
+    """
+    Time a function several times.
+
+    :param fn: the function to time. It takes the return value of ``setup``.
+    :param repeats: the number of runs.
+    :param setup: an optional function run before each run, which is not timed.
+    :return: (the times of the runs in seconds, the return value of the last run).
+    """
+    times = []
+    result = None
+    for _ in range(repeats):
+        arg = setup() if setup is not None else None
+        ngram_memo.clear()
+        start = time.perf_counter()
+        result = fn(arg)
+        times.append(time.perf_counter() - start)
+    return times, result
+
+
+def _stage(times, n_items):
+    best = min(times)
+    return {
+        "seconds": best,
+        "times": times,
+        "items": n_items,
+        "items_per_second": n_items / best if best > 0 else None,
+    }
+
+
+def _environment():
+    environment = {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "lsdscc": lsdscc.__version__,
+    }
+    for module in ("numpy", "nltk"):
+        try:
+            environment[module] = __import__(module).__version__
+        except ImportError:
+            environment[module] = None
+    return environment
+
+
+def run_benchmark(config, aligners=None, repeats=3, log=None):
+    """
+    Time the stages of an evaluation on a synthetic corpus.
+
+    :param config: SyntheticCorpusConfig.
+    :param aligners: the names of the aligners to benchmark, keys of ``ALIGNERS``.
+    Default to all of them.
+    :param repeats: the number of runs of each stage. The best one is kept.
+    :param log: an optional file to report the progress to.
+    :return: dict with the config, the environment and the stages.
+    """
+    if aligners is None:
+        aligners = list(ALIGNERS)
+    stages = {}
+
+    def report(name):
+        if log is not None:
+            print("%-24s %.4fs" % (name, stages[name]["seconds"]), file=log)
+
+    hypothesis_corpus, reference_corpus = generate_corpora(config)
+    n_references = sum(rs.n_references for rs in reference_corpus)
+    n_hypotheses = sum(len(hs) for hs in hypothesis_corpus)
+    n_pairs = sum(
+        len(hs) * len(rs) for hs, rs in zip(hypothesis_corpus, reference_corpus)
+    )
+
+    with tempfile.TemporaryDirectory() as workdir:
+        reference_file = os.path.join(workdir, "reference.json")
+        hypothesis_file = os.path.join(workdir, "hypothesis.txt")
+        compiled_file = os.path.join(workdir, "reference.lsdscc")
+        write_reference_corpus(reference_corpus, reference_file)
+        write_hypothesis_corpus(hypothesis_corpus, hypothesis_file)
+
+        times, _ = _time(
+            lambda _: (
+                ReferenceSet.load_json_corpus(reference_file),
+                HypothesisSet.load_corpus(hypothesis_file),
+            ),
+            repeats,
+        )
+        stages["load/json"] = _stage(times, n_references + n_hypotheses)
+        report("load/json")
+
+        save_reference_corpus(
+            CompactReferenceCorpus.from_corpus(reference_corpus), compiled_file
+        )
+        times, _ = _time(
+            lambda _: [list(rs) for rs in load_reference_corpus(compiled_file)],
+            repeats,
+        )
+        stages["load/compiled"] = _stage(times, n_references)
+        report("load/compiled")
+
+    def build_index(_):
+        index = ReferenceIndex.from_corpus(reference_corpus)
+        for refs_index in index:
+            refs_index.merged_ngrams()
+            refs_index.encoded()
+        return index
+
+    times, index = _time(build_index, repeats)
+    stages["ngrams"] = _stage(times, n_references)
+    report("ngrams")
+
+    score_matrices = None
+    for name in aligners:
+        aligner = ALIGNERS[name]()
+
+        def score(index):
+            return [
+                _score_matrix(hs, rs, aligner, refs_index)
+                for hs, rs, refs_index in zip(
+                    hypothesis_corpus, reference_corpus, index
+                )
+            ]
+
+        # Each run gets fresh indexes so that their caches are not shared across runs.
+        times, matrices = _time(
+            score, repeats, setup=lambda: ReferenceIndex.from_corpus(reference_corpus)
+        )
+        stages["align/%s" % name] = _stage(times, n_pairs)
+        report("align/%s" % name)
+        if score_matrices is None:
+            score_matrices = matrices
+
+    if score_matrices is not None:
+
+        def aggregate(_):
+            accumulator = ScoreAccumulator()
+            for matrix, refs_index in zip(score_matrices, index):
+                aligned_groups, max_bleu_list = _best_scores(matrix)
+                accumulator.add(
+                    _aggregate(
+                        aligned_groups,
+                        max_bleu_list,
+                        refs_index.group_sizes,
+                        refs_index.n_references,
+                    )
+                )
+            return accumulator.mean()
+
+        times, _ = _time(aggregate, repeats)
+        stages["aggregate"] = _stage(times, n_hypotheses)
+        report("aggregate")
+
+    for name in aligners:
+        aligner = ALIGNERS[name]()
+        times, _ = _time(
+            lambda _: compute_score_on_corpus(
+                hypothesis_corpus, reference_corpus, aligner
+            ),
+            repeats,
+        )
+        stages["corpus/%s" % name] = _stage(times, n_hypotheses)
+        report("corpus/%s" % name)
+
+    return {
+        "version": RESULTS_VERSION,
+        "config": config._asdict(),
+        "environment": _environment(),
+        "repeats": repeats,
+        "stages": stages,
+    }
+
+
+def compare_results(results, baseline, tolerance=0.1):
+    """
+    Compare the stages of benchmark results against a baseline run with the same config.
+
+    :param results: the dict returned by ``run_benchmark``.
+    :param baseline: a dict returned by ``run_benchmark``, e.g., loaded from json.
+    :param tolerance: the relative slowdown allowed before a stage counts as a regression.
+    :return: a list of dict, one for each stage in both results, with the keys "stage",
+    "baseline", "seconds", "ratio" (seconds / baseline) and "regression".
+    """
+    if results["config"] != baseline["config"]:
+        raise ValueError("the baseline was run with a different config")
+    rows = []
+    for stage, result in results["stages"].items():
+        if stage not in baseline["stages"]:
+            continue
+        before, after = baseline["stages"][stage]["seconds"], result["seconds"]
+        ratio = after / before if before > 0 else float("inf")
+        rows.append(
+            {
+                "stage": stage,
+                "baseline": before,
+                "seconds": after,
+                "ratio": ratio,
+                "regression": ratio > 1 + tolerance,
+            }
+        )
+    return rows
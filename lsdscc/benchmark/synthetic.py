@@ -0,0 +1,196 @@
+# MIT License
+#
+# Copyright (c) 2019 Cong Feng.
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+"""
+The synthetic corpus module.
+
+It generates reference and hypothesis corpora of any size from a fixed seed. The words are
+drawn from a Zipf distribution over a synthetic vocabulary. Each group is built around a
+sentence of its own: its references are noisy copies of that sentence, and each hypothesis
+is a noisy copy of a reference of a random group. So the hypotheses match their groups much
+better than the other groups, as real responses do.
+"""
+import collections
+import itertools
+import json
+import random
+
+from lsdscc.ds import DEFAULT_EOS, HypothesisSet, ReferenceSet
+
+__all__ = [
+    "SyntheticCorpusConfig",
+    "generate_reference_corpus",
+    "generate_hypothesis_corpus",
+    "generate_corpora",
+    "write_reference_corpus",
+    "write_hypothesis_corpus",
+]
+
+SyntheticCorpusConfig = collections.namedtuple(
+    "SyntheticCorpusConfig",
+    [
+        "n_queries",
+        "n_groups",
+        "refs_per_group",
+        "hyps_per_set",
+        "mean_length",
+        "min_length",
+        "vocab_size",
+        "zipf_exponent",
+        "noise",
+        "seed",
+    ],
+    defaults=[100, 8, 4, 10, 12, 5, 10000, 1.1, 0.3, 0],
+)
+SyntheticCorpusConfig.__doc__ = """
+The shape of a synthetic corpus.
+
+  - n_queries: the number of queries, i.e., of hypothesis sets and reference sets.
+  - n_groups: the number of groups in each reference set.
+  - refs_per_group: the number of references in each group.
+  - hyps_per_set: the number of hypotheses in each hypothesis set.
+  - mean_length: the mean length of the sentences.
+  - min_length: the min length of the sentences. NIST needs at least its order.
+  - vocab_size: the number of distinct words.
+  - zipf_exponent: the skew of the word distribution. 0 means uniform.
+  - noise: the probability that a word of a copied sentence is replaced.
+  - seed: the random seed. The same config always gives the same corpora.
+"""
+
+
+class _WordSampler:
+    """
+    Draw words and sentences from a Zipf distribution.
+    """
+
+    def __init__(self, config, rng):
+        self._config = config
+        self._rng = rng
+        self._words = ["w%d" % i for i in range(config.vocab_size)]
+        self._cum_weights = list(
+            itertools.accumulate(
+                1.0 / (rank + 1) ** config.zipf_exponent
+                for rank in range(config.vocab_size)
+            )
+        )
+
+    def words(self, n):
+        return self._rng.choices(self._words, cum_weights=self._cum_weights, k=n)
+
+    def sentence(self):
+        config = self._config
+        length = round(self._rng.gauss(config.mean_length, config.mean_length / 3))
+        return self.words(max(config.min_length, length))
+
+    def copy(self, sentence):
+        """
+        Return a noisy copy of a sentence.
+        """
+        noise = self._config.noise
+        replacements = self.words(len(sentence))
+        return [
+            new if self._rng.random() < noise else old
+            for old, new in zip(sentence, replacements)
+        ]
+
+
+def generate_reference_corpus(config):
+    """
+    Generate a reference corpus.
+
+    :param config: SyntheticCorpusConfig.
+    :return: List[ReferenceSet].
+    """
+    sampler = _WordSampler(config, random.Random("%d-references" % config.seed))
+    corpus = []
+    for q in range(config.n_queries):
+        reference_set = []
+        for _ in range(config.n_groups):
+            sentence = sampler.sentence()
+            reference_set.append(
+                [sampler.copy(sentence) for _ in range(config.refs_per_group)]
+            )
+        corpus.append(ReferenceSet(reference_set, query="query %d" % q))
+    return corpus
+
+
+def generate_hypothesis_corpus(config, reference_corpus):
+    """
+    Generate a hypothesis corpus for a reference corpus.
+
+    :param config: SyntheticCorpusConfig.
+    :param reference_corpus: the List[ReferenceSet] generated with the same config.
+    :return: List[HypothesisSet].
+    """
+    rng = random.Random("%d-hypotheses" % config.seed)
+    sampler = _WordSampler(config, rng)
+    corpus = []
+    for reference_set in reference_corpus:
+        hypothesis_set = []
+        for _ in range(config.hyps_per_set):
+            refs = reference_set[rng.randrange(len(reference_set))]
+            hypothesis_set.append(sampler.copy(refs[rng.randrange(len(refs))]))
+        corpus.append(HypothesisSet(hypothesis_set))
+    return corpus
+
+
+def generate_corpora(config):
+    """
+    Generate a hypothesis corpus and a reference corpus.
+
+    :param config: SyntheticCorpusConfig.
+    :return: (List[HypothesisSet], List[ReferenceSet]).
+    """
+    reference_corpus = generate_reference_corpus(config)
+    return generate_hypothesis_corpus(config, reference_corpus), reference_corpus
+
+
+def write_reference_corpus(reference_corpus, filename):
+    """
+    Write a reference corpus in the json format of ``ReferenceSet.load_json_corpus``.
+
+    :param reference_corpus: a list of ReferenceSet. The queries must be distinct.
+    :param filename: the output file.
+    """
+    json_data = {
+        reference_set.query: {
+            str(k + 1): [" ".join(ref) for ref in refs]
+            for k, refs in enumerate(reference_set)
+        }
+        for reference_set in reference_corpus
+    }
+    assert len(json_data) == len(reference_corpus), "the queries must be distinct"
+    with open(filename, "w") as f:
+        json.dump(json_data, f)
+
+
+def write_hypothesis_corpus(hypothesis_corpus, filename, eos=None):
+    """
+    Write a hypothesis corpus in the format of ``HypothesisSet.load_corpus``.
+
+    :param hypothesis_corpus: a list of hypothesis_set.
+    :param filename: the output file.
+    :param eos: the end-of-sentence indicator. Default to ``DEFAULT_EOS``.
+    """
+    eos = " %s " % (eos or DEFAULT_EOS)
+    with open(filename, "w") as f:
+        for hypothesis_set in hypothesis_corpus:
+            print(eos.join(" ".join(h) for h in hypothesis_set), file=f)
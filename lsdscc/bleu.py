@@ -19,6 +19,10 @@ a hypothesis set and a annotated reference group.
 
 import collections
 import math
+import time
+
+import lsdscc.instrument as _instrument
+from lsdscc.memo import ngram_memo
 
 __all__ = [
     "BleuAligner",
@@ -32,6 +36,8 @@ DEFAULT_MAX_ORDER = 4
 def _get_ngrams(segment, max_order):
     """Extracts all n-grams upto a given maximum order from an input segment.
 
+    The result is memoized in ``lsdscc.memo.ngram_memo`` and must not be mutated.
+
     Args:
         segment: text segment from which n-grams will be extracted.
         max_order: maximum length in tokens of the n-grams returned by this methods.
@@ -40,12 +46,20 @@ def _get_ngrams(segment, max_order):
         The Counter containing all n-grams upto max_order in segment
         with a count of how many times each n-gram occurred.
     """
+    return ngram_memo.get(segment, max_order, _count_ngrams)
+
+
+def _count_ngrams(segment, max_order):
+    """The version of ``_get_ngrams`` without memoization."""
+    start = time.perf_counter() if _instrument.hooks else None
     ngram_counts = collections.Counter()
     for order in range(1, max_order + 1):
         for i in range(0, len(segment) - order + 1):
             # For ngram to be hashable.
             ngram = tuple(segment[i : i + order])
             ngram_counts[ngram] += 1
+    if start is not None:
+        _instrument.emit("ngram", time.perf_counter() - start)
     return ngram_counts
 
 
@@ -83,35 +97,177 @@ def _bleu_without_bp(
     for (references, translation) in zip(reference_corpus, translation_corpus):
         reference_length += min(len(r) for r in references)
         translation_length += len(translation)
+        _accumulate_matches(
+            translation,
+            _get_ngrams(translation, max_order),
+            _merge_ref_ngrams(references, max_order),
+            max_order,
+            matches_by_order,
+            possible_matches_by_order,
+        )
+
+    return _geo_mean(matches_by_order, possible_matches_by_order, max_order, smooth)
+
+
+def _bleu_without_bp_against_groups(
+    translation, merged_ref_ngram_counts_list, max_order=None, smooth=False
+):
+    """Computes BLEU of one translation against many groups of references.
+
+    This is the same as calling ``_bleu_without_bp`` once per group, except that the
+    n-grams of the references are expected to be merged beforehand (see ``_merge_ref_ngrams``)
+    and the n-grams of the translation are extracted only once.
+
+    Args:
+        translation: a list of tokens.
+        merged_ref_ngram_counts_list: list of merged reference n-gram counts, one for each group.
+        max_order: Maximum n-gram order to use when computing BLEU score.
+        smooth: Whether or not to apply Lin et al. 2004 smoothing.
+
+    Returns:
+        List of geometric means, one for each group.
+    """
+    max_order = max_order or DEFAULT_MAX_ORDER
+    translation_ngram_counts = _get_ngrams(translation, max_order)
+    scores = []
+    for merged_ref_ngram_counts in merged_ref_ngram_counts_list:
+        matches_by_order = [0] * max_order
+        possible_matches_by_order = [0] * max_order
+        _accumulate_matches(
+            translation,
+            translation_ngram_counts,
+            merged_ref_ngram_counts,
+            max_order,
+            matches_by_order,
+            possible_matches_by_order,
+        )
+        scores.append(
+            _geo_mean(matches_by_order, possible_matches_by_order, max_order, smooth)
+        )
+    return scores
+
+
+def _best_group(
+    translation,
+    merged_ref_ngram_counts_list,
+    unigram_counts_list,
+    max_order=None,
+    smooth=False,
+):
+    """Finds the group of references against which a translation has the highest BLEU.
+
+    The groups are visited in decreasing order of an upper bound of their BLEU and the search
+    stops as soon as no remaining bound can beat the best score so far. The bound uses the
+    exact clipped unigram matches and, for higher orders, the number of n-grams of the
+    translation made up of words of the group. The result is exactly the same as taking
+    ``np.argmax`` and ``max`` of the scores of all the groups, including the tie-breaking.
+
+    Args:
+        translation: a list of tokens.
+        merged_ref_ngram_counts_list: list of merged reference n-gram counts, one for each group.
+        unigram_counts_list: list of merged reference unigram counts, one for each group.
+        max_order: Maximum n-gram order to use when computing BLEU score.
+        smooth: Whether or not to apply Lin et al. 2004 smoothing.
+
+    Returns:
+        3-Tuple with the index of the best group, its score and the number of groups scored.
+    """
+    max_order = max_order or DEFAULT_MAX_ORDER
+    possible_matches_by_order = [
+        max(len(translation) - order + 1, 0) for order in range(1, max_order + 1)
+    ]
+    translation_unigram_counts = _get_ngrams(translation, 1)
+    bounds = []
+    for unigram_counts in unigram_counts_list:
+        overlap = translation_unigram_counts & unigram_counts
+        matches_by_order = [sum(overlap.values())]
+        # Lengths of the runs of consecutive words that appear in the group.
+        runs = [0]
+        for token in translation:
+            if (token,) in unigram_counts:
+                runs[-1] += 1
+            elif runs[-1]:
+                runs.append(0)
+        for order in range(2, max_order + 1):
+            matches_by_order.append(sum(max(run - order + 1, 0) for run in runs))
+        bounds.append(
+            _geo_mean(matches_by_order, possible_matches_by_order, max_order, smooth)
+        )
+
+    translation_ngram_counts = _get_ngrams(translation, max_order)
+    best_index, best_score, n_scored = -1, -math.inf, 0
+    for k in sorted(range(len(bounds)), key=lambda k: (-bounds[k], k)):
+        if bounds[k] < best_score or (bounds[k] == best_score and k > best_index):
+            break
+        matches_by_order = [0] * max_order
+        possible_matches_by_order = [0] * max_order
+        _accumulate_matches(
+            translation,
+            translation_ngram_counts,
+            merged_ref_ngram_counts_list[k],
+            max_order,
+            matches_by_order,
+            possible_matches_by_order,
+        )
+        score = _geo_mean(
+            matches_by_order, possible_matches_by_order, max_order, smooth
+        )
+        n_scored += 1
+        if score > best_score or (score == best_score and k < best_index):
+            best_index, best_score = k, score
+    return best_index, best_score, n_scored
+
+
+def _merge_ref_ngrams(references, max_order):
+    """Merges the n-grams of references by taking the max count of each n-gram.
+
+    Args:
+        references: list of references, each of which is a list of tokens.
+        max_order: maximum length in tokens of the n-grams.
+
+    Returns:
+        The Counter mapping each n-gram to its max count among all references.
+    """
+    merged_ref_ngram_counts = collections.Counter()
+    for reference in references:
+        # The | operator computes the maximum reference count as in the original paper.
+        # In fact, for any instance of n-grams, we takes its max count among all references.
+        # For example, ref1 is "the", ref2 is "the the", we are using n=1 (unigram),
+        # then the max reference count for "the" will be 2.
+        merged_ref_ngram_counts |= _get_ngrams(reference, max_order)
+    return merged_ref_ngram_counts
+
+
+def _accumulate_matches(
+    translation,
+    translation_ngram_counts,
+    merged_ref_ngram_counts,
+    max_order,
+    matches_by_order,
+    possible_matches_by_order,
+):
+    """Adds the clipped and possible matches of a translation to the per-order counts in place."""
+    # The & operator does the clipping as in the original paper.
+    # It ensures that the counts in overlap does not exceed that in the merged counts.
+    # The clipping prevents meaningless translation consisting of many repeated words being overestimated,
+    # like "the the the..." against "the cat sat on the mat".
+    overlap = translation_ngram_counts & merged_ref_ngram_counts
+    for ngram in overlap:
+        matches_by_order[len(ngram) - 1] += overlap[ngram]
+
+    # Compute normalizer or dividend of the precisions.
+    # This computes the counts of all n-grams ranging from 1 to max_order in a translation,
+    # stored in `possible_matches_by_order[i]`.
+    # This term serves as the normalizer or dividend of the modified-ngrams-precision.
+    # The for loop below defines a simple function, see test_ngram_count.py for its behaviours.
+    for order in range(1, max_order + 1):
+        possible_matches = len(translation) - order + 1
+        if possible_matches > 0:
+            possible_matches_by_order[order - 1] += possible_matches
+
 
-        merged_ref_ngram_counts = collections.Counter()
-        for reference in references:
-            # The | operator computes the maximum reference count as in the original paper.
-            # In fact, for any instance of n-grams, we takes its max count among all references.
-            # For example, ref1 is "the", ref2 is "the the", we are using n=1 (unigram),
-            # then the max reference count for "the" will be 2.
-            merged_ref_ngram_counts |= _get_ngrams(reference, max_order)
-        translation_ngram_counts = _get_ngrams(translation, max_order)
-
-        # The & operator does the clipping as in the original paper.
-        # It ensures that the counts in overlap does not exceed that in the merged counts.
-        # The clipping prevents meaningless translation consisting of many repeated words being overestimated,
-        # like "the the the..." against "the cat sat on the mat".
-        overlap = translation_ngram_counts & merged_ref_ngram_counts
-        for ngram in overlap:
-            matches_by_order[len(ngram) - 1] += overlap[ngram]
-
-        # Compute normalizer or dividend of the precisions.
-        # This computes the counts of all n-grams ranging from 1 to max_order in a translation,
-        # stored in `possible_matches_by_order[i]`.
-        # This term serves as the normalizer or dividend of the modified-ngrams-precision.
-        # The for loop below defines a simple function, see test_ngram_count.py for its behaviours.
-        for order in range(1, max_order + 1):
-            possible_matches = len(translation) - order + 1
-            if possible_matches > 0:
-                possible_matches_by_order[order - 1] += possible_matches
-
-    # Compute the modified n-grams precision.
+def _geo_mean(matches_by_order, possible_matches_by_order, max_order, smooth):
+    """Computes the geometric mean of the modified n-gram precisions."""
     precisions = [0] * max_order
     for i in range(0, max_order):
         if smooth:
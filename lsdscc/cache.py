@@ -0,0 +1,259 @@
+# MIT License
+#
+# Copyright (c) 2019 Cong Feng.
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+"""
+The persistent score cache module.
+
+The scores of a hypothesis against all the groups of a reference set are stored in a
+sqlite database, keyed by the hash of the hypothesis tokens, the fingerprint of the
+reference set and the configuration of the aligner. Since generated responses repeat
+a lot between checkpoints, many of them are never scored twice.
+"""
+import hashlib
+import json
+import logging
+import sqlite3
+import time
+
+import numpy as np
+
+__all__ = [
+    "ScoreCache",
+]
+
+_logger = logging.getLogger(__name__)
+
+# Eviction is checked once per this many insertions.
+_EVICTION_INTERVAL = 1000
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS scores (
+    key BLOB PRIMARY KEY,
+    scores BLOB NOT NULL,
+    last_used INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS scores_last_used ON scores (last_used);
+"""
+
+
+class ScoreCache:
+    """
+    An on-disk cache of the per-group scores of hypotheses.
+
+    It is safe to share the same file among several processes. When the number of
+    entries exceeds ``max_entries``, the least recently used ones are evicted.
+    The cache can be pickled, in which case the copy reopens the same file.
+    """
+
+    def __init__(self, filename, max_entries=1000000, timeout=60.0):
+        self.filename = str(filename)
+        self.max_entries = max_entries
+        self.timeout = timeout
+        self.hits = 0
+        self.misses = 0
+        self._n_inserted = 0
+        self._conn = sqlite3.connect(
+            self.filename, timeout=timeout, isolation_level=None
+        )
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(_SCHEMA)
+
+    def __getstate__(self):
+        return self.filename, self.max_entries, self.timeout
+
+    def __setstate__(self, state):
+        self.__init__(*state)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def __len__(self):
+        """
+        Return the number of entries.
+        """
+        return self._conn.execute("SELECT COUNT(*) FROM scores").fetchone()[0]
+
+    def close(self, evict=True):
+        """
+        Evict the excess entries and close the database.
+
+        :param evict: whether to evict first. The short-lived copies of the workers leave it
+        to the cache they are copied from, so that eviction does not count the entries once
+        per chunk.
+        """
+        if evict:
+            self.evict()
+        self._conn.close()
+
+    @staticmethod
+    def key_prefix(aligner, index):
+        """
+        Return the part of the keys shared by all the hypotheses scored against a reference set,
+        or None if the aligner cannot be cached.
+
+        :param aligner: an aligner with a ``cache_key()`` method.
+        :param index: the ReferenceIndex of the reference set.
+        :return: str or None.
+        """
+        cache_key = getattr(aligner, "cache_key", None)
+        aligner_key = cache_key() if cache_key is not None else None
+        if aligner_key is None:
+            return None
+        return "%s\n%s\n" % (aligner_key, index.fingerprint)
+
+    @staticmethod
+    def key(prefix, hypothesis):
+        """
+        Return the key of a hypothesis.
+
+        :param prefix: as returned by ``key_prefix``.
+        :param hypothesis: a single hypothesis.
+        :return: bytes.
+        """
+        return hashlib.sha256((prefix + json.dumps(list(hypothesis))).encode()).digest()
+
+    def get_many(self, keys):
+        """
+        Look up the scores of many keys, updating their last used time.
+
+        :param keys: a list of keys.
+        :return: dict from the keys found to their scores as np.ndarray.
+        """
+        keys = list(set(keys))
+        found = {}
+        for i in range(0, len(keys), 500):
+            chunk = keys[i : i + 500]
+            rows = self._conn.execute(
+                "SELECT key, scores FROM scores WHERE key IN (%s)"
+                % ",".join("?" * len(chunk)),
+                chunk,
+            )
+            for key, scores in rows:
+                found[key] = np.frombuffer(scores, dtype=np.float64)
+        if found:
+            with self._transaction():
+                self._conn.executemany(
+                    "UPDATE scores SET last_used = ? WHERE key = ?",
+                    [(time.time_ns(), key) for key in found],
+                )
+        return found
+
+    def put_many(self, items):
+        """
+        Store the scores of many keys.
+
+        :param items: an iterable of (key, scores).
+        """
+        rows = [
+            (key, np.asarray(scores, dtype=np.float64).tobytes(), time.time_ns())
+            for key, scores in items
+        ]
+        with self._transaction():
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO scores (key, scores, last_used) VALUES (?, ?, ?)",
+                rows,
+            )
+        self._n_inserted += len(rows)
+        if self._n_inserted >= _EVICTION_INTERVAL:
+            self.evict()
+
+    def evict(self):
+        """
+        Evict the least recently used entries in excess of ``max_entries``.
+        """
+        self._n_inserted = 0
+        with self._transaction():
+            excess = len(self) - self.max_entries
+            if excess > 0:
+                _logger.info("evicting %d entries from %s", excess, self.filename)
+                self._conn.execute(
+                    "DELETE FROM scores WHERE key IN "
+                    "(SELECT key FROM scores ORDER BY last_used LIMIT ?)",
+                    (excess,),
+                )
+
+    def _transaction(self):
+        return _Transaction(self._conn)
+
+    def stats(self):
+        """
+        Return the hit and miss counts of this cache object.
+
+        :return: dict.
+        """
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+        }
+
+    def score_matrix(self, hypothesis_set, index, aligner, score_matrix):
+        """
+        Compute the score matrix of a hypothesis set through the cache.
+
+        :param hypothesis_set: a hypothesis set.
+        :param index: the ReferenceIndex of the reference set.
+        :param aligner: the aligner.
+        :param score_matrix: a callable taking a list of hypotheses and returning
+        their score matrix. It is called on the hypotheses missing from the cache.
+        :return: np.ndarray of shape (n_hypotheses, n_groups).
+        """
+        hypotheses = list(hypothesis_set)
+        prefix = self.key_prefix(aligner, index)
+        if prefix is None:
+            return score_matrix(hypotheses)
+        keys = [self.key(prefix, h) for h in hypotheses]
+        found = self.get_many(keys)
+        missing = {}
+        for key, h in zip(keys, hypotheses):
+            if key not in found:
+                missing.setdefault(key, h)
+        n_missing = sum(key not in found for key in keys)
+        self.hits += len(keys) - n_missing
+        self.misses += n_missing
+        if missing:
+            computed = score_matrix(list(missing.values()))
+            new_items = list(zip(missing, computed))
+            self.put_many(new_items)
+            found.update(new_items)
+        return np.array([found[key] for key in keys], dtype=np.float64).reshape(
+            len(keys), len(index)
+        )
+
+
+class _Transaction:
+    """
+    An immediate transaction that is committed on success and rolled back on error.
+    """
+
+    def __init__(self, conn):
+        self._conn = conn
+
+    def __enter__(self):
+        self._conn.execute("BEGIN IMMEDIATE")
+
+    def __exit__(self, exc_type, *_):
+        self._conn.execute("COMMIT" if exc_type is None else "ROLLBACK")
@@ -0,0 +1,423 @@
+# MIT License
+#
+# Copyright (c) 2019 Cong Feng.
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+"""
+The compact data structure module.
+
+A compact corpus stores the token ids of all its sentences in one flat ``array``, together
+with offset arrays that delimit the sentences, groups and sets. The sets are exposed as
+lightweight views with the same interface as ``HypothesisSet`` and ``ReferenceSet``,
+decoding the sentences back to lists of tokens on access.
+"""
+import array
+
+from lsdscc.ds import HypothesisSet, ReferenceSet
+
+__all__ = [
+    "Vocabulary",
+    "CompactHypothesisCorpus",
+    "CompactReferenceCorpus",
+]
+
+# Type codes of the arrays.
+_TOKEN_TYPECODE = "i"
+_OFFSET_TYPECODE = "q"
+
+
+class Vocabulary:
+    """
+    A mapping between interned tokens and their integer ids.
+    """
+
+    __slots__ = ("_ids", "_tokens")
+
+    def __init__(self, tokens=()):
+        self._ids = {}
+        self._tokens = []
+        for token in tokens:
+            self.intern(token)
+
+    def __len__(self):
+        return len(self._tokens)
+
+    def __contains__(self, token):
+        return token in self._ids
+
+    def __iter__(self):
+        return iter(self._tokens)
+
+    def intern(self, token):
+        """
+        Return the id of a token, assigning a new one if it is unseen.
+        """
+        try:
+            return self._ids[token]
+        except KeyError:
+            self._ids[token] = token_id = len(self._tokens)
+            self._tokens.append(token)
+            return token_id
+
+    def encode(self, sentence):
+        """
+        Return the ids of the tokens of a sentence, interning unseen ones.
+        """
+        return [self.intern(token) for token in sentence]
+
+    def decode(self, token_ids):
+        """
+        Return the tokens of a list of ids.
+        """
+        tokens = self._tokens
+        return [tokens[i] for i in token_ids]
+
+
+class _SentenceList:
+    """
+    A view of the consecutive sentences ``[start, stop)`` of a compact corpus.
+    """
+
+    __slots__ = ("_corpus", "_start", "_stop")
+
+    def __init__(self, corpus, start, stop):
+        self._corpus = corpus
+        self._start = start
+        self._stop = stop
+
+    def __len__(self):
+        return self._stop - self._start
+
+    def __getitem__(self, item):
+        if isinstance(item, slice):
+            return [self[i] for i in range(*item.indices(len(self)))]
+        if item < 0:
+            item += len(self)
+        if not 0 <= item < len(self):
+            raise IndexError("sentence index out of range")
+        return self._corpus.sentence(self._start + item)
+
+    def __iter__(self):
+        sentence = self._corpus.sentence
+        return (sentence(i) for i in range(self._start, self._stop))
+
+    def __eq__(self, other):
+        return list(self) == list(other)
+
+    def __repr__(self):
+        return repr(list(self))
+
+
+class _CompactCorpus:
+    """
+    The storage shared by the compact corpora: the flat token ids and the sentence offsets.
+    """
+
+    __slots__ = ("vocab", "tokens", "sentence_offsets")
+
+    def __init__(self, vocab=None):
+        self.vocab = Vocabulary() if vocab is None else vocab
+        self.tokens = array.array(_TOKEN_TYPECODE)
+        self.sentence_offsets = array.array(_OFFSET_TYPECODE, [0])
+
+    @property
+    def n_sentences(self):
+        """
+        Return the total number of sentences.
+        """
+        return len(self.sentence_offsets) - 1
+
+    def sentence(self, i):
+        """
+        Return the i-th sentence as a list of tokens.
+        """
+        offsets = self.sentence_offsets
+        return self.vocab.decode(self.tokens[offsets[i] : offsets[i + 1]])
+
+    def _append_sentence(self, sentence):
+        self.tokens.extend(self.vocab.encode(sentence))
+        self.sentence_offsets.append(len(self.tokens))
+
+    def nbytes(self):
+        """
+        Return the size in bytes of the arrays (not counting the vocabulary).
+        """
+        return sum(
+            a.itemsize * len(a)
+            for a in (self.tokens, self.sentence_offsets) + self._extra_arrays()
+        )
+
+    def _extra_arrays(self):
+        return ()
+
+
+class CompactHypothesisSet:
+    """
+    A view of a hypothesis set of a CompactHypothesisCorpus.
+    """
+
+    __slots__ = ("_corpus", "_index")
+
+    def __init__(self, corpus, index):
+        self._corpus = corpus
+        self._index = index
+
+    def _sentences(self):
+        offsets = self._corpus.set_offsets
+        i = self._index
+        return _SentenceList(self._corpus, offsets[i], offsets[i + 1])
+
+    def __len__(self):
+        return len(self._sentences())
+
+    def __iter__(self):
+        return iter(self._sentences())
+
+    def __getitem__(self, item):
+        return self._sentences()[item]
+
+    def __repr__(self):
+        return "<%s with %d hypotheses>" % (self.__class__.__name__, len(self))
+
+    def __reduce__(self):
+        # Pickle as a plain HypothesisSet instead of dragging the whole corpus along.
+        return HypothesisSet, (list(self),)
+
+
+class CompactHypothesisCorpus(_CompactCorpus):
+    """
+    A list of hypothesis sets in compact storage.
+    """
+
+    __slots__ = ("set_offsets",)
+
+    def __init__(self, vocab=None):
+        super().__init__(vocab)
+        self.set_offsets = array.array(_OFFSET_TYPECODE, [0])
+
+    def __len__(self):
+        return len(self.set_offsets) - 1
+
+    def __getitem__(self, item):
+        if isinstance(item, slice):
+            return [self[i] for i in range(*item.indices(len(self)))]
+        if item < 0:
+            item += len(self)
+        if not 0 <= item < len(self):
+            raise IndexError("hypothesis set index out of range")
+        return CompactHypothesisSet(self, item)
+
+    def __iter__(self):
+        return (CompactHypothesisSet(self, i) for i in range(len(self)))
+
+    def __repr__(self):
+        return "<%s with %d hypothesis sets, %d hypotheses>" % (
+            self.__class__.__name__,
+            len(self),
+            self.n_sentences,
+        )
+
+    def _extra_arrays(self):
+        return (self.set_offsets,)
+
+    def append(self, hypothesis_set):
+        """
+        Append a hypothesis set.
+
+        :param hypothesis_set: a hypothesis set.
+        """
+        for hypothesis in hypothesis_set:
+            self._append_sentence(hypothesis)
+        self.set_offsets.append(self.n_sentences)
+
+    @classmethod
+    def from_corpus(cls, hypothesis_corpus, vocab=None):
+        """
+        Create from an iterable of hypothesis_set.
+
+        :param hypothesis_corpus: an iterable of hypothesis_set.
+        :param vocab: an optional Vocabulary to share with other corpora.
+        :return: CompactHypothesisCorpus.
+        """
+        corpus = cls(vocab)
+        for hypothesis_set in hypothesis_corpus:
+            corpus.append(hypothesis_set)
+        return corpus
+
+    @classmethod
+    def load_corpus(cls, filename, eos=None, vocab=None):
+        """
+        Load from a plain text file, in the format of ``HypothesisSet.load_corpus``.
+
+        :param filename: the file to read. "-" means the standard input.
+        :param eos:
+        :param vocab: an optional Vocabulary to share with other corpora.
+        :return: CompactHypothesisCorpus.
+        """
+        return cls.from_corpus(HypothesisSet.iter_corpus(filename, eos), vocab)
+
+
+class CompactReferenceSet:
+    """
+    A view of a reference set of a CompactReferenceCorpus.
+    """
+
+    __slots__ = ("_corpus", "_index")
+
+    def __init__(self, corpus, index):
+        self._corpus = corpus
+        self._index = index
+
+    def _group_range(self):
+        offsets = self._corpus.set_offsets
+        return offsets[self._index], offsets[self._index + 1]
+
+    def __len__(self):
+        start, stop = self._group_range()
+        return stop - start
+
+    def __getitem__(self, item):
+        if isinstance(item, slice):
+            return [self[i] for i in range(*item.indices(len(self)))]
+        if item < 0:
+            item += len(self)
+        if not 0 <= item < len(self):
+            raise IndexError("group index out of range")
+        return self._corpus.group(self._group_range()[0] + item)
+
+    def __iter__(self):
+        group = self._corpus.group
+        return (group(k) for k in range(*self._group_range()))
+
+    @property
+    def n_references(self):
+        """
+        Return the total number of references.
+        """
+        start, stop = self._group_range()
+        offsets = self._corpus.group_offsets
+        return offsets[stop] - offsets[start]
+
+    @property
+    def query(self):
+        """
+        Return the associated query (if any).
+        """
+        return self._corpus.queries[self._index]
+
+    def __repr__(self):
+        return "<%s with %d groups, %d references>" % (
+            self.__class__.__name__,
+            len(self),
+            self.n_references,
+        )
+
+    def __reduce__(self):
+        # Pickle as a plain ReferenceSet instead of dragging the whole corpus along.
+        return ReferenceSet, ([list(refs) for refs in self], self.query)
+
+
+class CompactReferenceCorpus(_CompactCorpus):
+    """
+    A list of reference sets in compact storage.
+    """
+
+    __slots__ = ("group_offsets", "set_offsets", "queries")
+
+    def __init__(self, vocab=None):
+        super().__init__(vocab)
+        self.group_offsets = array.array(_OFFSET_TYPECODE, [0])
+        self.set_offsets = array.array(_OFFSET_TYPECODE, [0])
+        self.queries = []
+
+    def __len__(self):
+        return len(self.set_offsets) - 1
+
+    def __getitem__(self, item):
+        if isinstance(item, slice):
+            return [self[i] for i in range(*item.indices(len(self)))]
+        if item < 0:
+            item += len(self)
+        if not 0 <= item < len(self):
+            raise IndexError("reference set index out of range")
+        return CompactReferenceSet(self, item)
+
+    def __iter__(self):
+        return (CompactReferenceSet(self, i) for i in range(len(self)))
+
+    def __repr__(self):
+        return "<%s with %d reference sets, %d references>" % (
+            self.__class__.__name__,
+            len(self),
+            self.n_sentences,
+        )
+
+    def _extra_arrays(self):
+        return self.group_offsets, self.set_offsets
+
+    def group(self, k):
+        """
+        Return the k-th group of the whole corpus as a sequence of sentences.
+        """
+        offsets = self.group_offsets
+        return _SentenceList(self, offsets[k], offsets[k + 1])
+
+    def append(self, reference_set, query=None):
+        """
+        Append a reference set.
+
+        :param reference_set: a reference set.
+        :param query: the query of the reference set. Default to its ``query`` attribute.
+        """
+        for refs in reference_set:
+            for ref in refs:
+                self._append_sentence(ref)
+            self.group_offsets.append(self.n_sentences)
+        self.set_offsets.append(len(self.group_offsets) - 1)
+        if query is None:
+            query = getattr(reference_set, "query", None)
+        self.queries.append(query)
+
+    @classmethod
+    def from_corpus(cls, reference_corpus, vocab=None):
+        """
+        Create from an iterable of reference_set.
+
+        :param reference_corpus: an iterable of reference_set.
+        :param vocab: an optional Vocabulary to share with other corpora.
+        :return: CompactReferenceCorpus.
+        """
+        corpus = cls(vocab)
+        for reference_set in reference_corpus:
+            corpus.append(reference_set)
+        return corpus
+
+    @classmethod
+    def load_json_corpus(cls, filename=None, vocab=None):
+        """
+        Load from a json file, in the format of ``ReferenceSet.load_json_corpus``.
+        The file is read one query at a time.
+
+        :param filename: the file in json format. default to load the builtin lsdscc
+        test set.
+        :param vocab: an optional Vocabulary to share with other corpora.
+        :return: CompactReferenceCorpus.
+        """
+        return cls.from_corpus(ReferenceSet.iter_json_corpus(filename), vocab)
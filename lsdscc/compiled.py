@@ -0,0 +1,237 @@
+# MIT License
+#
+# Copyright (c) 2019 Cong Feng.
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+"""
+The compiled reference corpus module.
+
+A compiled reference corpus is a CompactReferenceCorpus saved in a binary file that is
+memory-mapped on load, so no parsing or tokenization is needed. The layout of the file is:
+
+  1. ``MAGIC``.
+  2. The length of the header as a little-endian uint64.
+  3. The header in json: the format version, byte order, vocabulary, queries and the
+     location of each array.
+  4. The arrays, each aligned to 8 bytes.
+
+``load_cached_reference_corpus`` compiles a json corpus on first use and stores the result
+in a cache directory, keyed by the content hash of the json file.
+"""
+import argparse
+import hashlib
+import json
+import logging
+import mmap
+import os
+import pathlib
+import struct
+import sys
+import tempfile
+import time
+
+import lsdscc.instrument as _instrument
+from lsdscc.compact import CompactReferenceCorpus, Vocabulary
+from lsdscc.data import default_reference_set
+
+__all__ = [
+    "save_reference_corpus",
+    "load_reference_corpus",
+    "load_cached_reference_corpus",
+    "default_cache_dir",
+    "file_digest",
+]
+
+_logger = logging.getLogger(__name__)
+
+MAGIC = b"LSDSCC\x00\x01"
+FORMAT_VERSION = 1
+COMPILED_SUFFIX = ".lsdscc"
+_HEADER_LENGTH = struct.Struct("<Q")
+_ALIGNMENT = 8
+_ARRAY_NAMES = ("tokens", "sentence_offsets", "group_offsets", "set_offsets")
+
+
+def _padding(n):
+    return -n % _ALIGNMENT
+
+
+def _typecode(a):
+    # Either an array.array or a memoryview of a loaded corpus.
+    return a.typecode if hasattr(a, "typecode") else a.format
+
+
+def save_reference_corpus(corpus, filename):
+    """
+    Save a CompactReferenceCorpus in the compiled format.
+    The file is written atomically.
+
+    :param corpus: a CompactReferenceCorpus.
+    :param filename: the output file.
+    """
+    arrays = [getattr(corpus, name) for name in _ARRAY_NAMES]
+    locations = {}
+    offset = 0
+    for name, a in zip(_ARRAY_NAMES, arrays):
+        nbytes = len(a) * a.itemsize
+        locations[name] = [offset, _typecode(a), len(a)]
+        offset += nbytes + _padding(nbytes)
+    header = json.dumps(
+        {
+            "version": FORMAT_VERSION,
+            "byteorder": sys.byteorder,
+            "vocab": list(corpus.vocab),
+            "queries": corpus.queries,
+            "arrays": locations,
+        }
+    ).encode()
+
+    filename = pathlib.Path(filename)
+    fd, tmp_name = tempfile.mkstemp(dir=filename.parent, suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(MAGIC)
+            f.write(_HEADER_LENGTH.pack(len(header)))
+            f.write(header)
+            f.write(b"\0" * _padding(f.tell()))
+            for a in arrays:
+                data = bytes(a)
+                f.write(data)
+                f.write(b"\0" * _padding(len(data)))
+        os.replace(tmp_name, filename)
+    except BaseException:
+        os.unlink(tmp_name)
+        raise
+    _logger.info("saved compiled reference corpus %s", filename)
+
+
+def load_reference_corpus(filename):
+    """
+    Load a compiled reference corpus by memory-mapping it.
+
+    :param filename: the compiled file.
+    :return: CompactReferenceCorpus, whose arrays are read-only views of the file.
+    """
+    _logger.info("loading compiled reference corpus %s", filename)
+    load_start = time.perf_counter() if _instrument.hooks else None
+    with open(filename, "rb") as f:
+        buf = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    view = memoryview(buf)
+    start = len(MAGIC) + _HEADER_LENGTH.size
+    if len(view) < start or view[: len(MAGIC)] != MAGIC:
+        raise ValueError("%s is not a compiled reference corpus" % filename)
+    (header_length,) = _HEADER_LENGTH.unpack(view[len(MAGIC) : start])
+    if start + header_length > len(view):
+        raise ValueError("%s is truncated" % filename)
+    header = json.loads(bytes(view[start : start + header_length]))
+    if header["version"] != FORMAT_VERSION or header["byteorder"] != sys.byteorder:
+        raise ValueError("%s is compiled in an incompatible format" % filename)
+    data_start = start + header_length
+    data_start += _padding(data_start)
+
+    corpus = CompactReferenceCorpus(Vocabulary(header["vocab"]))
+    corpus.queries = header["queries"]
+    for name in _ARRAY_NAMES:
+        offset, typecode, length = header["arrays"][name]
+        try:
+            itemsize = struct.calcsize(typecode)
+        except (struct.error, TypeError):
+            raise ValueError("%s has a bad array %s" % (filename, name))
+        begin = data_start + offset
+        end = begin + length * itemsize
+        # A slice past the end would be silently shorter.
+        if not data_start <= begin <= end <= len(view):
+            raise ValueError("%s is truncated" % filename)
+        # The views keep the mmap alive.
+        setattr(corpus, name, view[begin:end].cast(typecode))
+    if len(corpus.set_offsets) != len(corpus.queries) + 1:
+        raise ValueError("%s is inconsistent" % filename)
+    if load_start is not None:
+        _instrument.emit("load", time.perf_counter() - load_start, len(corpus))
+    return corpus
+
+
+def default_cache_dir():
+    """
+    Return the directory to cache compiled corpora, which is ``$LSDSCC_CACHE_DIR`` if it is set
+    or ``lsdscc`` under ``$XDG_CACHE_HOME`` (default to ``~/.cache``).
+    """
+    cache_dir = os.environ.get("LSDSCC_CACHE_DIR")
+    if cache_dir:
+        return pathlib.Path(cache_dir)
+    cache_home = os.environ.get("XDG_CACHE_HOME") or pathlib.Path.home() / ".cache"
+    return pathlib.Path(cache_home) / "lsdscc"
+
+
+def file_digest(filename):
+    """
+    Return the sha256 of a file in hex, which is the key of its compiled corpus in the cache.
+    """
+    sha256 = hashlib.sha256()
+    with open(filename, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            sha256.update(chunk)
+    return sha256.hexdigest()
+
+
+def load_cached_reference_corpus(filename=None, cache_dir=None, digest=None):
+    """
+    Load a json reference corpus through the cache of compiled corpora.
+
+    On a cache miss, the json file is compiled and the result is saved to the cache.
+    If the cache cannot be written, the compiled corpus is still returned.
+
+    :param filename: the file in json format. default to load the builtin lsdscc
+    test set.
+    :param cache_dir: the cache directory. Default to ``default_cache_dir()``.
+    :param digest: the ``file_digest`` of the file, if the caller already has it.
+    :return: CompactReferenceCorpus.
+    """
+    if filename is None:
+        filename = default_reference_set
+    if cache_dir is None:
+        cache_dir = default_cache_dir()
+    if digest is None:
+        digest = file_digest(filename)
+    cache_dir = pathlib.Path(cache_dir)
+    compiled = cache_dir / ("%s.v%d%s" % (digest, FORMAT_VERSION, COMPILED_SUFFIX))
+    if compiled.exists():
+        try:
+            return load_reference_corpus(compiled)
+        except (ValueError, KeyError, TypeError, OSError, struct.error) as e:
+            _logger.warning("ignoring bad cache entry %s: %s", compiled, e)
+
+    corpus = CompactReferenceCorpus.load_json_corpus(filename)
+    try:
+        cache_dir.mkdir(parents=True, exist_ok=True)
+        save_reference_corpus(corpus, compiled)
+    except OSError as e:
+        _logger.warning("cannot cache compiled corpus in %s: %s", cache_dir, e)
+    return corpus
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="compile a json reference corpus")
+    parser.add_argument("reference_file", help="reference corpus in json format")
+    parser.add_argument("output", help="where to write the compiled corpus")
+    args = parser.parse_args()
+    save_reference_corpus(
+        CompactReferenceCorpus.load_json_corpus(args.reference_file), args.output
+    )
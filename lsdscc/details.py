@@ -0,0 +1,435 @@
+# MIT License
+#
+# Copyright (c) 2019 Cong Feng.
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+"""
+The details module: the full alignment of the hypothesis sets, from which the metrics and
+their variants are recomputed without running the aligner again.
+
+``compute_score_on_hypothesis_set`` scores every hypothesis against every group and keeps
+only the best group of each hypothesis. ``compute_details_on_hypothesis_set`` keeps the
+whole score matrix instead, so error analyses and variants of the metrics are computed
+from the same alignment. The details of a corpus can be saved with ``save_details`` and
+loaded later. ``compute_bleu_variants_on_corpus`` computes the metrics for several
+configurations of BLEU from a single extraction of its sufficient statistics.
+"""
+import collections
+import json
+import time
+
+import numpy as np
+
+import lsdscc.align as _align
+import lsdscc.instrument as _instrument
+from lsdscc.batch import BREVITY_PENALTIES, bleu_statistics
+from lsdscc.bleu import DEFAULT_MAX_ORDER
+from lsdscc.index import ReferenceIndex
+from lsdscc.metrics import (
+    QueryResult,
+    ScoreAccumulator,
+    _aggregate,
+    _best_scores,
+    _deduplicate,
+    _score_matrix,
+    _zip_corpora,
+)
+
+__all__ = [
+    "AlignmentDetails",
+    "compute_details_on_hypothesis_set",
+    "iter_details_on_corpus",
+    "score_corpus_from_details",
+    "BleuVariant",
+    "compute_bleu_variant_details_on_hypothesis_set",
+    "compute_bleu_variants_on_corpus",
+    "save_details",
+    "load_details",
+]
+
+BleuVariant = collections.namedtuple(
+    "BleuVariant", ["max_order", "smooth", "brevity_penalty"], defaults=(4, True, None)
+)
+BleuVariant.__doc__ = """
+A configuration of BLEU as the aligner: the maximum order of n-grams, whether to apply
+Lin et al. 2004 smoothing and the brevity penalty (one of
+``lsdscc.batch.BREVITY_PENALTIES``). The defaults are those of ``BleuAligner``.
+"""
+
+
+class AlignmentDetails:
+    """
+    The alignment of a hypothesis set: the score of each hypothesis against each group of
+    the reference set, with the number of references in each group.
+
+    The best group of each hypothesis, its score and the groups covered are derived from
+    the score matrix on first use. ``score()`` gives the same LSDSCCScore as
+    ``compute_score_on_hypothesis_set``, bit for bit. The arrays are read-only.
+    """
+
+    def __init__(self, score_matrix, group_sizes, query=None, lengths=None):
+        """
+        :param score_matrix: an array-like of shape (n_hypotheses, n_groups).
+        :param group_sizes: the number of references in each group.
+        :param query: the query of the reference set, if any.
+        :param lengths: the number of tokens of each hypothesis, if known.
+        """
+        group_sizes = np.array(group_sizes, dtype=np.int64)
+        score_matrix = np.array(score_matrix, dtype=np.float64).reshape(
+            -1, len(group_sizes)
+        )
+        if not len(group_sizes):
+            raise ValueError("a reference set has at least one group")
+        score_matrix.flags.writeable = False
+        group_sizes.flags.writeable = False
+        self._score_matrix = score_matrix
+        self._group_sizes = group_sizes
+        self._query = query
+        self._lengths = lengths
+        self._best = None
+
+    def __repr__(self):
+        return "<%s of %d hypotheses and %d groups>" % (
+            self.__class__.__name__,
+            self.n_hypotheses,
+            self.n_groups,
+        )
+
+    @property
+    def query(self):
+        """
+        Return the query of the reference set, or None.
+        """
+        return self._query
+
+    @property
+    def score_matrix(self):
+        """
+        Return the scores of the hypotheses against the groups as an array of shape
+        (n_hypotheses, n_groups).
+        """
+        return self._score_matrix
+
+    @property
+    def group_sizes(self):
+        """
+        Return the number of references in each group as an array.
+        """
+        return self._group_sizes
+
+    @property
+    def lengths(self):
+        """
+        Return the number of tokens of each hypothesis, or None if unknown.
+        """
+        return self._lengths
+
+    @property
+    def n_hypotheses(self):
+        return self._score_matrix.shape[0]
+
+    @property
+    def n_groups(self):
+        return self._score_matrix.shape[1]
+
+    @property
+    def n_references(self):
+        """
+        Return the total number of references, i.e., the denominator of PDS.
+        """
+        return int(self._group_sizes.sum())
+
+    def _best_scores(self):
+        if self._best is None:
+            self._best = _best_scores(self._score_matrix)
+        return self._best
+
+    @property
+    def aligned_groups(self):
+        """
+        Return the best group of each hypothesis as an array. Ties go to the first group.
+        """
+        return np.array(self._best_scores()[0], dtype=np.int64)
+
+    @property
+    def max_scores(self):
+        """
+        Return the score of each hypothesis against its best group as an array.
+        """
+        return np.array(self._best_scores()[1], dtype=np.float64)
+
+    def coverage(self, threshold=None):
+        """
+        Return the mask of the groups covered by the hypotheses, i.e., that are the best
+        group of some hypothesis.
+
+        :param threshold: if given, a hypothesis covers its best group only if its score
+        against the group is at least this value.
+        :return: np.ndarray of bool of shape (n_groups,).
+        """
+        covered = np.zeros(self.n_groups, dtype=bool)
+        aligned_groups = self.aligned_groups
+        if threshold is not None:
+            aligned_groups = aligned_groups[self.max_scores >= threshold]
+        covered[aligned_groups] = True
+        return covered
+
+    def score(self, threshold=None):
+        """
+        Compute the three metrics of the hypothesis set.
+
+        :param threshold: if given, only the groups covered with at least this score count
+        towards MDS and PDS (see ``coverage``). MaxBLEU is not affected.
+        :return: LSDSCCScore.
+        """
+        aligned_groups, max_scores = self._best_scores()
+        if threshold is not None:
+            aligned_groups = [
+                k for k, s in zip(aligned_groups, max_scores) if s >= threshold
+            ]
+        return _aggregate(
+            aligned_groups,
+            max_scores,
+            self._group_sizes.tolist(),
+            self.n_references,
+        )
+
+    def to_result(self):
+        """
+        Return the QueryResult of the hypothesis set, as the exporters take.
+
+        :return: QueryResult.
+        """
+        aligned_groups, max_scores = self._best_scores()
+        return QueryResult(
+            self._query,
+            self.score(),
+            aligned_groups,
+            max_scores,
+            self._group_sizes.tolist(),
+            self._lengths,
+        )
+
+
+def compute_details_on_hypothesis_set(
+    hypothesis_set, reference_set, aligner=None, index=None, cache=None
+):
+    """
+    Compute the alignment details of a hypothesis set. Every hypothesis is scored against
+    every group, so there is no pruning.
+
+    :param hypothesis_set: a hypothesis set.
+    :param reference_set: a reference set.
+    :param aligner: a callable to compute the semantic similarity of a hypothesis
+    and a list of references.
+    :param index: an optional ReferenceIndex of the reference set. If not given,
+    one is built for this call.
+    :param cache: an optional ScoreCache to look up the scores of the hypotheses.
+    :return: AlignmentDetails.
+    """
+    if aligner is None:
+        aligner = _align.BleuAligner()
+    if index is None:
+        index = ReferenceIndex(reference_set)
+    start = time.perf_counter() if _instrument.hooks else None
+    # Score each distinct hypothesis once and then fan the rows out.
+    distinct, inverse = _deduplicate(hypothesis_set)
+    if cache is None:
+        score_matrix = _score_matrix(distinct, reference_set, aligner, index)
+    else:
+        score_matrix = cache.score_matrix(
+            distinct,
+            index,
+            aligner,
+            lambda hypotheses: _score_matrix(hypotheses, reference_set, aligner, index),
+        )
+    score_matrix = np.asarray(score_matrix, dtype=np.float64).reshape(-1, len(index))
+    if start is not None:
+        _instrument.lap("aligner", start, len(distinct) * len(index))
+    return AlignmentDetails(
+        score_matrix[inverse],
+        index.group_sizes,
+        getattr(reference_set, "query", None),
+        [len(distinct[i]) for i in inverse],
+    )
+
+
+def iter_details_on_corpus(
+    hypothesis_corpus, reference_corpus, aligner=None, cache=None
+):
+    """
+    Lazily compute the alignment details of each hypothesis set of a corpus.
+
+    :param hypothesis_corpus: an iterable of hypothesis_set.
+    :param reference_corpus: an iterable of reference_set.
+    :param aligner: a callable to compute the semantic similarity of a hypothesis
+    and a list of references.
+    :param cache: an optional ScoreCache to look up the scores of the hypotheses.
+    :return: Iterator[AlignmentDetails]
+    """
+    for hypothesis_set, reference_set in _zip_corpora(
+        hypothesis_corpus, reference_corpus
+    ):
+        yield compute_details_on_hypothesis_set(
+            hypothesis_set, reference_set, aligner, cache=cache
+        )
+
+
+def score_corpus_from_details(details, metric=None):
+    """
+    Compute the metrics of a corpus from the alignment details of its hypothesis sets,
+    without running the aligner.
+
+    :param details: an iterable of AlignmentDetails, one for each query.
+    :param metric: a callable taking an AlignmentDetails and returning an LSDSCCScore,
+    such as ``lambda d: d.score(threshold=0.1)``. Default to ``AlignmentDetails.score``,
+    in which case the result is that of ``compute_score_on_corpus``.
+    :return: LSDSCCScore.
+    """
+    if metric is None:
+        metric = AlignmentDetails.score
+    accumulator = ScoreAccumulator()
+    for d in details:
+        accumulator.add(metric(d))
+    return accumulator.mean()
+
+
+def compute_bleu_variant_details_on_hypothesis_set(
+    hypothesis_set, reference_set, variants, index=None
+):
+    """
+    Compute the alignment details of a hypothesis set for several configurations of BLEU,
+    from a single extraction of the statistics of BLEU (see ``lsdscc.batch.BleuStatistics``).
+
+    :param hypothesis_set: a hypothesis set.
+    :param reference_set: a reference set.
+    :param variants: an iterable of BleuVariant.
+    :param index: an optional ReferenceIndex of the reference set.
+    :return: dict from each variant to its AlignmentDetails.
+    """
+    variants = list(variants)
+    for variant in variants:
+        if variant.brevity_penalty not in BREVITY_PENALTIES:
+            raise ValueError("unknown brevity penalty %r" % (variant.brevity_penalty,))
+    if index is None:
+        index = ReferenceIndex(reference_set)
+    max_order = max(
+        [variant.max_order or DEFAULT_MAX_ORDER for variant in variants],
+        default=DEFAULT_MAX_ORDER,
+    )
+    distinct, inverse = _deduplicate(hypothesis_set)
+    statistics = bleu_statistics(distinct, index.encoded(max_order), max_order)
+    query = getattr(reference_set, "query", None)
+    lengths = [len(distinct[i]) for i in inverse]
+    return {
+        variant: AlignmentDetails(
+            statistics.bleu(*variant).reshape(-1, len(index))[inverse],
+            index.group_sizes,
+            query,
+            lengths,
+        )
+        for variant in variants
+    }
+
+
+def compute_bleu_variants_on_corpus(hypothesis_corpus, reference_corpus, variants):
+    """
+    Compute the three metrics on a corpus for several configurations of BLEU as the
+    aligner. The n-grams of each hypothesis set are matched once, at the highest order of
+    the variants. The score of ``BleuVariant(n)`` is that of
+    ``compute_score_on_corpus(..., aligner=BleuAligner(n))``.
+
+    :param hypothesis_corpus: an iterable of hypothesis_set.
+    :param reference_corpus: an iterable of reference_set.
+    :param variants: an iterable of BleuVariant.
+    :return: dict from each variant to its LSDSCCScore.
+    """
+    variants = list(variants)
+    accumulators = {variant: ScoreAccumulator() for variant in variants}
+    for hypothesis_set, reference_set in _zip_corpora(
+        hypothesis_corpus, reference_corpus
+    ):
+        details = compute_bleu_variant_details_on_hypothesis_set(
+            hypothesis_set, reference_set, variants
+        )
+        for variant, accumulator in accumulators.items():
+            accumulator.add(details[variant].score())
+    return {
+        variant: accumulator.mean() for variant, accumulator in accumulators.items()
+    }
+
+
+def save_details(filename, details):
+    """
+    Save the alignment details of a corpus in a numpy ``.npz`` file.
+
+    :param filename: the output file.
+    :param details: an iterable of AlignmentDetails.
+    """
+    details = list(details)
+    n_hypotheses = [d.n_hypotheses for d in details]
+    n_groups = [d.n_groups for d in details]
+    lengths = [d.lengths for d in details]
+    with open(filename, "wb") as f:
+        np.savez(
+            f,
+            n_hypotheses=np.array(n_hypotheses, dtype=np.int64),
+            n_groups=np.array(n_groups, dtype=np.int64),
+            scores=np.concatenate(
+                [d.score_matrix.ravel() for d in details] + [np.zeros(0)]
+            ),
+            group_sizes=np.concatenate(
+                [d.group_sizes for d in details] + [np.zeros(0, dtype=np.int64)]
+            ),
+            # The queries and the lengths may be None.
+            meta=np.array(
+                json.dumps({"queries": [d.query for d in details], "lengths": lengths})
+            ),
+        )
+
+
+def load_details(filename):
+    """
+    Load the alignment details saved by ``save_details``.
+
+    :param filename: the ``.npz`` file.
+    :return: List[AlignmentDetails].
+    """
+    with np.load(filename, allow_pickle=False) as data:
+        n_hypotheses = data["n_hypotheses"].tolist()
+        n_groups = data["n_groups"].tolist()
+        scores = data["scores"]
+        group_sizes = data["group_sizes"]
+        meta = json.loads(data["meta"].item())
+    details = []
+    score_offset = group_offset = 0
+    for n, k, query, lengths in zip(
+        n_hypotheses, n_groups, meta["queries"], meta["lengths"]
+    ):
+        details.append(
+            AlignmentDetails(
+                scores[score_offset : score_offset + n * k].reshape(n, k),
+                group_sizes[group_offset : group_offset + k],
+                query,
+                lengths,
+            )
+        )
+        score_offset += n * k
+        group_offset += k
+    return details
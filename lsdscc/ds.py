@@ -26,7 +26,10 @@ The data structure module.
 import io
 import json
 import logging
+import sys
+import time
 
+import lsdscc.instrument as _instrument
 from lsdscc.data import default_reference_set
 
 _logger = logging.getLogger(__name__)
@@ -77,10 +80,14 @@ class HypothesisSet:
         :param eos:
         :return:
         """
+        start = time.perf_counter() if _instrument.hooks else None
         if eos is None:
             eos = DEFAULT_EOS
         hypothesis = line.split(eos)
-        return cls([sentence.strip().split() for sentence in hypothesis])
+        hypothesis_set = cls([sentence.strip().split() for sentence in hypothesis])
+        if start is not None:
+            _instrument.emit("tokenize", time.perf_counter() - start)
+        return hypothesis_set
 
     @classmethod
     def load_corpus(cls, filename, eos=None):
@@ -91,9 +98,47 @@ class HypothesisSet:
         :param eos:
         :return:
         """
+        return list(cls.iter_corpus(filename, eos))
+
+    @classmethod
+    def open_corpus(cls, filename, eos=None, index_file=None):
+        """
+        Open a hypothesis file as a memory-mapped corpus, which gives lazily tokenized
+        HypothesisSets by index or slice without reading the whole file.
+
+        :param filename: the file to map.
+        :param eos:
+        :param index_file: where to save (and reuse) the line-offset index of the file.
+        True means next to the file.
+        :return: lsdscc.mapped.MappedHypothesisCorpus
+        """
+        from lsdscc.mapped import MappedHypothesisCorpus
+
+        return MappedHypothesisCorpus(filename, eos, index_file)
+
+    @classmethod
+    def iter_corpus(cls, filename, eos=None):
+        """
+        Lazily load HypothesisSets from a plain text file, one line at a time.
+
+        :param filename: the file to read. "-" means the standard input.
+        :param eos:
+        :return: Iterator[HypothesisSet]
+        """
         _logger.info("loading hypothesis corpus %s", filename)
+        if _instrument.hooks:
+            return _instrument.timed_iter(cls._iter_corpus(filename, eos), "load")
+        return cls._iter_corpus(filename, eos)
+
+    @classmethod
+    def _iter_corpus(cls, filename, eos):
+        if str(filename) == "-":
+            for line in sys.stdin:
+                yield cls.from_line(line, eos)
+            return
         with open(filename) as f:
-            return [cls.from_line(line, eos) for line in f.readlines()]
+            for line in f:
+                yield cls.from_line(line, eos)
 
 
 class ReferenceSet:
@@ -170,13 +215,17 @@ class ReferenceSet:
                 max_index += 1
                 return max_index
 
+        start = time.perf_counter() if _instrument.hooks else None
         sorted_group = sorted(json_dict.items(), key=lambda kv: get_key(kv[0]))
-        return cls(
+        reference_set = cls(
             reference_set=[
                 [ref.split() for ref in values] for _, values in sorted_group
             ],
             query=query,
         )
+        if start is not None:
+            _instrument.emit("tokenize", time.perf_counter() - start)
+        return reference_set
 
     @classmethod
     def load_json_corpus(cls, filename=None):
@@ -190,11 +239,38 @@ class ReferenceSet:
         if filename is None:
             filename = default_reference_set
         _logger.info("loading reference corpus %s", filename)
+        start = time.perf_counter() if _instrument.hooks else None
         with open(filename) as f:
             json_data = json.load(f)
-        return [
+        corpus = [
             cls.from_json(json_dict, query) for query, json_dict in json_data.items()
         ]
+        if start is not None:
+            _instrument.emit("load", time.perf_counter() - start, len(corpus))
+        return corpus
+
+    @classmethod
+    def iter_json_corpus(cls, filename=None):
+        """
+        Lazily load ReferenceSets from a json file, one query at a time.
+        Unlike ``load_json_corpus``, the file is never parsed as a whole.
+
+        :param filename: the file in json format. default to load the builtin lsdscc
+        test set.
+        :return: Iterator[ReferenceSet]
+        """
+        if filename is None:
+            filename = default_reference_set
+        _logger.info("loading reference corpus %s", filename)
+        if _instrument.hooks:
+            return _instrument.timed_iter(cls._iter_json_corpus(filename), "load")
+        return cls._iter_json_corpus(filename)
+
+    @classmethod
+    def _iter_json_corpus(cls, filename):
+        with open(filename) as f:
+            for query, json_dict in _iter_json_items(f):
+                yield cls.from_json(json_dict, query)
 
     def __str__(self):
         with io.StringIO() as f:
@@ -204,3 +280,73 @@ class ReferenceSet:
                 for j, reference in enumerate(refs):
                     print("  %d: %r" % (j, reference), file=f)
             return f.getvalue()
+
+
+# The number of characters to read at a time by _iter_json_items.
+_JSON_CHUNK_SIZE = 1 << 16
+
+
+def _iter_json_items(f, chunk_size=_JSON_CHUNK_SIZE):
+    """
+    Iterate over the (key, value) pairs of a json object in a file
+    without reading the whole file into memory.
+
+    :param f: a file object in text mode whose content is a json object.
+    :param chunk_size: the number of characters to read at a time.
+    :return: Iterator[Tuple[str, Any]]
+    """
+    decoder = json.JSONDecoder()
+    buf = ""
+    pos = 0
+    eof = False
+
+    def skip(expected=None):
+        # Skip the whitespaces and then one char if it is one of expected.
+        nonlocal buf, pos, eof
+        while True:
+            while pos < len(buf) and buf[pos].isspace():
+                pos += 1
+            if pos < len(buf) or eof:
+                break
+            buf, pos = f.read(chunk_size), 0
+            eof = not buf
+        if pos == len(buf):
+            raise ValueError("unexpected end of json file")
+        char = buf[pos]
+        if expected is not None and char in expected:
+            pos += 1
+        return char
+
+    def decode():
+        # Decode a json value, reading more data as long as it is incomplete.
+        nonlocal buf, pos, eof
+        skip()
+        while True:
+            try:
+                value, end = decoder.raw_decode(buf, pos)
+            except json.JSONDecodeError:
+                if eof:
+                    raise
+            else:
+                if end < len(buf) or eof:
+                    pos = end
+                    return value
+            chunk = f.read(chunk_size)
+            eof = not chunk
+            buf = buf[pos:] + chunk
+            pos = 0
+
+    if skip("{") != "{":
+        raise ValueError("expect a json object")
+    if skip("}") == "}":
+        return
+    while True:
+        key = decode()
+        if skip(":") != ":":
+            raise ValueError("expect ':' after a key")
+        yield key, decode()
+        char = skip(",}")
+        if char == "}":
+            return
+        if char != ",":
+            raise ValueError("expect ',' or '}' after a value")
@@ -0,0 +1,259 @@
+# MIT License
+#
+# Copyright (c) 2019 Cong Feng.
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+"""
+The module to export the result of each query and each hypothesis.
+
+The results are written while the corpus is scored, so the alignments can be analysed and
+re-aggregated later without aligning again. Three formats are supported:
+
+  1. jsonl: one json object per query, with the lists of its hypotheses.
+  2. csv: one row per hypothesis, with the columns of its query repeated.
+  3. npz: numpy column arrays. The query columns are indexed by query, the hypothesis
+     columns are concatenated over the queries and sliced by ``hypothesis_offsets``, and so
+     are the group sizes by ``group_offsets``.
+"""
+import array
+import csv
+import json
+import pathlib
+
+from lsdscc.metrics import ScoreAccumulator, iter_results_on_corpus
+
+__all__ = [
+    "JsonlResultWriter",
+    "CsvResultWriter",
+    "NpzResultWriter",
+    "open_result_writer",
+    "export_results_on_corpus",
+    "EXPORT_FORMATS",
+]
+
+CSV_COLUMNS = (
+    "query_id",
+    "query",
+    "hypothesis_id",
+    "length",
+    "aligned_group",
+    "aligned_group_size",
+    "max_score",
+    "n_groups",
+    "n_references",
+    "mds",
+    "pds",
+    "max_bleu",
+)
+
+
+class _ResultWriter:
+    """
+    The base class of the writers. A writer is used as a context manager and
+    ``write()`` is called with the QueryResult of each query in order.
+    """
+
+    def __init__(self):
+        self.n_queries = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def write(self, result):
+        """
+        Write the result of the next query.
+
+        :param result: QueryResult.
+        """
+        self._write(self.n_queries, result)
+        self.n_queries += 1
+
+    def _write(self, query_id, result):
+        raise NotImplementedError
+
+    def close(self):
+        """
+        Finish writing.
+        """
+        raise NotImplementedError
+
+
+class JsonlResultWriter(_ResultWriter):
+    """
+    Write one json object per query.
+    """
+
+    def __init__(self, filename):
+        super().__init__()
+        self._file = open(filename, "w")
+
+    def _write(self, query_id, result):
+        record = {"query_id": query_id, "query": result.query}
+        record.update(result.score._asdict())
+        record.update(
+            aligned_groups=result.aligned_groups,
+            max_scores=result.max_scores,
+            group_sizes=result.group_sizes,
+            lengths=result.lengths,
+        )
+        self._file.write(json.dumps(record) + "\n")
+
+    def close(self):
+        self._file.close()
+
+
+class CsvResultWriter(_ResultWriter):
+    """
+    Write one row per hypothesis, with the columns ``CSV_COLUMNS``.
+    A query without hypotheses has no row.
+    """
+
+    def __init__(self, filename):
+        super().__init__()
+        self._file = open(filename, "w", newline="")
+        self._writer = csv.writer(self._file)
+        self._writer.writerow(CSV_COLUMNS)
+
+    def _write(self, query_id, result):
+        group_sizes = result.group_sizes
+        query_columns = (
+            len(group_sizes),
+            sum(group_sizes),
+            result.score.mds,
+            result.score.pds,
+            result.score.max_bleu,
+        )
+        for i, (k, score, length) in enumerate(
+            zip(result.aligned_groups, result.max_scores, result.lengths)
+        ):
+            row = (query_id, result.query, i, length, k, group_sizes[k], score)
+            self._writer.writerow(row + query_columns)
+
+    def close(self):
+        self._file.close()
+
+
+class NpzResultWriter(_ResultWriter):
+    """
+    Write numpy column arrays to a ``.npz`` file.
+
+    The columns are kept in typed arrays while scoring, at 8 bytes per value or less,
+    and saved when the writer is closed.
+    """
+
+    def __init__(self, filename):
+        super().__init__()
+        self._filename = filename
+        self._queries = []
+        self._columns = {
+            "mds": array.array("d"),
+            "pds": array.array("d"),
+            "max_bleu": array.array("d"),
+            "hypothesis_offsets": array.array("q", [0]),
+            "group_offsets": array.array("q", [0]),
+            "length": array.array("q"),
+            "aligned_group": array.array("q"),
+            "max_score": array.array("d"),
+            "group_size": array.array("q"),
+        }
+
+    def _write(self, query_id, result):
+        columns = self._columns
+        self._queries.append("" if result.query is None else str(result.query))
+        columns["mds"].append(result.score.mds)
+        columns["pds"].append(result.score.pds)
+        columns["max_bleu"].append(result.score.max_bleu)
+        columns["length"].extend(result.lengths)
+        columns["aligned_group"].extend(result.aligned_groups)
+        columns["max_score"].extend(result.max_scores)
+        columns["group_size"].extend(result.group_sizes)
+        columns["hypothesis_offsets"].append(len(columns["length"]))
+        columns["group_offsets"].append(len(columns["group_size"]))
+
+    def close(self):
+        import numpy as np
+
+        arrays = {
+            name: np.frombuffer(a, a.typecode) for name, a in self._columns.items()
+        }
+        arrays["query"] = np.array(self._queries, dtype=str)
+        np.savez(self._filename, **arrays)
+
+
+EXPORT_FORMATS = {
+    "jsonl": JsonlResultWriter,
+    "csv": CsvResultWriter,
+    "npz": NpzResultWriter,
+}
+
+
+def open_result_writer(filename, fmt=None):
+    """
+    Open a writer of query results.
+
+    :param filename: the output file.
+    :param fmt: one of ``EXPORT_FORMATS``. Default to the suffix of the filename.
+    :return: a writer to be used as a context manager.
+    """
+    if fmt is None:
+        fmt = pathlib.Path(filename).suffix.lstrip(".")
+    try:
+        writer_class = EXPORT_FORMATS[fmt]
+    except KeyError:
+        raise ValueError(
+            "unknown export format %r, expect one of %s"
+            % (fmt, ", ".join(EXPORT_FORMATS))
+        )
+    return writer_class(filename)
+
+
+def export_results_on_corpus(
+    hypothesis_corpus,
+    reference_corpus,
+    filename,
+    fmt=None,
+    aligner=None,
+    cache=None,
+    prune=False,
+):
+    """
+    Compute the three metrics on a corpus and export the result of each query as it is
+    scored. The corpora are consumed one query at a time, as in ``iter_scores_on_corpus``.
+
+    :param hypothesis_corpus: an iterable of hypothesis_set.
+    :param reference_corpus: an iterable of reference_set.
+    :param filename: the output file.
+    :param fmt: one of ``EXPORT_FORMATS``. Default to the suffix of the filename.
+    :param aligner: a callable to compute the semantic similarity of a hypothesis
+    and a list of references.
+    :param cache: an optional ScoreCache to look up the scores of the hypotheses.
+    :param prune: whether to prune the groups that cannot be the best one of a hypothesis.
+    :return: LSDSCCScore, the same as ``compute_score_on_corpus``.
+    """
+    accumulator = ScoreAccumulator()
+    with open_result_writer(filename, fmt) as writer:
+        for result in iter_results_on_corpus(
+            hypothesis_corpus, reference_corpus, aligner, cache, prune
+        ):
+            writer.write(result)
+            accumulator.add(result.score)
+    return accumulator.mean()
@@ -0,0 +1,193 @@
+# MIT License
+#
+# Copyright (c) 2019 Cong Feng.
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+"""
+The reference index module.
+"""
+import hashlib
+import json
+import time
+
+import lsdscc.instrument as _instrument
+from lsdscc.bleu import DEFAULT_MAX_ORDER, _merge_ref_ngrams
+
+__all__ = [
+    "ReferenceIndex",
+]
+
+
+class ReferenceIndex:
+    """
+    A precompiled view of a reference set that is built once and reused for every hypothesis.
+
+    It holds the merged max-count n-gram tables of each group, which the aligners would
+    otherwise rebuild for every (hypothesis, group) pair, together with the group sizes
+    needed by the metrics. It can be used as the reference set it indexes.
+    """
+
+    def __init__(self, reference_set):
+        self._reference_set = reference_set
+        self._group_sizes = [len(refs) for refs in reference_set]
+        self._n_references = sum(self._group_sizes)
+        self._merged_ngrams = {}
+        self._encoded = {}
+        self._nist_tables = {}
+        self._lowercased = None
+        self._fingerprint = None
+
+    def __len__(self):
+        """
+        Return the number of groups.
+        """
+        return len(self._group_sizes)
+
+    def __iter__(self):
+        return iter(self._reference_set)
+
+    def __getitem__(self, item):
+        return self._reference_set[item]
+
+    def __repr__(self):
+        return "<%s with %d groups, %d references>" % (
+            self.__class__.__name__,
+            len(self),
+            self.n_references,
+        )
+
+    @property
+    def reference_set(self):
+        """
+        Return the indexed reference set.
+        """
+        return self._reference_set
+
+    @property
+    def group_sizes(self):
+        """
+        Return the number of references in each group.
+        """
+        return self._group_sizes
+
+    @property
+    def n_references(self):
+        """
+        Return the total number of references, i.e., the denominator of PDS.
+        """
+        return self._n_references
+
+    @property
+    def fingerprint(self):
+        """
+        Return the sha256 hex digest of the content of the reference set, computed on first use.
+        Two reference sets with the same groups of references have the same fingerprint.
+        """
+        if self._fingerprint is None:
+            content = json.dumps(
+                [[list(ref) for ref in refs] for refs in self._reference_set]
+            )
+            self._fingerprint = hashlib.sha256(content.encode()).hexdigest()
+        return self._fingerprint
+
+    def merged_ngrams(self, max_order=None):
+        """
+        Return the merged max-count n-grams of each group, computed on first use.
+
+        :param max_order: the maximum order of n-grams.
+        :return: List[Counter], one for each group.
+        """
+        max_order = max_order or DEFAULT_MAX_ORDER
+        try:
+            return self._merged_ngrams[max_order]
+        except KeyError:
+            merged = [
+                _merge_ref_ngrams(refs, max_order) for refs in self._reference_set
+            ]
+            self._merged_ngrams[max_order] = merged
+            return merged
+
+    def encoded(self, max_order=None):
+        """
+        Return the integer-encoded n-gram tables used by the vectorized engine,
+        computed on first use.
+
+        :param max_order: the maximum order of n-grams.
+        :return: lsdscc.batch.EncodedReferences.
+        """
+        from lsdscc.batch import EncodedReferences
+
+        max_order = max_order or DEFAULT_MAX_ORDER
+        try:
+            return self._encoded[max_order]
+        except KeyError:
+            start = time.perf_counter() if _instrument.hooks else None
+            encoded = EncodedReferences(self._reference_set, max_order)
+            if start is not None:
+                seconds = time.perf_counter() - start
+                _instrument.emit("ngram", seconds, self.n_references)
+            self._encoded[max_order] = encoded
+            return encoded
+
+    def nist_tables(self, n=5):
+        """
+        Return the NIST information weights of the n-grams of each group, computed on first use.
+
+        :param n: the highest order of n-grams.
+        :return: lsdscc.nltk_compat.NistTables.
+        """
+        from lsdscc.nltk_compat import NistTables
+
+        try:
+            return self._nist_tables[n]
+        except KeyError:
+            encoded = self.encoded(n)
+            start = time.perf_counter() if _instrument.hooks else None
+            tables = NistTables(encoded, n)
+            if start is not None:
+                seconds = time.perf_counter() - start
+                _instrument.emit("ngram", seconds, self.n_references)
+            self._nist_tables[n] = tables
+            return tables
+
+    def lowercased(self):
+        """
+        Return the index of the references lowercased as by ``multi-bleu.pl -lc``,
+        computed on first use.
+
+        :return: ReferenceIndex.
+        """
+        from lsdscc.multi_bleu import perl_lowercase
+
+        if self._lowercased is None:
+            self._lowercased = ReferenceIndex(
+                [[perl_lowercase(ref) for ref in refs] for refs in self._reference_set]
+            )
+        return self._lowercased
+
+    @classmethod
+    def from_corpus(cls, reference_corpus):
+        """
+        Build an index for each reference set of a corpus.
+
+        :param reference_corpus: a list of reference_set.
+        :return: List[ReferenceIndex]
+        """
+        return [cls(reference_set) for reference_set in reference_corpus]
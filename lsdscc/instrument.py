@@ -0,0 +1,216 @@
+# MIT License
+#
+# Copyright (c) 2019 Cong Feng.
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+"""
+The instrumentation module.
+
+The evaluation code reports the wall time of its stages to the hooks registered with
+``add_hook``. A hook is called as ``hook(stage, seconds, count, info)``, where ``count`` is
+the number of items processed and ``info`` is None or a dict of details. The stages are:
+
+  - ``load``: reading a corpus, one call per corpus or per query of a streamed corpus.
+    It includes ``tokenize``.
+  - ``tokenize``: splitting the sentences of a hypothesis set or a reference set.
+  - ``ngram``: building the n-gram tables of a reference set, or counting the n-grams of a
+    sentence. The count is the number of sentences.
+  - ``aligner``: scoring the hypotheses of a query. The count is the number of
+    (hypothesis, group) pairs. It includes the ``ngram`` work done on first use.
+  - ``argmax``: finding the best group of each hypothesis from the scores.
+  - ``aggregation``: computing the metrics from the best groups.
+  - ``query``: a hypothesis set from end to end. ``info`` holds the query (if the reference
+    set knows it), ``n_hypotheses`` and ``n_groups``.
+
+When no hook is registered, the instrumented code only tests whether ``hooks`` is empty.
+Only the current process is instrumented, not the workers of a parallel evaluation.
+"""
+import heapq
+import threading
+import time
+
+__all__ = [
+    "STAGES",
+    "add_hook",
+    "remove_hook",
+    "Profiler",
+]
+
+STAGES = ("load", "tokenize", "ngram", "aligner", "argmax", "aggregation")
+
+# The registered hooks. The instrumented code tests it before taking any time.
+hooks = []
+
+
+def add_hook(hook):
+    """
+    Register a hook to be called on each instrumented event.
+
+    :param hook: a callable ``hook(stage, seconds, count, info)``.
+    """
+    hooks.append(hook)
+
+
+def remove_hook(hook):
+    """
+    Unregister a hook registered with ``add_hook``.
+    """
+    hooks.remove(hook)
+
+
+def emit(stage, seconds, count=1, info=None):
+    """
+    Report an event to the hooks.
+    """
+    for hook in hooks:
+        hook(stage, seconds, count, info)
+
+
+def lap(stage, start, count=1, info=None):
+    """
+    Report the time elapsed since ``start`` and return the current time, to time the next
+    stage from.
+
+    :param stage: the stage to report.
+    :param start: a time taken with ``time.perf_counter``.
+    :return: the current time.
+    """
+    now = time.perf_counter()
+    emit(stage, now - start, count, info)
+    return now
+
+
+def timed_iter(iterable, stage):
+    """
+    Report the time taken by each item of an iterable, excluding the time of the consumer.
+
+    :param iterable: the iterable to time.
+    :param stage: the stage to report.
+    :return: an iterator of the same items.
+    """
+    iterator = iter(iterable)
+    while True:
+        start = time.perf_counter()
+        try:
+            item = next(iterator)
+        except StopIteration:
+            return
+        emit(stage, time.perf_counter() - start)
+        yield item
+
+
+class Profiler:
+    """
+    A hook that accumulates the wall time, the number of calls and the item count of each
+    stage, and keeps the slowest queries. Use it as a context manager to register it:
+
+        with Profiler() as profiler:
+            compute_score_on_corpus(hypothesis_corpus, reference_corpus)
+        print(profiler.report())
+    """
+
+    def __init__(self, slowest=10, trace_memory=False):
+        """
+        :param slowest: the number of slowest queries to report.
+        :param trace_memory: whether to trace the peak memory with ``tracemalloc``.
+        This slows down the evaluation considerably.
+        """
+        self.slowest = slowest
+        self.trace_memory = trace_memory
+        self._lock = threading.Lock()
+        self._stages = {}
+        self._queries = []
+        self._n_queries = 0
+        self._start = self._stop = None
+        self._peak_memory = None
+
+    def __call__(self, stage, seconds, count, info):
+        with self._lock:
+            if stage == "query":
+                entry = (seconds, self._n_queries, info)
+                self._n_queries += 1
+                if len(self._queries) < self.slowest:
+                    heapq.heappush(self._queries, entry)
+                elif self._queries and seconds > self._queries[0][0]:
+                    heapq.heapreplace(self._queries, entry)
+                return
+            totals = self._stages.setdefault(stage, [0.0, 0, 0])
+            totals[0] += seconds
+            totals[1] += 1
+            totals[2] += count
+
+    def start(self):
+        """
+        Register the profiler and start the clock (and the memory tracing).
+        """
+        if self.trace_memory:
+            import tracemalloc
+
+            tracemalloc.start()
+        self._start = time.perf_counter()
+        add_hook(self)
+
+    def stop(self):
+        """
+        Unregister the profiler and stop the clock (and the memory tracing).
+        """
+        remove_hook(self)
+        self._stop = time.perf_counter()
+        if self.trace_memory:
+            import tracemalloc
+
+            self._peak_memory = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+    def report(self):
+        """
+        Return the profile as a json-ready dict with the keys:
+
+          - "wall_seconds": the time spent in the ``with`` block.
+          - "stages": for each stage, its total "seconds", number of "calls" and "count".
+          - "n_queries": the number of queries evaluated.
+          - "slowest_queries": the slowest queries, slowest first, with their "position"
+            in the order of evaluation, "seconds" and the info of the event.
+          - "peak_memory_bytes": the peak of the traced memory, or None.
+        """
+        stop = self._stop if self._stop is not None else time.perf_counter()
+        with self._lock:
+            stages = {
+                stage: {"seconds": seconds, "calls": calls, "count": count}
+                for stage, (seconds, calls, count) in self._stages.items()
+            }
+            slowest = sorted(self._queries, key=lambda entry: (-entry[0], entry[1]))
+            n_queries = self._n_queries
+        return {
+            "wall_seconds": stop - self._start if self._start is not None else None,
+            "stages": stages,
+            "n_queries": n_queries,
+            "slowest_queries": [
+                dict(info or {}, position=position, seconds=seconds)
+                for seconds, position, info in slowest
+            ],
+            "peak_memory_bytes": self._peak_memory,
+        }
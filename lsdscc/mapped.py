@@ -0,0 +1,357 @@
+# MIT License
+#
+# Copyright (c) 2019 Cong Feng.
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+"""
+The memory-mapped hypothesis corpus module.
+
+A hypothesis file is memory-mapped and indexed by the byte offsets of its lines, so any
+query can be accessed without reading the lines before it. The lines are tokenized on
+first access. The index can be saved next to the file and is reused as long as the file
+is not modified. The layout of a saved index is:
+
+  1. ``INDEX_MAGIC``.
+  2. The byte order, the size and the modification time of the hypothesis file and the
+     number of lines, as given by ``_INDEX_HEADER``.
+  3. The offsets as int64, one more than the number of lines.
+"""
+
+import logging
+import mmap
+import os
+import pathlib
+import struct
+import sys
+import tempfile
+import time
+import weakref
+
+import lsdscc.instrument as _instrument
+from lsdscc.ds import DEFAULT_EOS, HypothesisSet
+
+__all__ = [
+    "MappedHypothesisCorpus",
+    "MappedHypothesisSet",
+    "INDEX_SUFFIX",
+]
+
+_logger = logging.getLogger(__name__)
+
+INDEX_MAGIC = b"LSDSIDX\x01"
+INDEX_SUFFIX = ".idx"
+_INDEX_HEADER = struct.Struct("<8s8sQqQ")
+# The number of bytes scanned at a time for the line breaks.
+_SCAN_SIZE = 1 << 26
+
+# The buffers mapped by this process, shared by the unpickled views. They are keyed by the
+# filename and the identity of the file, so a file replaced since it was mapped is mapped
+# again, and an entry is dropped once no view uses its buffer.
+_buffers = weakref.WeakValueDictionary()
+
+
+def _map(filename):
+    """
+    Memory-map a file for reading. An empty file, which cannot be mapped, gives b"".
+    """
+    return _map_with_key(filename)[0]
+
+
+def _map_with_key(filename):
+    """
+    Memory-map a file for reading, together with the identity of the mapped file:
+    its size, modification time and inode.
+    """
+    with open(filename, "rb") as f:
+        stat = os.fstat(f.fileno())
+        key = (stat.st_size, stat.st_mtime_ns, stat.st_ino)
+        if not stat.st_size:
+            return b"", key
+        return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ), key
+
+
+def _shared_buffer(filename, key):
+    """
+    Return the buffer of a file mapped by this process, mapping it if needed.
+
+    :param filename: the file.
+    :param key: the identity of the file the offsets were computed from, or None.
+    :raise ValueError: if the file has changed since.
+    """
+    try:
+        return _buffers[filename, key]
+    except KeyError:
+        pass
+    buf, current = _map_with_key(filename)
+    if key is not None and current != key:
+        raise ValueError("%s has changed since it was mapped" % filename)
+    if buf:
+        _buffers[filename, current] = buf
+    return buf
+
+
+def _scan_offsets(buf):
+    """
+    Find the offsets of the lines of a buffer: the start of each line and the end of the
+    last one. A last line without a line break counts as a line.
+
+    :return: np.ndarray of int64.
+    """
+    import numpy as np
+
+    offsets = [np.zeros(1, dtype=np.int64)]
+    for begin in range(0, len(buf), _SCAN_SIZE):
+        chunk = np.frombuffer(
+            buf, dtype=np.uint8, count=min(_SCAN_SIZE, len(buf) - begin), offset=begin
+        )
+        offsets.append(np.flatnonzero(chunk == ord("\n")) + (begin + 1))
+    offsets = np.concatenate(offsets)
+    if offsets[-1] != len(buf):
+        offsets = np.append(offsets, len(buf))
+    return offsets
+
+
+def _file_key(filename):
+    stat = os.stat(filename)
+    return stat.st_size, stat.st_mtime_ns
+
+
+def _load_index(index_file, filename):
+    """
+    Load a saved index if it is up to date with the hypothesis file, or return None.
+    """
+    import numpy as np
+
+    try:
+        buf = _map(index_file)
+        magic, byteorder, size, mtime_ns, n_lines = _INDEX_HEADER.unpack_from(buf)
+    except (OSError, ValueError, struct.error) as e:
+        _logger.info("cannot load index %s: %s", index_file, e)
+        return None
+    if (
+        magic != INDEX_MAGIC
+        or byteorder.rstrip(b"\0").decode() != sys.byteorder
+        or (size, mtime_ns) != _file_key(filename)
+    ):
+        _logger.info("ignoring stale index %s", index_file)
+        return None
+    return np.frombuffer(
+        buf, dtype=np.int64, count=n_lines + 1, offset=_INDEX_HEADER.size
+    )
+
+
+def _save_index(index_file, filename, offsets):
+    """
+    Save the index of a hypothesis file atomically.
+    """
+    index_file = pathlib.Path(index_file)
+    size, mtime_ns = _file_key(filename)
+    header = _INDEX_HEADER.pack(
+        INDEX_MAGIC, sys.byteorder.encode(), size, mtime_ns, len(offsets) - 1
+    )
+    fd, tmp_name = tempfile.mkstemp(dir=index_file.parent, suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(header)
+            f.write(offsets.tobytes())
+        os.replace(tmp_name, index_file)
+    except BaseException:
+        os.unlink(tmp_name)
+        raise
+    _logger.info("saved index %s", index_file)
+
+
+def _open_mapped_set(filename, start, end, eos, encoding, file_key=None):
+    # Unpickle a MappedHypothesisSet, sharing the buffer of the file in this process.
+    return MappedHypothesisSet(
+        _shared_buffer(filename, file_key),
+        start,
+        end,
+        eos,
+        encoding,
+        filename,
+        file_key,
+    )
+
+
+def _open_mapped_corpus(filename, eos, encoding, offsets, lines, file_key=None):
+    # Unpickle a MappedHypothesisCorpus without scanning the file again.
+    corpus = object.__new__(MappedHypothesisCorpus)
+    corpus.filename = filename
+    corpus.eos = eos
+    corpus.encoding = encoding
+    corpus.offsets = offsets
+    corpus._buf = _shared_buffer(filename, file_key)
+    corpus._file_key = file_key
+    corpus._lines = lines
+    return corpus
+
+
+class MappedHypothesisSet(HypothesisSet):
+    """
+    A HypothesisSet that is a view of a line of a memory-mapped file. The line is decoded
+    and tokenized on first access, like ``HypothesisSet.from_line``.
+
+    A view is pickled as the location of its line, which is read from the file again,
+    so it is cheap to send to a worker process on the same machine. Unpickling fails with
+    ValueError if the file has been modified or replaced since it was mapped.
+    """
+
+    def __init__(
+        self,
+        buf,
+        start,
+        end,
+        eos=None,
+        encoding="utf-8",
+        filename=None,
+        file_key=None,
+    ):
+        self._buf = buf
+        self._start = start
+        self._end = end
+        self._eos = eos
+        self._encoding = encoding
+        self._filename = filename
+        self._file_key = file_key
+        self._tokens = None
+
+    @property
+    def _hypothesis_set(self):
+        if self._tokens is None:
+            line = self.raw().decode(self._encoding)
+            self._tokens = HypothesisSet.from_line(line, self._eos)._hypothesis_set
+        return self._tokens
+
+    def raw(self):
+        """
+        Return the bytes of the line, including the line break.
+        """
+        return bytes(self._buf[self._start : self._end])
+
+    def __len__(self):
+        if self._tokens is None:
+            # The number of hypotheses is known without tokenizing the line.
+            eos = (self._eos or DEFAULT_EOS).encode(self._encoding)
+            return self._buf[self._start : self._end].count(eos) + 1
+        return len(self._tokens)
+
+    def __reduce__(self):
+        if self._filename is None:
+            return HypothesisSet, (self._hypothesis_set,)
+        return _open_mapped_set, (
+            self._filename,
+            self._start,
+            self._end,
+            self._eos,
+            self._encoding,
+            self._file_key,
+        )
+
+
+class MappedHypothesisCorpus:
+    """
+    A hypothesis corpus backed by a memory-mapped file, which behaves like the list of
+    HypothesisSet given by ``HypothesisSet.load_corpus``. Indexing gives a lazily
+    tokenized MappedHypothesisSet and slicing gives a view of a range of the queries,
+    none of which copies the file.
+    """
+
+    def __init__(self, filename, eos=None, index_file=None, encoding="utf-8"):
+        """
+        :param filename: the hypothesis file. The lines are separated by "\\n".
+        :param eos: the end-of-sentence indicator.
+        :param index_file: where to save the line-offset index. If it holds an index that
+            is up to date with the file, it is loaded instead of scanning the file. True means
+            the file name with ``INDEX_SUFFIX`` appended.
+        :param encoding: the encoding of the file.
+        """
+        filename = str(filename)
+        if filename == "-":
+            raise ValueError("the standard input cannot be memory-mapped")
+        _logger.info("mapping hypothesis corpus %s", filename)
+        start = time.perf_counter() if _instrument.hooks else None
+        self.filename = filename
+        self.eos = eos
+        self.encoding = encoding
+        self._buf, self._file_key = _map_with_key(filename)
+        if index_file is True:
+            index_file = filename + INDEX_SUFFIX
+        offsets = None
+        if index_file is not None and os.path.exists(index_file):
+            offsets = _load_index(index_file, filename)
+        if offsets is None:
+            offsets = _scan_offsets(self._buf)
+            if index_file is not None:
+                _save_index(index_file, filename, offsets)
+        self.offsets = offsets
+        self._lines = range(len(offsets) - 1)
+        if start is not None:
+            _instrument.emit("load", time.perf_counter() - start, len(self))
+
+    def __len__(self):
+        return len(self._lines)
+
+    def __iter__(self):
+        for i in self._lines:
+            yield self._view(i)
+
+    def __getitem__(self, item):
+        if isinstance(item, slice):
+            view = object.__new__(self.__class__)
+            view.__dict__.update(self.__dict__)
+            view._lines = self._lines[item]
+            return view
+        return self._view(self._lines[item])
+
+    def __repr__(self):
+        return "<%s of %s with %d hypothesis sets>" % (
+            self.__class__.__name__,
+            self.filename,
+            len(self),
+        )
+
+    def __reduce__(self):
+        # Only the offsets of the lines in the view are sent.
+        lines = self._lines
+        if lines.step == 1:
+            offsets = self.offsets[lines.start : lines.stop + 1]
+            lines = range(len(lines))
+        else:
+            offsets = [int(self.offsets[i + k]) for i in lines for k in (0, 1)]
+            lines = range(0, len(offsets), 2)
+        return _open_mapped_corpus, (
+            self.filename,
+            self.eos,
+            self.encoding,
+            offsets,
+            lines,
+            self._file_key,
+        )
+
+    def _view(self, line):
+        return MappedHypothesisSet(
+            self._buf,
+            int(self.offsets[line]),
+            int(self.offsets[line + 1]),
+            self.eos,
+            self.encoding,
+            self.filename,
+            self._file_key,
+        )
@@ -0,0 +1,133 @@
+# MIT License
+#
+# Copyright (c) 2019 Cong Feng.
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+"""
+The n-gram profile memoization module.
+
+Generated responses and references repeat a lot, both within and across hypothesis
+sets, so the n-gram counts of a sentence are kept in a bounded LRU memo keyed by
+its tokens and the max order. The memo is shared by everything that extracts n-grams
+through ``lsdscc.bleu._get_ngrams``.
+"""
+import collections
+import sys
+import threading
+
+__all__ = [
+    "NgramProfileMemo",
+    "ngram_memo",
+]
+
+DEFAULT_MAXSIZE = 10000
+
+
+class NgramProfileMemo:
+    """
+    A thread-safe LRU memo of n-gram profiles (Counters of n-grams).
+
+    The profiles are shared and must not be mutated by the callers.
+    A ``maxsize`` of 0 disables the memo.
+    """
+
+    def __init__(self, maxsize=DEFAULT_MAXSIZE):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self.nbytes = 0
+        self._profiles = collections.OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._profiles)
+
+    def get(self, segment, max_order, compute):
+        """
+        Return the n-gram profile of a segment, computing it on a miss.
+
+        :param segment: a list of tokens.
+        :param max_order: the maximum order of n-grams.
+        :param compute: a callable ``compute(segment, max_order)`` returning the profile.
+        :return: Counter.
+        """
+        if not self.maxsize:
+            return compute(segment, max_order)
+        key = (tuple(segment), max_order)
+        with self._lock:
+            profile = self._profiles.get(key)
+            if profile is not None:
+                self._profiles.move_to_end(key)
+                self.hits += 1
+                return profile
+            self.misses += 1
+        profile = compute(segment, max_order)
+        with self._lock:
+            if key not in self._profiles:
+                self._profiles[key] = profile
+                self.nbytes += _sizeof(key, profile)
+                while len(self._profiles) > self.maxsize:
+                    self.nbytes -= _sizeof(*self._profiles.popitem(last=False))
+        return profile
+
+    def resize(self, maxsize):
+        """
+        Change the max number of profiles, evicting the least recently used ones.
+        """
+        with self._lock:
+            self.maxsize = maxsize
+            while len(self._profiles) > maxsize:
+                self.nbytes -= _sizeof(*self._profiles.popitem(last=False))
+
+    def clear(self):
+        """
+        Drop all the profiles and reset the counters.
+        """
+        with self._lock:
+            self._profiles.clear()
+            self.hits = self.misses = self.nbytes = 0
+
+    def stats(self):
+        """
+        Return the counters of the memo.
+
+        :return: dict.
+        """
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+            "entries": len(self._profiles),
+            "nbytes": self.nbytes,
+        }
+
+
+def _sizeof(key, profile):
+    # An estimate of the memory held by an entry. The tokens are shared with the sentences.
+    return (
+        sys.getsizeof(key[0])
+        + sys.getsizeof(profile)
+        + sum(sys.getsizeof(ngram) for ngram in profile)
+    )
+
+
+# The memo shared by the whole package.
+ngram_memo = NgramProfileMemo()
@@ -21,23 +21,118 @@
 # SOFTWARE.
 
 import collections
+import itertools
 import logging
-import numpy as np
+import time
 
 import lsdscc.align as _align
+import lsdscc.instrument as _instrument
+from lsdscc.index import ReferenceIndex
 
 __all__ = [
     "LSDSCCScore",
+    "QueryResult",
     "compute_score_on_hypothesis_set",
+    "compute_result_on_hypothesis_set",
     "compute_score_on_corpus",
+    "compute_score_on_systems",
+    "compute_query_scores_on_systems",
+    "iter_scores_on_corpus",
+    "iter_results_on_corpus",
+    "ScoreAccumulator",
 ]
 
 _logger = logging.getLogger(__name__)
 
 LSDSCCScore = collections.namedtuple("LSDSCCScore", ["mds", "pds", "max_bleu"])
 
+QueryResult = collections.namedtuple(
+    "QueryResult",
+    ["query", "score", "aligned_groups", "max_scores", "group_sizes", "lengths"],
+)
+QueryResult.__doc__ = """
+The result of a hypothesis set: its query (if any), its LSDSCCScore and what the score is
+computed from, i.e., the group each hypothesis is aligned to, the score of each hypothesis
+against that group, the number of references in each group and the number of tokens of
+each hypothesis. The lists must not be mutated.
+"""
 
-def _multi_bleu(hypothesis, reference_set, aligner):
+# The block size of the pairwise summation of numpy.
+_PAIRWISE_BLOCK_SIZE = 128
+
+
+def _pairwise_sum(values, start, n):
+    """
+    Sum ``values[start:start + n]`` in the same order as the pairwise summation of numpy.
+    """
+    if n < 8:
+        total = 0.0
+        for i in range(start, start + n):
+            total += values[i]
+        return total
+    if n <= _PAIRWISE_BLOCK_SIZE:
+        partial = list(values[start : start + 8])
+        end = start + n - n % 8
+        for i in range(start + 8, end, 8):
+            for j in range(8):
+                partial[j] += values[i + j]
+        total = (partial[0] + partial[1]) + (partial[2] + partial[3])
+        total += (partial[4] + partial[5]) + (partial[6] + partial[7])
+        for i in range(end, start + n):
+            total += values[i]
+        return total
+    half = n // 2
+    half -= half % 8
+    return _pairwise_sum(values, start, half) + _pairwise_sum(
+        values, start + half, n - half
+    )
+
+
+def _mean(values):
+    """
+    Compute the mean of a list of floats without numpy.
+    The result is the same as ``np.mean(values)``, bit for bit.
+
+    :param values: a list of floats.
+    :return: float. nan if the list is empty.
+    """
+    if not values:
+        return float("nan")
+    return _pairwise_sum(values, 0, len(values)) / len(values)
+
+
+def _best_scores(score_matrix):
+    """
+    Find the best group of each hypothesis and its score.
+    Ties go to the first group, as ``np.argmax`` does.
+
+    :param score_matrix: an array-like of shape (n_hypotheses, n_groups).
+    :return: (List[int], List[float])
+    """
+    if hasattr(score_matrix, "argmax"):
+        return score_matrix.argmax(axis=1).tolist(), score_matrix.max(axis=1).tolist()
+    aligned_groups = [max(range(len(row)), key=row.__getitem__) for row in score_matrix]
+    max_bleu_list = [float(row[k]) for row, k in zip(score_matrix, aligned_groups)]
+    return aligned_groups, max_bleu_list
+
+
+def _aggregate(aligned_groups, max_scores, group_sizes, n_references):
+    """
+    Compute the three metrics from the alignment of a hypothesis set.
+
+    :param aligned_groups: the group each hypothesis is aligned to.
+    :param max_scores: the score of each hypothesis against its group.
+    :param group_sizes: the number of references in each group.
+    :param n_references: the sum of group_sizes.
+    :return: LSDSCCScore.
+    """
+    alignment = set(aligned_groups)
+    mds = len(alignment) / len(group_sizes)
+    pds = sum(group_sizes[k] for k in alignment) / n_references
+    return LSDSCCScore(mds, pds, _mean(max_scores))
+
+
+def _multi_bleu(hypothesis, reference_set, aligner, index=None):
     """
     Compute a list of scores with the aligner.
 
@@ -45,12 +140,73 @@ def _multi_bleu(hypothesis, reference_set, aligner):
     :param reference_set: a reference set.
     :param aligner: a callable to compute the semantic similarity of a hypothesis
     and a list of references.
+    :param index: an optional ReferenceIndex of the reference set. It is used
+    if the aligner knows how to score against it.
     :return: List[float]
     """
+    if index is not None and hasattr(aligner, "score_index"):
+        return aligner.score_index(hypothesis, index)
     return [aligner(hypothesis, refs) for refs in reference_set]
 
 
-def compute_score_on_hypothesis_set(hypothesis_set, reference_set, aligner=None):
+def _deduplicate(hypothesis_set):
+    """
+    Find the distinct hypotheses of a hypothesis set.
+
+    :param hypothesis_set: a hypothesis set.
+    :return: (distinct hypotheses, a list mapping each hypothesis to its distinct one).
+    """
+    positions = {}
+    distinct = []
+    inverse = []
+    for h in hypothesis_set:
+        key = tuple(h)
+        if key not in positions:
+            positions[key] = len(distinct)
+            distinct.append(h)
+        inverse.append(positions[key])
+    return distinct, inverse
+
+
+def _score_matrix(hypothesis_set, reference_set, aligner, index):
+    """
+    Compute the scores of every hypothesis against every reference group.
+    The batch protocol of the aligner is used if available (see ``lsdscc.align``).
+
+    :param hypothesis_set: a hypothesis set.
+    :param reference_set: a reference set.
+    :param aligner: a callable to compute the semantic similarity of a hypothesis
+    and a list of references.
+    :param index: the ReferenceIndex of the reference set.
+    :return: np.ndarray of shape (n_hypotheses, n_groups) if the batch protocol is used,
+    or a list of lists of scores otherwise.
+    """
+    if hasattr(aligner, "score_matrix"):
+        import numpy as np
+
+        prepare = getattr(aligner, "prepare", None)
+        prepared = prepare(index) if prepare is not None else index
+        scores = aligner.score_matrix(list(hypothesis_set), prepared)
+        return np.asarray(scores, dtype=np.float64).reshape(-1, len(index))
+    return [_multi_bleu(h, reference_set, aligner, index) for h in hypothesis_set]
+
+
+def _zip_corpora(*corpora):
+    """
+    Zip corpora that must have the same length, such as a hypothesis corpus and a reference
+    corpus. They can be any iterables, which are checked as they are consumed.
+    """
+    missing = object()
+    for items in itertools.zip_longest(*corpora, fillvalue=missing):
+        assert all(
+            item is not missing for item in items
+        ), "len of hypotheses and references should match!"
+        yield items
+
+
+def compute_score_on_hypothesis_set(
+    hypothesis_set, reference_set, aligner=None, index=None, cache=None, prune=False
+):
     """
     Compute the three metrics on a hypothesis set.
 
@@ -58,44 +214,423 @@ def compute_score_on_hypothesis_set(hypothesis_set, reference_set, aligner=None)
     :param reference_set: a reference set.
     :param aligner: a callable to compute the semantic similarity of a hypothesis
     and a list of references.
+    :param index: an optional ReferenceIndex of the reference set. If not given,
+    one is built for this call.
+    :param cache: an optional ScoreCache to look up the scores of the hypotheses.
+    :param prune: whether to skip the groups that cannot be the best one of a hypothesis
+    if the aligner supports it (``aligner.best_group``). The result is the same.
+    It is not used together with a cache, which needs the scores of all the groups.
     :return: LSDSCCScore.
     """
-    if aligner is None:
-        aligner = _align.BleuAligner()
+    return compute_result_on_hypothesis_set(
+        hypothesis_set, reference_set, aligner, index, cache, prune
+    ).score
+
 
-    alignment = set()
-    max_bleu_list = []
+def compute_result_on_hypothesis_set(
+    hypothesis_set, reference_set, aligner=None, index=None, cache=None, prune=False
+):
+    """
+    Compute the three metrics on a hypothesis set, together with the alignment of each
+    hypothesis they are computed from. The parameters are the same as those of
+    ``compute_score_on_hypothesis_set``.
 
-    for h_i, h in enumerate(hypothesis_set):
-        bleu_scores = _multi_bleu(h, reference_set, aligner)
-        k = np.argmax(bleu_scores)
-        _logger.info("hypothesis %d is aligned to ref_group %d", h_i, k)
-        alignment.add(k)
-        max_bleu = max(bleu_scores)
-        max_bleu_list.append(max_bleu)
+    :return: QueryResult.
+    """
+    if aligner is None:
+        aligner = _align.BleuAligner()
+    if index is None:
+        index = ReferenceIndex(reference_set)
+    # The stages are timed only if a hook is registered (see lsdscc.instrument).
+    instrumented = bool(_instrument.hooks)
+    if instrumented:
+        query_start = start = time.perf_counter()
+        n_hypotheses = len(hypothesis_set)
 
-    mds = len(alignment) / len(reference_set)
-    total_ref_len = sum(len(refs) for refs in reference_set)
-    pds = sum(len(reference_set[k]) for k in alignment) / total_ref_len
-    max_bleu = np.mean(max_bleu_list)
-    return LSDSCCScore(mds, pds, max_bleu)
+    # Score each distinct hypothesis once and then fan the results out.
+    hypothesis_set, inverse = _deduplicate(hypothesis_set)
+    lengths = [len(hypothesis_set[i]) for i in inverse]
+    n_pairs = len(hypothesis_set) * len(index)
+    if prune and cache is None and hasattr(aligner, "best_group"):
+        best_groups = [aligner.best_group(h, index) for h in hypothesis_set]
+        aligned_groups = [k for k, _ in best_groups]
+        max_bleu_list = [float(score) for _, score in best_groups]
+        if instrumented:
+            start = _instrument.lap("aligner", start, n_pairs)
+    else:
+        if cache is None:
+            score_matrix = _score_matrix(hypothesis_set, reference_set, aligner, index)
+        else:
+            score_matrix = cache.score_matrix(
+                hypothesis_set,
+                index,
+                aligner,
+                lambda hypotheses: _score_matrix(
+                    hypotheses, reference_set, aligner, index
+                ),
+            )
+        if instrumented:
+            start = _instrument.lap("aligner", start, n_pairs)
+        aligned_groups, max_bleu_list = _best_scores(score_matrix)
+        if instrumented:
+            start = _instrument.lap("argmax", start, len(hypothesis_set))
+    aligned_groups = [aligned_groups[i] for i in inverse]
+    max_bleu_list = [max_bleu_list[i] for i in inverse]
+    if _logger.isEnabledFor(logging.INFO):
+        for h_i, k in enumerate(aligned_groups):
+            _logger.info("hypothesis %d is aligned to ref_group %d", h_i, k)
+    group_sizes = index.group_sizes
+    score = _aggregate(aligned_groups, max_bleu_list, group_sizes, index.n_references)
+    if instrumented:
+        _instrument.lap("aggregation", start, n_hypotheses)
+        info = {
+            "query": getattr(reference_set, "query", None),
+            "n_hypotheses": n_hypotheses,
+            "n_groups": len(index),
+        }
+        _instrument.lap("query", query_start, n_hypotheses, info)
+    return QueryResult(
+        getattr(reference_set, "query", None),
+        score,
+        aligned_groups,
+        max_bleu_list,
+        group_sizes,
+        lengths,
+    )
 
 
-def compute_score_on_corpus(hypothesis_corpus, reference_corpus, aligner=None):
+def compute_score_on_corpus(
+    hypothesis_corpus,
+    reference_corpus,
+    aligner=None,
+    index=None,
+    n_jobs=None,
+    executor=None,
+    cache=None,
+    prune=False,
+):
     """
     Compute the three metrics on a corpus.
     This effectively compute the mean of scores of individual hypothesis sets.
+    ``lsdscc.sampling.estimate_score_on_corpus`` estimates them from a sample of the queries.
 
     :param hypothesis_corpus: a list of hypothesis_set.
     :param reference_corpus: a list of reference_set.
     :param aligner: a callable to compute the semantic similarity of a hypothesis
     and a list of references.
+    :param index: an optional list of ReferenceIndex, one for each reference_set,
+    as returned by ``ReferenceIndex.from_corpus``. Pass it to reuse the index across calls.
+    :param n_jobs: the number of worker processes to score the hypothesis sets in parallel.
+    None or 1 means serial and -1 means all the CPUs. The result does not depend on it.
+    :param executor: an optional ``concurrent.futures.Executor`` to run the workers on.
+    If given, the evaluation is parallel and the aligner must be picklable.
+    :param cache: an optional ScoreCache to look up the scores of the hypotheses.
+    :param prune: whether to prune the groups that cannot be the best one of a hypothesis.
+    See ``compute_score_on_hypothesis_set``.
     :return: LSDSCCScore.
+    :raise ValueError: if n_jobs is 0.
     """
     assert len(hypothesis_corpus) == len(reference_corpus)
-    score_values = []
-    for hypothesis, annotated_refs in zip(hypothesis_corpus, reference_corpus):
-        score = compute_score_on_hypothesis_set(hypothesis, annotated_refs, aligner)
-        score_values.append(score)
-    mean = np.mean(score_values, axis=0)
-    return LSDSCCScore(*mean)
+    if index is None:
+        index = ReferenceIndex.from_corpus(reference_corpus)
+    assert len(index) == len(reference_corpus)
+    if n_jobs not in (None, 1) or executor is not None:
+        from lsdscc.parallel import _check_n_jobs, parallel_scores
+
+        _check_n_jobs(n_jobs)
+        score_values = parallel_scores(
+            hypothesis_corpus,
+            reference_corpus,
+            aligner,
+            index,
+            n_jobs,
+            executor,
+            cache,
+            prune,
+        )
+    else:
+        score_values = []
+        for hypothesis, annotated_refs, refs_index in zip(
+            hypothesis_corpus, reference_corpus, index
+        ):
+            score = compute_score_on_hypothesis_set(
+                hypothesis, annotated_refs, aligner, refs_index, cache, prune
+            )
+            score_values.append(score)
+    accumulator = ScoreAccumulator()
+    for score in score_values:
+        accumulator.add(score)
+    return accumulator.mean()
+
+
+def compute_score_on_systems(
+    hypothesis_corpora,
+    reference_corpus,
+    aligner=None,
+    index=None,
+    n_jobs=None,
+    executor=None,
+    cache=None,
+    prune=False,
+):
+    """
+    Compute the three metrics on the corpora of several systems against one reference corpus.
+    The score of each system is the same as ``compute_score_on_corpus`` would give.
+
+    The reference side is processed once for all the systems. In the serial case, the
+    corpora are consumed one query at a time, so they can be iterables (e.g.,
+    ``HypothesisSet.iter_corpus``) and the index of a query is dropped once all the systems
+    are scored on it. In the parallel case, the systems are scored together by the workers.
+
+    :param hypothesis_corpora: a dict mapping the name of each system to its hypothesis corpus.
+    :param reference_corpus: a list of reference_set, or any iterable in the serial case.
+    :param aligner: a callable to compute the semantic similarity of a hypothesis
+    and a list of references.
+    :param index: an optional list of ReferenceIndex, one for each reference_set.
+    :param n_jobs: the number of worker processes. See ``compute_score_on_corpus``.
+    :param executor: an optional ``concurrent.futures.Executor`` to run the workers on.
+    :param cache: an optional ScoreCache to look up the scores of the hypotheses.
+    :param prune: whether to prune the groups that cannot be the best one of a hypothesis.
+    See ``compute_score_on_hypothesis_set``.
+    :return: Dict[str, LSDSCCScore], in the order of hypothesis_corpora.
+    """
+    query_scores = compute_query_scores_on_systems(
+        hypothesis_corpora,
+        reference_corpus,
+        aligner,
+        index,
+        n_jobs,
+        executor,
+        cache,
+        prune,
+    )
+    scores = {}
+    for name, system_scores in query_scores.items():
+        accumulator = ScoreAccumulator()
+        for score in system_scores:
+            accumulator.add(score)
+        scores[name] = accumulator.mean()
+    return scores
+
+
+def compute_query_scores_on_systems(
+    hypothesis_corpora,
+    reference_corpus,
+    aligner=None,
+    index=None,
+    n_jobs=None,
+    executor=None,
+    cache=None,
+    prune=False,
+):
+    """
+    Like ``compute_score_on_systems``, but return the score of each hypothesis set
+    instead of their mean, e.g., for significance tests (see ``lsdscc.significance``).
+
+    :return: Dict[str, List[LSDSCCScore]], in the order of hypothesis_corpora.
+    """
+    names = list(hypothesis_corpora)
+    if n_jobs not in (None, 1) or executor is not None:
+        from lsdscc.parallel import _check_n_jobs, parallel_system_scores
+
+        _check_n_jobs(n_jobs)
+        reference_corpus = list(reference_corpus)
+        hypothesis_corpora = [list(hypothesis_corpora[name]) for name in names]
+        for corpus in hypothesis_corpora:
+            assert len(corpus) == len(reference_corpus)
+        score_lists = parallel_system_scores(
+            hypothesis_corpora,
+            reference_corpus,
+            aligner,
+            index,
+            n_jobs,
+            executor,
+            cache,
+            prune,
+        )
+        return dict(zip(names, score_lists))
+
+    score_lists = [[] for _ in names]
+    index = iter(index) if index is not None else None
+    for annotated_refs, *hypothesis_sets in _zip_corpora(
+        reference_corpus, *(hypothesis_corpora[name] for name in names)
+    ):
+        refs_index = (
+            next(index) if index is not None else ReferenceIndex(annotated_refs)
+        )
+        for system_scores, hypothesis in zip(score_lists, hypothesis_sets):
+            system_scores.append(
+                compute_score_on_hypothesis_set(
+                    hypothesis, annotated_refs, aligner, refs_index, cache, prune
+                )
+            )
+    return dict(zip(names, score_lists))
+
+
+def iter_scores_on_corpus(
+    hypothesis_corpus, reference_corpus, aligner=None, cache=None, prune=False
+):
+    """
+    Lazily compute the three metrics on each hypothesis set of a corpus.
+    Both corpora can be any iterables (e.g., ``HypothesisSet.iter_corpus`` and
+    ``ReferenceSet.iter_json_corpus``) and are consumed one query at a time,
+    so the memory used does not grow with the size of the corpus.
+
+    :param hypothesis_corpus: an iterable of hypothesis_set.
+    :param reference_corpus: an iterable of reference_set.
+    :param aligner: a callable to compute the semantic similarity of a hypothesis
+    and a list of references.
+    :param cache: an optional ScoreCache to look up the scores of the hypotheses.
+    :param prune: whether to prune the groups that cannot be the best one of a hypothesis.
+    See ``compute_score_on_hypothesis_set``.
+    :return: Iterator[LSDSCCScore]
+    """
+    for result in iter_results_on_corpus(
+        hypothesis_corpus, reference_corpus, aligner, cache, prune
+    ):
+        yield result.score
+
+
+def iter_results_on_corpus(
+    hypothesis_corpus, reference_corpus, aligner=None, cache=None, prune=False
+):
+    """
+    Like ``iter_scores_on_corpus``, but yield the QueryResult of each hypothesis set,
+    which has the alignment of each hypothesis as well as the score.
+
+    :return: Iterator[QueryResult]
+    """
+    for hypothesis, annotated_refs in _zip_corpora(hypothesis_corpus, reference_corpus):
+        yield compute_result_on_hypothesis_set(
+            hypothesis, annotated_refs, aligner, cache=cache, prune=prune
+        )
+
+
+class ScoreAccumulator:
+    """
+    A running mean of LSDSCCScores.
+
+    The scores are summed in order, as ``np.mean(scores, axis=0)`` does, so its mean is
+    the same as that computed by ``compute_score_on_corpus`` on the same scores in the
+    same order.
+
+    Accumulators of consecutive ranges of queries can be merged, for example those of the
+    shards of a corpus scored on different machines. If the scores of each query are kept,
+    the merged mean is exactly that of a single accumulator of all the scores. Otherwise
+    the sums are added, which may differ in the last bits.
+    """
+
+    def __init__(self, keep_scores=False, start=0):
+        """
+        :param keep_scores: whether to keep the score of each query for an exact merge.
+        :param start: the index of the first query of the accumulated range.
+        """
+        self._sums = [0.0] * len(LSDSCCScore._fields)
+        self._count = 0
+        self._scores = [] if keep_scores else None
+        self._start = start
+
+    def __len__(self):
+        """
+        Return the number of scores added.
+        """
+        return self._count
+
+    @property
+    def start(self):
+        """
+        Return the index of the first query of the accumulated range.
+        """
+        return self._start
+
+    @property
+    def stop(self):
+        """
+        Return the index after the last query of the accumulated range.
+        """
+        return self._start + self._count
+
+    @property
+    def scores(self):
+        """
+        Return the kept score of each query, or None if they are not kept.
+        """
+        return self._scores
+
+    def add(self, score):
+        """
+        Add the score of a hypothesis set.
+
+        :param score: LSDSCCScore.
+        """
+        self._sums = [total + value for total, value in zip(self._sums, score)]
+        self._count += 1
+        if self._scores is not None:
+            self._scores.append(LSDSCCScore(*score))
+
+    def merge(self, other):
+        """
+        Add the scores of the range of queries that follows this one.
+
+        :param other: ScoreAccumulator whose start is the stop of this one.
+        """
+        if other.start != self.stop:
+            raise ValueError(
+                "cannot merge queries %d:%d after %d:%d"
+                % (other.start, other.stop, self.start, self.stop)
+            )
+        if other.scores is not None:
+            for score in other.scores:
+                self.add(score)
+            return
+        self._sums = [a + b for a, b in zip(self._sums, other._sums)]
+        self._count += len(other)
+        self._scores = None
+
+    def mean(self):
+        """
+        Return the mean of the scores added so far.
+
+        :return: LSDSCCScore.
+        """
+        if not self._count:
+            return LSDSCCScore(*[float("nan")] * len(self._sums))
+        return LSDSCCScore(*(total / self._count for total in self._sums))
+
+    def to_dict(self):
+        """
+        Return a json-ready dict of the state. The floats round-trip exactly through json.
+        """
+        return {
+            "start": self._start,
+            "count": self._count,
+            "sums": dict(zip(LSDSCCScore._fields, self._sums)),
+            "scores": (
+                None
+                if self._scores is None
+                else {
+                    field: [getattr(score, field) for score in self._scores]
+                    for field in LSDSCCScore._fields
+                }
+            ),
+        }
+
+    @classmethod
+    def from_dict(cls, state):
+        """
+        Restore an accumulator from the dict given by ``to_dict``.
+        """
+        scores = state["scores"]
+        accumulator = cls(keep_scores=scores is not None, start=state["start"])
+        accumulator._sums = [
+            float(state["sums"][field]) for field in LSDSCCScore._fields
+        ]
+        accumulator._count = state["count"]
+        if scores is not None:
+            accumulator._scores = [
+                LSDSCCScore(*values)
+                for values in zip(*(scores[field] for field in LSDSCCScore._fields))
+            ]
+            if len(accumulator._scores) != accumulator._count:
+                raise ValueError("the number of scores does not match the count")
+        return accumulator
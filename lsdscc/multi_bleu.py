@@ -0,0 +1,315 @@
+# MIT License
+#
+# Copyright (c) 2019 Cong Feng.
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+"""
+The Multi-BLEU module: an in-process reproduction of ``scripts/multi-bleu.pl``, the
+Multi-BLEU of Madnani et al. (2008) used by the paper.
+
+The script clips the n-gram counts of a hypothesis by their max counts among all its
+references and reports the cumulative BLEU-1 to BLEU-4 of a corpus. Unlike the original
+Moses script, its brevity penalty is disabled (always 1). ``-lc`` lowercases the ASCII
+letters only, as perl's ``lc`` does on undecoded text.
+
+``corpus_multi_bleu`` computes the scores of a corpus in one pass and ``format_multi_bleu``
+renders them as the line printed by the script, so the output of ``run_multi_bleu_perl``
+can be checked against it when perl is available. ``multi_bleu_score_matrix`` scores
+every hypothesis against every reference group at once, which ``MultiBleuAligner`` uses.
+"""
+
+import collections
+import math
+import os
+import re
+import shutil
+import subprocess
+import sys
+import tempfile
+
+from lsdscc.bleu import _get_ngrams, _merge_ref_ngrams
+
+__all__ = [
+    "MultiBleuScore",
+    "corpus_multi_bleu",
+    "format_multi_bleu",
+    "multi_bleu_score_matrix",
+    "run_multi_bleu_perl",
+    "perl_lowercase",
+]
+
+# The max order of n-grams of multi-bleu.pl.
+MULTI_BLEU_MAX_ORDER = 4
+
+# The perl script in the source tree.
+PERL_SCRIPT = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+    "scripts",
+    "multi-bleu.pl",
+)
+
+# The value of ``my_log(0)`` in the script.
+_LOG_ZERO = -9999999999.0
+# The initial closest reference length of a sentence in the script.
+_NO_REFERENCE_LENGTH = 9999
+_ASCII_LOWER = str.maketrans("ABCDEFGHIJKLMNOPQRSTUVWXYZ", "abcdefghijklmnopqrstuvwxyz")
+# The whitespaces of perl's split on undecoded text.
+_PERL_WHITESPACE = re.compile(r"[ \t\n\r\f\v]+")
+
+MultiBleuScore = collections.namedtuple(
+    "MultiBleuScore",
+    ["bleu", "precisions", "brevity_penalty", "ratio", "hyp_len", "ref_len"],
+)
+MultiBleuScore.__doc__ = """
+The result of multi-bleu.pl on a corpus: the cumulative BLEU of each order (BLEU-1 first)
+and the n-gram precision of each order, both as fractions, the brevity penalty, the ratio
+of the lengths, the length of the hypotheses and the closest length of the references.
+"""
+
+
+def perl_lowercase(sentence):
+    """
+    Lowercase the tokens of a sentence as ``multi-bleu.pl -lc`` does: only A to Z are changed.
+
+    :param sentence: a list of tokens.
+    :return: a list of tokens.
+    """
+    return [token.translate(_ASCII_LOWER) for token in sentence]
+
+
+def _perl_split(line):
+    return [token for token in _PERL_WHITESPACE.split(line) if token]
+
+
+def _my_log(x):
+    return math.log(x) if x else _LOG_ZERO
+
+
+def _cumulative_bleu(precisions, brevity_penalty=1):
+    """
+    Compute the cumulative BLEU of each order from the precisions, as the script does.
+    """
+    bleu = []
+    log_sum = 0.0
+    for n, precision in enumerate(precisions, 1):
+        log_sum = log_sum + _my_log(precision)
+        bleu.append(brevity_penalty * math.exp(log_sum / n))
+    return bleu
+
+
+def _closest_length(length, references):
+    # The shortest of the references whose lengths are the closest to that of the hypothesis.
+    closest_diff, closest_length = _NO_REFERENCE_LENGTH, _NO_REFERENCE_LENGTH
+    for reference in references:
+        diff = abs(length - len(reference))
+        if (
+            diff < closest_diff
+            or diff == closest_diff
+            and len(reference) < closest_length
+        ):
+            closest_diff, closest_length = diff, len(reference)
+    return closest_length
+
+
+def corpus_multi_bleu(
+    hypotheses, references, lowercase=False, max_order=MULTI_BLEU_MAX_ORDER
+):
+    """
+    Compute the scores of multi-bleu.pl on a corpus in one pass.
+
+    :param hypotheses: a list of hypotheses, each a list of tokens.
+    :param references: a list of the references of each hypothesis, each a list of tokens.
+        The hypotheses without references are scored against none, like the script does.
+    :param lowercase: whether to lowercase the tokens like ``-lc``.
+    :param max_order: the max order of n-grams. The script uses 4.
+    :return: MultiBleuScore.
+    """
+    correct = [0] * max_order
+    total = [0] * max_order
+    hyp_len = ref_len = 0
+    for i, hypothesis in enumerate(hypotheses):
+        refs = references[i] if i < len(references) else []
+        if lowercase:
+            hypothesis = perl_lowercase(hypothesis)
+            refs = [perl_lowercase(ref) for ref in refs]
+        hyp_len += len(hypothesis)
+        ref_len += _closest_length(len(hypothesis), refs)
+        ref_ngrams = _merge_ref_ngrams(refs, max_order)
+        for ngram, count in _get_ngrams(hypothesis, max_order).items():
+            total[len(ngram) - 1] += count
+            correct[len(ngram) - 1] += min(count, ref_ngrams[ngram])
+    precisions = [c / t if t else 0 for c, t in zip(correct, total)]
+    return MultiBleuScore(
+        bleu=_cumulative_bleu(precisions),
+        precisions=precisions,
+        brevity_penalty=1,
+        ratio=hyp_len / ref_len if ref_len else 0,
+        hyp_len=hyp_len,
+        ref_len=ref_len,
+    )
+
+
+def format_multi_bleu(score):
+    """
+    Render a MultiBleuScore as the line printed by multi-bleu.pl.
+
+    :param score: MultiBleuScore.
+    :return: str, without the newline.
+    """
+    if not score.ref_len:
+        return "BLEU = 0, 0/0/0/0 (BP=0, ratio=0, hyp_len=0, ref_len=0)"
+    return "BLEU = %s (BP=%.3f, ratio=%.3f, hyp_len=%d, ref_len=%d)" % (
+        "/".join("%.1f" % (100 * bleu) for bleu in score.bleu),
+        score.brevity_penalty,
+        score.ratio,
+        score.hyp_len,
+        score.ref_len,
+    )
+
+
+def multi_bleu_score_matrix(hypothesis_set, encoded, max_order=None):
+    """
+    Compute the Multi-BLEU of every hypothesis against every reference group, i.e., the
+    cumulative BLEU of ``max_order`` that the script gives to a one-line corpus. The result is
+    the same as ``corpus_multi_bleu`` on each pair, bit for bit.
+
+    :param hypothesis_set: a hypothesis set.
+    :param encoded: lsdscc.batch.EncodedReferences of the reference set.
+    :param max_order: the order of the BLEU. Must not exceed that of ``encoded``.
+    :return: np.ndarray of shape (n_hypotheses, n_groups).
+    """
+    import numpy as np
+
+    from lsdscc.batch import _exp, _log, match_counts
+
+    max_order = max_order or MULTI_BLEU_MAX_ORDER
+    matches, possibles, _ = match_counts(hypothesis_set, encoded, max_order)
+    possibles = np.broadcast_to(possibles[:, :, None], matches.shape)
+    precisions = np.divide(
+        matches, possibles, out=np.zeros(matches.shape), where=possibles > 0
+    )
+    log_precisions = _log(np.where(precisions > 0, precisions, 1.0)).astype(np.float64)
+    log_precisions[precisions == 0] = _LOG_ZERO
+    log_sum = np.zeros(matches.shape[1:])
+    for n in range(max_order):
+        log_sum = log_sum + log_precisions[n]
+    return _exp(log_sum / max_order).astype(np.float64)
+
+
+def run_multi_bleu_perl(hypotheses, references, lowercase=False, script=None):
+    """
+    Run multi-bleu.pl once on a whole corpus.
+
+    The k-th references of the hypotheses are written to the k-th reference file. The
+    hypotheses with fewer references repeat their first one, which changes no score.
+
+    :param hypotheses: a list of hypotheses, each a list of tokens.
+    :param references: a list of the references of each hypothesis, each a list of tokens.
+    :param lowercase: whether to pass ``-lc``.
+    :param script: the perl script. Default to ``PERL_SCRIPT``.
+    :return: str, the line printed by the script.
+    """
+    script = script or PERL_SCRIPT
+    perl = shutil.which("perl")
+    if perl is None:
+        raise RuntimeError("perl is not available")
+    if not os.path.exists(script):
+        raise RuntimeError("perl script %s does not exist" % script)
+    if len(references) != len(hypotheses) or not all(references):
+        raise ValueError("every hypothesis needs at least one reference")
+    n_references = max(len(refs) for refs in references) if references else 0
+    with tempfile.TemporaryDirectory() as tmpdir:
+        stem = os.path.join(tmpdir, "reference")
+        for k in range(n_references):
+            with open(stem + str(k), "w") as f:
+                for refs in references:
+                    print(" ".join(refs[k] if k < len(refs) else refs[0]), file=f)
+        hypothesis_file = os.path.join(tmpdir, "hypothesis")
+        with open(hypothesis_file, "w") as f:
+            for hypothesis in hypotheses:
+                print(" ".join(hypothesis), file=f)
+        cmdline = [perl, script] + (["-lc"] if lowercase else []) + [stem]
+        with open(hypothesis_file) as stdin:
+            result = subprocess.run(
+                cmdline, stdin=stdin, stdout=subprocess.PIPE, stderr=subprocess.PIPE
+            )
+    return result.stdout.decode().strip()
+
+
+def _reference_files(stem):
+    """
+    Find the reference files of a stem like the script does.
+    """
+    if (
+        not os.path.exists(stem)
+        and not os.path.exists(stem + "0")
+        and os.path.exists(stem + ".ref0")
+    ):
+        stem += ".ref"
+    filenames = []
+    while os.path.exists(stem + str(len(filenames))):
+        filenames.append(stem + str(len(filenames)))
+    if os.path.exists(stem):
+        filenames.append(stem)
+    return filenames
+
+
+def _read_lines(f):
+    # The script chops the last character of each line.
+    return [_perl_split(line[:-1]) for line in f]
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(
+        description="a drop-in replacement of multi-bleu.pl, reading the hypotheses from stdin"
+    )
+    parser.add_argument("-lc", dest="lowercase", action="store_true", help="lowercase")
+    parser.add_argument("reference", help="reference or reference0, reference1, ...")
+    parser.add_argument(
+        "--check",
+        action="store_true",
+        help="also run the perl script and fail if its output differs",
+    )
+    args = parser.parse_args()
+
+    reference_files = _reference_files(args.reference)
+    if not reference_files:
+        parser.error("could not find reference file %s" % args.reference)
+    references = []
+    for filename in reference_files:
+        with open(filename, errors="surrogateescape") as f:
+            for i, reference in enumerate(_read_lines(f)):
+                if i == len(references):
+                    references.append([])
+                references[i].append(reference)
+    sys.stdin.reconfigure(errors="surrogateescape")
+    hypotheses = _read_lines(sys.stdin)
+    score = corpus_multi_bleu(hypotheses, references, args.lowercase)
+    line = format_multi_bleu(score)
+    print(line)
+    if args.check:
+        expected = run_multi_bleu_perl(
+            hypotheses, references[: len(hypotheses)], args.lowercase
+        )
+        if expected != line:
+            print("multi-bleu.pl gives: %s" % expected, file=sys.stderr)
+            sys.exit(1)
+    sys.exit(0 if score.ref_len else 1)
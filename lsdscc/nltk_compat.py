@@ -0,0 +1,312 @@
+# MIT License
+#
+# Copyright (c) 2019 Cong Feng.
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+"""
+The NLTK-compatible BLEU and NIST module.
+
+It reproduces ``nltk.translate.bleu_score.sentence_bleu`` with the methods of
+``SmoothingFunction`` and ``nltk.translate.nist_score.sentence_nist`` on the integer-encoded
+tables of ``lsdscc.batch``, scoring a whole hypothesis set against every group of a reference
+set at once. The scores agree with nltk to within floating point rounding.
+
+As in nltk, each group is a separate reference set for NIST: the information weights of the
+n-grams of a group are estimated from the references of that group only. They are computed
+once for all the groups by ``NistTables``.
+"""
+import math
+import sys
+
+import numpy as np
+
+from lsdscc.batch import _flatten, _hypothesis_ngrams, match_counts
+
+__all__ = [
+    "SMOOTHING_METHODS",
+    "NistTables",
+    "nltk_bleu_score_matrix",
+    "nist_score_matrix",
+]
+
+SMOOTHING_METHODS = tuple("method%d" % i for i in range(8))
+
+# The order of the extra modified precision that method5 of nltk always uses.
+_METHOD5_ORDER = 5
+
+_log = np.frompyfunc(math.log, 1, 1)
+
+
+def _closest_reference_lengths(lengths, encoded):
+    """
+    Find the length of the reference closest to each hypothesis in each group, choosing the
+    shorter one on ties as ``nltk.translate.bleu_score.closest_ref_length`` does.
+
+    :param lengths: the length of each hypothesis.
+    :param encoded: EncodedReferences of the reference set.
+    :return: np.ndarray of shape (n_hypotheses, n_groups).
+    """
+    reference_lengths = encoded.reference_lengths
+    scale = int(reference_lengths.max(initial=0)) + 1
+    keys = np.abs(reference_lengths[None, :] - lengths[:, None]) * scale
+    keys += reference_lengths[None, :]
+    return np.minimum.reduceat(keys, encoded.group_offsets[:-1], axis=1) % scale
+
+
+def _check_groups(encoded):
+    if encoded.n_groups and (np.diff(encoded.group_offsets) == 0).any():
+        raise ValueError("every group must have at least one reference")
+
+
+def nltk_bleu_score_matrix(
+    hypothesis_set,
+    encoded,
+    weights=(0.25, 0.25, 0.25, 0.25),
+    method="method0",
+    epsilon=0.1,
+    alpha=5,
+    k=5,
+):
+    """
+    Compute ``sentence_bleu(refs, hypothesis, weights, smoothing_function)`` of every
+    hypothesis against every reference group.
+
+    Unlike nltk, method0 does not warn about the orders without any match.
+
+    :param hypothesis_set: a hypothesis set.
+    :param encoded: EncodedReferences of the reference set, of an order no less than the
+        number of weights, or than 5 for method5 and method7.
+    :param weights: weights for unigrams, bigrams, trigrams and so on.
+    :param method: the name of the smoothing method of ``SmoothingFunction``.
+    :param epsilon: the epsilon of method1.
+    :param alpha: the alpha of method6.
+    :param k: the k of method4 and method7.
+    :return: np.ndarray of shape (n_hypotheses, n_groups).
+    """
+    if method not in SMOOTHING_METHODS:
+        raise ValueError("unknown smoothing method: %r" % (method,))
+    _check_groups(encoded)
+    if not encoded.n_groups:
+        return np.zeros((len(hypothesis_set), 0))
+    n = len(weights)
+    max_order = n
+    if method in ("method5", "method7"):
+        max_order = max(n, _METHOD5_ORDER)
+    matches, possibles, lengths = match_counts(hypothesis_set, encoded, max_order)
+    shape = matches.shape[1:]
+    numerators = matches.astype(np.float64)
+    denominators = np.broadcast_to(np.maximum(possibles, 1)[:, :, None], matches.shape)
+    hyp_lengths = lengths[:, None].astype(np.float64)
+
+    p_n = [numerators[i] / denominators[i] for i in range(n)]
+    zero = [matches[i] == 0 for i in range(n)]
+    if method == "method0":
+        p_n = [np.where(zero[i], sys.float_info.min, p_n[i]) for i in range(n)]
+    elif method == "method1":
+        p_n = [np.where(zero[i], epsilon / denominators[i], p_n[i]) for i in range(n)]
+    elif method == "method2":
+        p_n = p_n[:1] + [
+            (numerators[i] + 1) / (denominators[i] + 1) for i in range(1, n)
+        ]
+    elif method == "method3":
+        count = np.zeros(shape)
+        for i in range(n):
+            count = count + zero[i]
+            p_n[i] = np.where(zero[i], 1 / (2.0**count * denominators[i]), p_n[i])
+    elif method == "method6":
+        if n < 3:
+            raise ValueError("method6 needs the weights of at least 3 orders")
+        if ((matches[0] > 0) & zero[2]).any():
+            raise ValueError(
+                "This smoothing method requires non-zero precision for bigrams."
+            )
+        for i in range(2, n):
+            pi0 = np.divide(
+                p_n[i - 1] ** 2,
+                p_n[i - 2],
+                out=np.zeros(shape),
+                where=p_n[i - 2] != 0,
+            )
+            p_n[i] = (numerators[i] + alpha * pi0) / (possibles[i][:, None] + alpha)
+    if method in ("method4", "method7"):
+        count = np.zeros(shape)
+        log_lengths = np.log(np.where(hyp_lengths > 1, hyp_lengths, 2.0))
+        for i in range(n):
+            smoothed = zero[i] & (hyp_lengths > 1)
+            count = count + smoothed
+            p_n[i] = np.where(
+                smoothed, 1 / (2.0**count * k / log_lengths) / denominators[i], p_n[i]
+            )
+    if method in ("method5", "method7"):
+        p_n_plus1 = p_n + [
+            numerators[_METHOD5_ORDER - 1] / denominators[_METHOD5_ORDER - 1]
+        ]
+        m = p_n[0] + 1
+        for i in range(n):
+            m = p_n[i] = (m + p_n[i] + p_n_plus1[i + 1]) / 3
+
+    log_sum = np.zeros(shape)
+    for w_i, p_i in zip(weights, p_n):
+        positive = p_i > 0
+        log_sum = log_sum + np.where(
+            positive, w_i * np.log(np.where(positive, p_i, 1.0)), 0.0
+        )
+
+    closest = _closest_reference_lengths(lengths, encoded)
+    brevity_penalty = np.where(
+        hyp_lengths > closest,
+        1.0,
+        np.exp(1 - closest / np.where(hyp_lengths > 0, hyp_lengths, 1.0)),
+    )
+    brevity_penalty = np.where(hyp_lengths == 0, 0.0, brevity_penalty)
+    return np.where(matches[0] == 0, 0.0, brevity_penalty * np.exp(log_sum))
+
+
+class NistTables:
+    """
+    The information weights of the n-grams of each group of a reference set, together with
+    an inverted index from each n-gram to the references having it.
+
+    For each order, the entries ``starts[k - 1][rank]:starts[k - 1][rank + 1]`` of
+    ``reference_ids[k - 1]``, ``counts[k - 1]`` and ``weights[k - 1]`` hold the references
+    having the n-gram of the rank, its count in each of them and its information weight in
+    the group of each of them.
+    """
+
+    def __init__(self, encoded, n=5):
+        assert n <= encoded.max_order, "encoded references of a lower order"
+        _check_groups(encoded)
+        self.n = n
+        self.starts = []
+        self.reference_ids = []
+        self.counts = []
+        self.weights = []
+
+        group_lengths = np.diff(
+            np.concatenate([[0], np.cumsum(encoded.reference_lengths)])[
+                encoded.group_offsets
+            ]
+        )
+        prefix_keys = prefix_frequencies = None
+        for order in range(1, n + 1):
+            table = encoded.tables[order - 1]
+            reference_ids, ranks, counts = encoded.reference_counts[order - 1]
+            groups = encoded.reference_groups[reference_ids]
+            # The frequency of each n-gram in the group of each entry.
+            keys, inverse = np.unique(groups * len(table) + ranks, return_inverse=True)
+            frequencies = np.bincount(inverse, weights=counts).astype(np.int64)
+            entry_frequencies = frequencies[inverse]
+            if order == 1:
+                numerators = group_lengths[groups]
+            else:
+                prefix_table_size = len(encoded.tables[order - 2])
+                prefixes = groups * prefix_table_size + table[ranks] // encoded.base
+                numerators = prefix_frequencies[np.searchsorted(prefix_keys, prefixes)]
+            # Info(w_1 ... w_n) = log_2 [ (# of w_1 ... w_n-1) / (# of w_1 ... w_n) ]
+            weights = (_log(numerators / entry_frequencies) / math.log(2)).astype(
+                np.float64
+            )
+
+            by_rank = np.argsort(ranks, kind="stable")
+            self.starts.append(
+                np.searchsorted(ranks[by_rank], np.arange(len(table) + 1))
+            )
+            self.reference_ids.append(reference_ids[by_rank])
+            self.counts.append(counts[by_rank])
+            self.weights.append(weights[by_rank])
+            prefix_keys, prefix_frequencies = keys, frequencies
+
+
+def _nist_length_penalty(ref_lengths, hyp_lengths):
+    """
+    The vectorized version of ``nltk.translate.nist_score.nist_length_penalty``.
+    """
+    ratio = hyp_lengths / ref_lengths
+    ratio_x, score_x = 1.5, 0.5
+    beta = math.log(score_x) / math.log(ratio_x) ** 2
+    shrunk = (ratio > 0) & (ratio < 1)
+    return np.where(
+        shrunk,
+        np.exp(beta * np.log(np.where(shrunk, ratio, 1.0)) ** 2),
+        np.clip(ratio, 0.0, 1.0),
+    )
+
+
+def nist_score_matrix(hypothesis_set, encoded, tables):
+    """
+    Compute ``sentence_nist(refs, hypothesis, n)`` of every hypothesis against every
+    reference group.
+
+    As in nltk, a hypothesis shorter than ``n`` raises ZeroDivisionError.
+
+    :param hypothesis_set: a hypothesis set.
+    :param encoded: EncodedReferences of the reference set.
+    :param tables: NistTables of ``encoded``.
+    :return: np.ndarray of shape (n_hypotheses, n_groups).
+    """
+    n = tables.n
+    tokens, lengths = _flatten(hypothesis_set, encoded.vocab)
+    if len(lengths) and lengths.min() < n:
+        raise ZeroDivisionError(
+            "a hypothesis has no n-gram of order %d (at most %d)" % (n, lengths.min())
+        )
+    n_hypotheses = len(lengths)
+    reference_lengths = encoded.reference_lengths
+    group_starts = encoded.group_offsets[:-1]
+    precision = np.zeros((n_hypotheses, encoded.n_groups))
+    ref_lengths = np.zeros((n_hypotheses, encoded.n_groups), dtype=np.int64)
+    if not encoded.n_groups:
+        return precision
+
+    for order, sentence_ids, ranks in _hypothesis_ngrams(tokens, lengths, encoded, n):
+        starts = tables.starts[order - 1]
+        table_size = len(encoded.tables[order - 1])
+        # The distinct n-grams of each hypothesis in the order of their first occurrences,
+        # so that the overlaps with each reference are summed in the same order as nltk.
+        keys, first, hyp_counts = np.unique(
+            sentence_ids * table_size + ranks, return_index=True, return_counts=True
+        )
+        by_occurrence = np.argsort(first, kind="stable")
+        keys, hyp_counts = keys[by_occurrence], hyp_counts[by_occurrence]
+        hyp_ids, ranks = keys // table_size, keys % table_size
+
+        # Pair each n-gram of a hypothesis with each reference having it.
+        begins, sizes = starts[ranks], starts[ranks + 1] - starts[ranks]
+        entries = np.arange(sizes.sum()) - np.repeat(np.cumsum(sizes) - sizes, sizes)
+        entries += np.repeat(begins, sizes)
+        numerators = np.zeros((n_hypotheses, len(reference_lengths)))
+        np.add.at(
+            numerators,
+            (np.repeat(hyp_ids, sizes), tables.reference_ids[order - 1][entries]),
+            tables.weights[order - 1][entries]
+            * np.minimum(
+                np.repeat(hyp_counts, sizes), tables.counts[order - 1][entries]
+            ),
+        )
+
+        # The best reference of each group has the highest numerator and then the longest
+        # length, as the denominator is the same for all of them.
+        best = np.maximum.reduceat(numerators, group_starts, axis=1)
+        is_best = numerators == best[:, encoded.reference_groups]
+        ref_lengths += np.maximum.reduceat(
+            np.where(is_best, reference_lengths[None, :], -1), group_starts, axis=1
+        )
+        precision = precision + best / (lengths - order + 1)[:, None]
+
+    return precision * _nist_length_penalty(ref_lengths, n * lengths[:, None])
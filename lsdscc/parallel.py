@@ -0,0 +1,269 @@
+# MIT License
+#
+# Copyright (c) 2019 Cong Feng.
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+"""
+The parallel evaluation module.
+
+The reference corpus is pickled once into a block of shared memory, one slice per
+reference set. The workers attach to the block and unpickle only the reference sets of
+the queries they are given, instead of receiving the whole corpus.
+"""
+import concurrent.futures
+import copy
+import logging
+import os
+import pickle
+from multiprocessing import shared_memory
+
+from lsdscc.index import ReferenceIndex
+
+__all__ = [
+    "SharedReferenceCorpus",
+    "parallel_scores",
+    "parallel_system_scores",
+]
+
+_logger = logging.getLogger(__name__)
+
+# The number of chunks each worker gets on average.
+CHUNKS_PER_WORKER = 4
+
+
+class SharedReferenceCorpus:
+    """
+    A list of ReferenceIndex living in shared memory.
+
+    Use it as a context manager so that the memory is released on exit.
+    """
+
+    def __init__(self, index):
+        blobs = [pickle.dumps(i, protocol=pickle.HIGHEST_PROTOCOL) for i in index]
+        self.offsets = [0]
+        for blob in blobs:
+            self.offsets.append(self.offsets[-1] + len(blob))
+        self._shm = shared_memory.SharedMemory(
+            create=True, size=max(self.offsets[-1], 1)
+        )
+        self._shm.buf[: self.offsets[-1]] = b"".join(blobs)
+        self.name = self._shm.name
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        """
+        Release the shared memory.
+        """
+        self._shm.close()
+        self._shm.unlink()
+
+
+def _check_n_jobs(n_jobs):
+    # 0 would start an executor without workers.
+    if n_jobs == 0:
+        raise ValueError("n_jobs must be positive or -1, got 0")
+
+
+def _attach(name):
+    """
+    Attach to a block of shared memory created by the parent process.
+    """
+    try:
+        return shared_memory.SharedMemory(name=name, track=False)
+    except TypeError:
+        # Before Python 3.13 there is no opt-out of tracking. It is harmless here since
+        # the workers share the resource tracker of the parent, who unlinks the block.
+        return shared_memory.SharedMemory(name=name)
+
+
+def _score_chunk(
+    name, offsets, query_ids, hypothesis_chunks, aligner, cache=None, prune=False
+):
+    """
+    Score a chunk of queries of one or more systems in a worker.
+    The index of each query is unpickled once and shared by the systems.
+
+    :return: (query_ids, scores, cache_stats), where scores holds a list for each system.
+    """
+    from lsdscc.metrics import compute_score_on_hypothesis_set
+
+    if cache is not None:
+        # A connection of our own, whether the worker is a process or a thread.
+        cache = copy.copy(cache)
+    shm = _attach(name)
+    try:
+        scores = [[] for _ in hypothesis_chunks]
+        for j, i in enumerate(query_ids):
+            index = pickle.loads(shm.buf[offsets[i] : offsets[i + 1]])
+            for system_scores, hypothesis_chunk in zip(scores, hypothesis_chunks):
+                system_scores.append(
+                    compute_score_on_hypothesis_set(
+                        hypothesis_chunk[j],
+                        index.reference_set,
+                        aligner,
+                        index,
+                        cache,
+                        prune,
+                    )
+                )
+    finally:
+        shm.close()
+        if cache is not None:
+            # The cache it is copied from evicts when it is closed.
+            cache.close(evict=False)
+    cache_stats = (cache.hits, cache.misses) if cache is not None else (0, 0)
+    return query_ids, scores, cache_stats
+
+
+def _chunks(hypothesis_corpora, index, n_chunks):
+    """
+    Split the queries into chunks, the most expensive ones first.
+
+    The cost of a query is estimated by the number of hypotheses of all the systems
+    times the number of references.
+    """
+    costs = [
+        sum(len(corpus[i]) for corpus in hypothesis_corpora) * refs_index.n_references
+        for i, refs_index in enumerate(index)
+    ]
+    order = sorted(range(len(costs)), key=lambda i: (-costs[i], i))
+    chunksize = max(1, -(-len(order) // n_chunks))
+    return [order[i : i + chunksize] for i in range(0, len(order), chunksize)]
+
+
+def parallel_scores(
+    hypothesis_corpus,
+    reference_corpus,
+    aligner=None,
+    index=None,
+    n_jobs=None,
+    executor=None,
+    cache=None,
+    prune=False,
+):
+    """
+    Compute the scores of each hypothesis set of a corpus in parallel.
+
+    The result is the same as the serial computation and is in the order of the corpus.
+
+    :param hypothesis_corpus: a list of hypothesis_set.
+    :param reference_corpus: a list of reference_set.
+    :param aligner: a picklable aligner.
+    :param index: an optional list of ReferenceIndex.
+    :param n_jobs: the number of worker processes. -1 means all the CPUs.
+    It is ignored if executor is given.
+    :param executor: an optional ``concurrent.futures.Executor`` to run the workers.
+    :param cache: an optional ScoreCache. The workers open their own connections to it
+    and their hit and miss counts are added to it.
+    :param prune: whether to prune the groups that cannot be the best one of a hypothesis.
+    :return: List[LSDSCCScore]
+    """
+    (scores,) = parallel_system_scores(
+        [hypothesis_corpus],
+        reference_corpus,
+        aligner,
+        index,
+        n_jobs,
+        executor,
+        cache,
+        prune,
+    )
+    return scores
+
+
+def parallel_system_scores(
+    hypothesis_corpora,
+    reference_corpus,
+    aligner=None,
+    index=None,
+    n_jobs=None,
+    executor=None,
+    cache=None,
+    prune=False,
+):
+    """
+    Compute the scores of each hypothesis set of several systems in parallel.
+
+    The systems are scored together: a chunk holds the hypothesis sets of all the systems
+    for its queries, so each reference set is sent to the workers and unpickled only once.
+
+    :param hypothesis_corpora: a list of hypothesis corpora, one for each system.
+    :param reference_corpus: a list of reference_set.
+    :param aligner: a picklable aligner.
+    :param index: an optional list of ReferenceIndex.
+    :param n_jobs: the number of worker processes. -1 means all the CPUs.
+    It is ignored if executor is given.
+    :param executor: an optional ``concurrent.futures.Executor`` to run the workers.
+    :param cache: an optional ScoreCache. See ``parallel_scores``.
+    :param prune: whether to prune the groups that cannot be the best one of a hypothesis.
+    :return: List[List[LSDSCCScore]], the scores of each system in the order of the corpus.
+    """
+    if index is None:
+        index = ReferenceIndex.from_corpus(reference_corpus)
+    _check_n_jobs(n_jobs)
+    if n_jobs is None or n_jobs < 0:
+        n_jobs = os.cpu_count() or 1
+    own_executor = executor is None
+    if own_executor:
+        executor = concurrent.futures.ProcessPoolExecutor(n_jobs)
+
+    chunks = _chunks(hypothesis_corpora, index, n_jobs * CHUNKS_PER_WORKER)
+    _logger.info(
+        "scoring %d queries of %d systems in %d chunks",
+        len(index),
+        len(hypothesis_corpora),
+        len(chunks),
+    )
+    scores = [[None] * len(index) for _ in hypothesis_corpora]
+    try:
+        with SharedReferenceCorpus(index) as shared:
+            futures = [
+                executor.submit(
+                    _score_chunk,
+                    shared.name,
+                    shared.offsets,
+                    query_ids,
+                    [[corpus[i] for i in query_ids] for corpus in hypothesis_corpora],
+                    aligner,
+                    cache,
+                    prune,
+                )
+                for query_ids in chunks
+            ]
+            for future in concurrent.futures.as_completed(futures):
+                query_ids, chunk_scores, (hits, misses) = future.result()
+                for system_scores, system_chunk_scores in zip(scores, chunk_scores):
+                    for i, score in zip(query_ids, system_chunk_scores):
+                        system_scores[i] = score
+                if cache is not None:
+                    cache.hits += hits
+                    cache.misses += misses
+    finally:
+        if own_executor:
+            executor.shutdown()
+    return scores
@@ -0,0 +1,271 @@
+# MIT License
+#
+# Copyright (c) 2019 Cong Feng.
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+"""
+The sampling module: estimate the three metrics of a corpus from a stratified sample of its
+queries, with standard errors.
+
+The queries are partitioned into strata by the number of groups (or references) of their
+reference sets, which drives the cost and the spread of the scores, and each stratum is
+sampled in proportion to its size. The sample of a seed is deterministic and a larger
+sample extends a smaller one, so the sample can grow until the standard errors reach a
+target without scoring any query twice.
+"""
+import collections
+import math
+import random
+
+from lsdscc.metrics import (
+    LSDSCCScore,
+    ScoreAccumulator,
+    compute_query_scores_on_systems,
+)
+
+__all__ = [
+    "ScoreEstimate",
+    "estimate_score_on_corpus",
+    "STRATIFICATIONS",
+]
+
+DEFAULT_SAMPLE_SIZE = 250
+DEFAULT_MAX_STRATA = 8
+# The headroom when the sample is grown to reach a target error.
+_GROWTH_MARGIN = 1.1
+# The smallest and largest relative growth of the sample in a step.
+_MIN_GROWTH = 1.25
+_MAX_GROWTH = 4
+
+ScoreEstimate = collections.namedtuple(
+    "ScoreEstimate", ["score", "standard_error", "n_sampled", "n_queries"]
+)
+ScoreEstimate.__doc__ = """
+An estimate of the scores of a corpus: the estimated LSDSCCScore, the standard error of
+each metric as an LSDSCCScore, the number of queries scored and the number of queries of
+the corpus. If every query is scored, the score is exact and the standard errors are 0.
+"""
+
+
+def _group_count(reference_set):
+    return len(reference_set)
+
+
+def _reference_count(reference_set):
+    return sum(len(refs) for refs in reference_set)
+
+
+# The keys to stratify the queries by, by name. None puts all the queries in one stratum.
+STRATIFICATIONS = {
+    "groups": _group_count,
+    "references": _reference_count,
+    None: lambda reference_set: 0,
+}
+
+
+def _strata(keys, max_strata):
+    """
+    Partition the queries by their keys: one stratum per key if there are few keys, or else
+    ``max_strata`` strata of about the same size in the order of the keys.
+
+    :return: List[List[int]], the queries of each stratum.
+    """
+    distinct = sorted(set(keys))
+    if len(distinct) <= max_strata:
+        strata = {key: [] for key in distinct}
+        for i, key in enumerate(keys):
+            strata[key].append(i)
+        return list(strata.values())
+    order = sorted(range(len(keys)), key=lambda i: (keys[i], i))
+    n = len(order)
+    return [
+        order[h * n // max_strata : (h + 1) * n // max_strata]
+        for h in range(max_strata)
+    ]
+
+
+def _allocate(sizes, sample_size):
+    """
+    Allocate a sample to the strata in proportion to their sizes by the largest remainders.
+    Every stratum gets at least two queries (if it has them) so that its variance can be
+    estimated.
+    """
+    total = sum(sizes)
+    quotas = [sample_size * size / total for size in sizes]
+    allocation = [min(size, max(2, int(quota))) for size, quota in zip(sizes, quotas)]
+    remaining = sample_size - sum(allocation)
+    while remaining < 0:
+        # The minimum of two took queries from the quotas of the larger strata.
+        candidates = [h for h in range(len(sizes)) if allocation[h] > 2]
+        if not candidates:
+            break
+        h = min(candidates, key=lambda h: (quotas[h] - allocation[h], h))
+        allocation[h] -= 1
+        remaining += 1
+    while remaining > 0:
+        candidates = [h for h, size in enumerate(sizes) if allocation[h] < size]
+        if not candidates:
+            break
+        h = max(candidates, key=lambda h: (quotas[h] - allocation[h], -h))
+        allocation[h] += 1
+        remaining -= 1
+    return allocation
+
+
+def _stratified_estimate(strata_scores, sizes):
+    """
+    Compute the stratified mean and its standard error with the finite population
+    correction.
+
+    :param strata_scores: the scores sampled from each stratum.
+    :param sizes: the number of queries of each stratum.
+    :return: (LSDSCCScore, LSDSCCScore).
+    """
+    total = sum(sizes)
+    means = []
+    errors = []
+    for field in range(len(LSDSCCScore._fields)):
+        mean = variance = 0.0
+        for scores, size in zip(strata_scores, sizes):
+            values = [score[field] for score in scores]
+            n = len(values)
+            weight = size / total
+            stratum_mean = sum(values) / n
+            mean += weight * stratum_mean
+            if 1 < n < size:
+                s2 = sum((v - stratum_mean) ** 2 for v in values) / (n - 1)
+                variance += weight**2 * (1 - n / size) * s2 / n
+        means.append(mean)
+        errors.append(math.sqrt(variance))
+    return LSDSCCScore(*means), LSDSCCScore(*errors)
+
+
+def estimate_score_on_corpus(
+    hypothesis_corpus,
+    reference_corpus,
+    sample_size=DEFAULT_SAMPLE_SIZE,
+    target_error=None,
+    stratify="groups",
+    max_strata=DEFAULT_MAX_STRATA,
+    seed=0,
+    aligner=None,
+    n_jobs=None,
+    executor=None,
+    cache=None,
+    prune=False,
+):
+    """
+    Estimate the three metrics on a corpus by scoring a stratified sample of its queries.
+
+    The estimate is the stratified mean of the sampled scores and the standard errors
+    account for the sampling without replacement. The scores are those of
+    ``compute_score_on_corpus`` on the sampled queries.
+
+    :param hypothesis_corpus: a list of hypothesis_set, which only needs to support indexing
+    and ``len``, such as ``HypothesisSet.open_corpus`` gives.
+    :param reference_corpus: a list of reference_set.
+    :param sample_size: the number of queries to score, or the initial number if
+    target_error is given.
+    :param target_error: if given, the sample is grown until the standard error of every
+    metric is at most this value, or until every query is scored.
+    :param stratify: one of ``STRATIFICATIONS``: "groups" or "references" to stratify the
+    queries by the number of groups or references of their reference sets, or None.
+    :param max_strata: the max number of strata.
+    :param seed: the seed of the sample. The same seed gives the same sample.
+    :param aligner: a callable to compute the semantic similarity of a hypothesis
+    and a list of references.
+    :param n_jobs: the number of worker processes. See ``compute_score_on_corpus``.
+    :param executor: an optional ``concurrent.futures.Executor`` to run the workers on.
+    :param cache: an optional ScoreCache to look up the scores of the hypotheses.
+    :param prune: whether to prune the groups that cannot be the best one of a hypothesis.
+    :return: ScoreEstimate.
+    """
+    n_queries = len(reference_corpus)
+    if len(hypothesis_corpus) != n_queries:
+        raise ValueError(
+            "%d hypothesis sets for %d reference sets"
+            % (len(hypothesis_corpus), n_queries)
+        )
+    if not n_queries:
+        raise ValueError("cannot estimate the score of an empty corpus")
+    if stratify not in STRATIFICATIONS:
+        raise ValueError("unknown stratification %r" % (stratify,))
+    key = STRATIFICATIONS[stratify]
+    strata = _strata(
+        [key(reference_set) for reference_set in reference_corpus], max_strata
+    )
+    rng = random.Random(seed)
+    for stratum in strata:
+        rng.shuffle(stratum)
+    sizes = [len(stratum) for stratum in strata]
+
+    scores = {}
+    allocation = [0] * len(strata)
+    sample_size = min(max(1, sample_size), n_queries)
+    while True:
+        # The sample only grows, so the queries scored so far are kept.
+        allocation = [
+            max(old, new) for old, new in zip(allocation, _allocate(sizes, sample_size))
+        ]
+        queries = sorted(
+            i
+            for stratum, n in zip(strata, allocation)
+            for i in stratum[:n]
+            if i not in scores
+        )
+        if queries:
+            (new_scores,) = compute_query_scores_on_systems(
+                {None: [hypothesis_corpus[i] for i in queries]},
+                [reference_corpus[i] for i in queries],
+                aligner,
+                n_jobs=n_jobs,
+                executor=executor,
+                cache=cache,
+                prune=prune,
+            ).values()
+            scores.update(zip(queries, new_scores))
+
+        if len(scores) == n_queries:
+            # Every query is scored: the score is that of the whole corpus.
+            accumulator = ScoreAccumulator()
+            for i in range(n_queries):
+                accumulator.add(scores[i])
+            zero = LSDSCCScore(*[0.0] * len(LSDSCCScore._fields))
+            return ScoreEstimate(accumulator.mean(), zero, n_queries, n_queries)
+        score, error = _stratified_estimate(
+            [
+                [scores[i] for i in stratum[:n]]
+                for stratum, n in zip(strata, allocation)
+            ],
+            sizes,
+        )
+        if target_error is None or max(error) <= target_error:
+            return ScoreEstimate(score, error, len(scores), n_queries)
+        sample_size = _grow(len(scores), n_queries, max(error), target_error)
+
+
+def _grow(n, n_queries, error, target_error):
+    """
+    Project the sample size that reaches the target error, assuming that the variance of
+    the scores stays the same: error ** 2 = variance * (1 / n - 1 / n_queries).
+    """
+    variance = error**2 / (1 / n - 1 / n_queries)
+    needed = 1 / (target_error**2 / variance + 1 / n_queries) * _GROWTH_MARGIN
+    needed = min(max(needed, n * _MIN_GROWTH), n * _MAX_GROWTH)
+    return min(n_queries, math.ceil(needed))
@@ -0,0 +1,676 @@
+# MIT License
+#
+# Copyright (c) 2019 Cong Feng.
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+"""
+The evaluation server module.
+
+An EvaluationServer loads a reference corpus and builds its index once, then scores the
+hypothesis sets posted to it over HTTP, so that repeated evaluations (e.g., every few hundred
+steps of a training job) pay neither the startup nor the loading of the references again.
+The API is:
+
+  - ``POST /score`` with ``{"hypothesis_sets": [{"query_id": 0, "hypotheses": [...]}, ...]}``.
+    A hypothesis set names its query by ``"query_id"`` (its position in the corpus) or by
+    ``"query"`` (its text). A hypothesis is a string of space-separated tokens or a list of
+    tokens, and a hypothesis set has at least one. The response is
+    ``{"scores": [{"mds": ..., "pds": ..., "max_bleu": ...}, ...], "seconds": ...}``, with
+    the time spent by the server on the request.
+  - ``GET /stats``: the latency of the requests and the sizes of the batches.
+  - ``GET /health``.
+
+The requests are handled concurrently and micro-batched by a MicroBatcher.
+EvaluationClient is a client of the server. Run ``python -m lsdscc.server --help``
+to start one from the command line.
+"""
+import argparse
+import collections
+import concurrent.futures
+import http.client
+import http.server
+import json
+import logging
+import math
+import queue
+import threading
+import time
+import urllib.parse
+
+import lsdscc.align as _align
+from lsdscc.index import ReferenceIndex
+from lsdscc.metrics import (
+    LSDSCCScore,
+    ScoreAccumulator,
+    _aggregate,
+    _best_scores,
+    _score_matrix,
+    compute_result_on_hypothesis_set,
+)
+
+__all__ = [
+    "LatencyStats",
+    "MicroBatcher",
+    "EvaluationServer",
+    "EvaluationClient",
+]
+
+_logger = logging.getLogger(__name__)
+
+DEFAULT_MAX_BATCH_SIZE = 64
+DEFAULT_MAX_WAIT = 0.002
+
+
+def _percentile(sorted_values, p):
+    """
+    Return the p-th percentile of a sorted list by the nearest-rank method.
+    """
+    if not sorted_values:
+        return None
+    return sorted_values[max(math.ceil(p / 100 * len(sorted_values)) - 1, 0)]
+
+
+class LatencyStats:
+    """
+    The latency of requests. It is thread-safe.
+
+    The mean and the max are over all the requests and the percentiles are over the most
+    recent ones.
+    """
+
+    def __init__(self, window=10000):
+        self._lock = threading.Lock()
+        self._recent = collections.deque(maxlen=window)
+        self._count = 0
+        self._total = 0.0
+        self._max = 0.0
+
+    def __len__(self):
+        return self._count
+
+    def add(self, seconds):
+        """
+        Record the latency of a request.
+
+        :param seconds: the latency in seconds.
+        """
+        with self._lock:
+            self._recent.append(seconds)
+            self._count += 1
+            self._total += seconds
+            self._max = max(self._max, seconds)
+
+    def summary(self):
+        """
+        :return: dict with the count, mean, max, p50, p90 and p99 in seconds.
+        The statistics are None if there is no request.
+        """
+        with self._lock:
+            recent = sorted(self._recent)
+            count = self._count
+            summary = {
+                "count": count,
+                "mean": self._total / count if count else None,
+                "max": self._max if count else None,
+            }
+        for p in (50, 90, 99):
+            summary["p%d" % p] = _percentile(recent, p)
+        return summary
+
+
+class MicroBatcher:
+    """
+    Score hypothesis sets on a background thread, in batches.
+
+    A batch is made of the hypothesis sets submitted within ``max_wait`` seconds after the
+    first one, up to ``max_batch_size`` of them. If the aligner has ``score_matrices`` (see
+    ``lsdscc.align``), as BleuAligner does, the whole batch is scored by a single call of it,
+    whatever the queries of the hypothesis sets are. Otherwise the hypothesis sets against
+    the same query are concatenated and scored by a single call per query. The scores are
+    the same as those of ``compute_score_on_hypothesis_set``.
+    """
+
+    def __init__(
+        self,
+        index,
+        aligner=None,
+        max_batch_size=DEFAULT_MAX_BATCH_SIZE,
+        max_wait=DEFAULT_MAX_WAIT,
+    ):
+        """
+        :param index: a list of ReferenceIndex, one for each query.
+        :param aligner: the aligner. Default to BleuAligner.
+        :param max_batch_size: the max number of hypothesis sets in a batch.
+        :param max_wait: the max number of seconds to wait for a batch to fill up.
+        """
+        if aligner is None:
+            aligner = _align.BleuAligner()
+        self.index = index
+        self.aligner = aligner
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait
+        self._lock = threading.Lock()
+        self._batch_sizes = collections.Counter()
+        self._n_calls = 0
+        self._queue = queue.Queue()
+        self._thread = threading.Thread(
+            target=self._run, name="lsdscc-batcher", daemon=True
+        )
+        self._thread.start()
+
+    def submit(self, query_id, hypothesis_set):
+        """
+        Queue a hypothesis set to be scored.
+
+        :param query_id: the position of the query of the hypothesis set.
+        :param hypothesis_set: a list of hypotheses, each of which is a list of tokens.
+        :return: concurrent.futures.Future of LSDSCCScore.
+        """
+        if not 0 <= query_id < len(self.index):
+            raise ValueError("query_id %d is out of range" % query_id)
+        future = concurrent.futures.Future()
+        self._queue.put((query_id, hypothesis_set, future))
+        return future
+
+    def close(self):
+        """
+        Score what is queued and stop the background thread.
+        """
+        self._queue.put(None)
+        self._thread.join()
+
+    def stats(self):
+        """
+        :return: dict with the number of batches, the mean and max number of hypothesis sets
+        in a batch and the number of calls of the aligner.
+        """
+        with self._lock:
+            n_batches = sum(self._batch_sizes.values())
+            n_sets = sum(size * n for size, n in self._batch_sizes.items())
+            return {
+                "count": n_batches,
+                "mean_size": n_sets / n_batches if n_batches else None,
+                "max_size": max(self._batch_sizes, default=None),
+                "aligner_calls": self._n_calls,
+            }
+
+    def _next_batch(self):
+        item = self._queue.get()
+        if item is None:
+            return None
+        batch = [item]
+        deadline = time.monotonic() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            try:
+                item = self._queue.get(timeout=max(deadline - time.monotonic(), 0))
+            except queue.Empty:
+                break
+            if item is None:
+                # Stop after this batch.
+                self._queue.put(None)
+                break
+            batch.append(item)
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._next_batch()
+            if batch is None:
+                return
+            items = [item for item in batch if item[2].set_running_or_notify_cancel()]
+            if hasattr(self.aligner, "score_matrices"):
+                n_calls = self._score_together(items)
+            else:
+                n_calls = self._score_by_query(items)
+            with self._lock:
+                self._batch_sizes[len(batch)] += 1
+                self._n_calls += n_calls
+
+    def _score_together(self, items):
+        """
+        Score the hypothesis sets of a batch by a single call of ``aligner.score_matrices``.
+
+        :return: the number of calls of the aligner.
+        """
+        if not items:
+            return 0
+        prepare = getattr(self.aligner, "prepare", None)
+        try:
+            matrices = self.aligner.score_matrices(
+                [hypothesis_set for _, hypothesis_set, _ in items],
+                [
+                    prepare(self.index[query_id]) if prepare else self.index[query_id]
+                    for query_id, _, _ in items
+                ],
+            )
+        except Exception:
+            # Score the queries apart, so that a bad hypothesis set fails alone.
+            _logger.debug("cannot score a batch together", exc_info=True)
+            return 1 + self._score_by_query(items)
+        for (query_id, _, future), matrix in zip(items, matrices):
+            refs_index = self.index[query_id]
+            aligned_groups, max_scores = _best_scores(matrix)
+            future.set_result(
+                _aggregate(
+                    aligned_groups,
+                    max_scores,
+                    refs_index.group_sizes,
+                    refs_index.n_references,
+                )
+            )
+        return 1
+
+    def _score_by_query(self, items):
+        """
+        Score the hypothesis sets of a batch by a call of the aligner per query.
+
+        :return: the number of calls of the aligner.
+        """
+        by_query = collections.defaultdict(list)
+        for query_id, hypothesis_set, future in items:
+            by_query[query_id].append((hypothesis_set, future))
+        for query_id, query_items in by_query.items():
+            self._score(self.index[query_id], query_items)
+        return len(by_query)
+
+    def _score(self, refs_index, items):
+        try:
+            hypotheses = [h for hypothesis_set, _ in items for h in hypothesis_set]
+            result = compute_result_on_hypothesis_set(
+                hypotheses, refs_index.reference_set, self.aligner, refs_index
+            )
+        except Exception as e:
+            for _, future in items:
+                future.set_exception(e)
+            return
+        start = 0
+        for hypothesis_set, future in items:
+            end = start + len(hypothesis_set)
+            future.set_result(
+                _aggregate(
+                    result.aligned_groups[start:end],
+                    result.max_scores[start:end],
+                    refs_index.group_sizes,
+                    refs_index.n_references,
+                )
+            )
+            start = end
+
+
+def _parse_score_request(request):
+    """
+    Parse the body of ``POST /score``.
+
+    :return: (the keys of the queries, the hypothesis sets).
+    """
+    if not isinstance(request, dict) or not isinstance(
+        request.get("hypothesis_sets"), list
+    ):
+        raise ValueError('expect {"hypothesis_sets": [...]}')
+    keys = []
+    hypothesis_sets = []
+    for item in request["hypothesis_sets"]:
+        if not isinstance(item, dict) or not isinstance(item.get("hypotheses"), list):
+            raise ValueError('expect {"query_id": ..., "hypotheses": [...]}')
+        if "query_id" in item:
+            keys.append(item["query_id"])
+        elif "query" in item:
+            keys.append(item["query"])
+        else:
+            raise ValueError("a hypothesis set needs a query_id or a query")
+        # The max_bleu of an empty set is nan, which is not valid json.
+        if not item["hypotheses"]:
+            raise ValueError("a hypothesis set needs at least one hypothesis")
+        hypothesis_sets.append(
+            [h.split() if isinstance(h, str) else list(h) for h in item["hypotheses"]]
+        )
+    return keys, hypothesis_sets
+
+
+class _RequestHandler(http.server.BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    # The headers and the body are written separately. Without TCP_NODELAY, the delayed
+    # ACK of the client adds about 40ms to every response on a kept-alive connection.
+    disable_nagle_algorithm = True
+
+    def do_GET(self):
+        server = self.server.evaluation_server
+        if self.path == "/stats":
+            self._reply(200, server.stats())
+        elif self.path == "/health":
+            self._reply(200, {"status": "ok", "n_queries": len(server.index)})
+        else:
+            self._reply(404, {"error": "no such path %s" % self.path})
+
+    def do_POST(self):
+        start = time.perf_counter()
+        server = self.server.evaluation_server
+        body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        if self.path != "/score":
+            self._reply(404, {"error": "no such path %s" % self.path})
+            return
+        try:
+            keys, hypothesis_sets = _parse_score_request(json.loads(body))
+            scores = server.score(hypothesis_sets, keys)
+        except (ValueError, TypeError) as e:
+            self._reply(400, {"error": str(e)})
+            return
+        except Exception as e:
+            _logger.exception("cannot score a request")
+            self._reply(500, {"error": "%s: %s" % (type(e).__name__, e)})
+            return
+        seconds = time.perf_counter() - start
+        server.latency.add(seconds)
+        self._reply(
+            200, {"scores": [score._asdict() for score in scores], "seconds": seconds}
+        )
+
+    def _reply(self, status, payload):
+        data = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        _logger.debug("%s " + format, self.address_string(), *args)
+
+
+class EvaluationServer:
+    """
+    A local HTTP server that scores hypothesis sets against a reference corpus that is
+    loaded and indexed once. See the module documentation for the API.
+
+    Use it as a context manager to serve on a background thread, or call ``serve_forever``.
+    """
+
+    def __init__(
+        self,
+        reference_corpus,
+        aligner=None,
+        host="127.0.0.1",
+        port=0,
+        max_batch_size=DEFAULT_MAX_BATCH_SIZE,
+        max_wait=DEFAULT_MAX_WAIT,
+        warm=True,
+    ):
+        """
+        :param reference_corpus: a list of reference_set.
+        :param aligner: the aligner. Default to BleuAligner.
+        :param host: the host to bind. Default to the loopback interface.
+        :param port: the port to bind. Default to any free port (see ``url``).
+        :param max_batch_size: see MicroBatcher.
+        :param max_wait: see MicroBatcher.
+        :param warm: whether to build the tables of the index up front instead of on the
+        first request of each query.
+        """
+        if aligner is None:
+            aligner = _align.BleuAligner()
+        self.index = ReferenceIndex.from_corpus(reference_corpus)
+        if warm:
+            # Scoring no hypothesis builds the tables the aligner needs.
+            for refs_index in self.index:
+                _score_matrix([], refs_index.reference_set, aligner, refs_index)
+        self._query_ids = {}
+        for i, refs_index in enumerate(self.index):
+            query = getattr(refs_index.reference_set, "query", None)
+            if query is not None:
+                self._query_ids.setdefault(query, i)
+        self.latency = LatencyStats()
+        self.batcher = MicroBatcher(self.index, aligner, max_batch_size, max_wait)
+        self._httpd = http.server.ThreadingHTTPServer((host, port), _RequestHandler)
+        self._httpd.daemon_threads = True
+        self._httpd.evaluation_server = self
+        self._thread = None
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.shutdown()
+
+    @property
+    def url(self):
+        """
+        Return the url of the server, e.g., ``http://127.0.0.1:8000``.
+        """
+        host, port = self._httpd.server_address[:2]
+        return "http://%s:%d" % (host, port)
+
+    def query_id(self, key):
+        """
+        Return the position of a query.
+
+        :param key: the position of the query or its text.
+        :return: int.
+        """
+        if isinstance(key, str):
+            try:
+                return self._query_ids[key]
+            except KeyError:
+                raise ValueError("unknown query %r" % key)
+        # A json true would otherwise be query 1.
+        if (
+            not isinstance(key, int)
+            or isinstance(key, bool)
+            or not 0 <= key < len(self.index)
+        ):
+            raise ValueError("query_id %r is out of range" % (key,))
+        return key
+
+    def score(self, hypothesis_sets, keys):
+        """
+        Score hypothesis sets through the batcher, as the requests do.
+
+        :param hypothesis_sets: a list of hypothesis sets.
+        :param keys: the query of each hypothesis set, by position or by text.
+        :return: List[LSDSCCScore]
+        """
+        query_ids = [self.query_id(key) for key in keys]
+        futures = [
+            self.batcher.submit(query_id, hypothesis_set)
+            for query_id, hypothesis_set in zip(query_ids, hypothesis_sets)
+        ]
+        return [future.result() for future in futures]
+
+    def stats(self):
+        """
+        :return: dict with the latency of the requests (see LatencyStats) and the batches
+        (see ``MicroBatcher.stats``).
+        """
+        return {
+            "n_queries": len(self.index),
+            "requests": self.latency.summary(),
+            "batches": self.batcher.stats(),
+        }
+
+    def serve_forever(self):
+        """
+        Serve until ``shutdown`` is called from another thread or a KeyboardInterrupt.
+        """
+        _logger.info("serving %d queries at %s", len(self.index), self.url)
+        try:
+            self._httpd.serve_forever()
+        finally:
+            self._httpd.server_close()
+            self.batcher.close()
+
+    def start(self):
+        """
+        Serve on a background thread.
+        """
+        self._thread = threading.Thread(
+            target=self.serve_forever, name="lsdscc-server", daemon=True
+        )
+        self._thread.start()
+
+    def shutdown(self):
+        """
+        Stop serving and release the socket.
+        """
+        if self._thread is not None:
+            self._httpd.shutdown()
+            self._thread.join()
+            self._thread = None
+        else:
+            self._httpd.server_close()
+            self.batcher.close()
+
+
+class EvaluationClient:
+    """
+    A client of an EvaluationServer.
+
+    It keeps a connection open, so a client must not be shared by threads.
+    """
+
+    def __init__(self, url, timeout=None):
+        """
+        :param url: the url of the server.
+        :param timeout: the timeout of the requests in seconds.
+        """
+        parts = urllib.parse.urlsplit(url)
+        self._connection = http.client.HTTPConnection(
+            parts.hostname, parts.port, timeout=timeout
+        )
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        self._connection.close()
+
+    def _request(self, method, path, payload=None):
+        body = json.dumps(payload).encode() if payload is not None else None
+        headers = {"Content-Type": "application/json"} if body is not None else {}
+        self._connection.request(method, path, body, headers)
+        response = self._connection.getresponse()
+        result = json.loads(response.read())
+        if response.status == 400:
+            raise ValueError(result["error"])
+        if response.status != 200:
+            raise RuntimeError("%d %s" % (response.status, result.get("error")))
+        return result
+
+    def score(self, hypothesis_sets, keys=None):
+        """
+        Score hypothesis sets.
+
+        :param hypothesis_sets: a list of hypothesis sets.
+        :param keys: the query of each hypothesis set, by position or by text.
+        Default to the positions 0, 1, 2...
+        :return: List[LSDSCCScore]
+        """
+        if keys is None:
+            keys = range(len(hypothesis_sets))
+        request = {
+            "hypothesis_sets": [
+                {
+                    "query" if isinstance(key, str) else "query_id": key,
+                    "hypotheses": [list(h) for h in hypothesis_set],
+                }
+                for key, hypothesis_set in zip(keys, hypothesis_sets)
+            ]
+        }
+        result = self._request("POST", "/score", request)
+        return [LSDSCCScore(**score) for score in result["scores"]]
+
+    def score_corpus(self, hypothesis_corpus, batch_size=DEFAULT_MAX_BATCH_SIZE):
+        """
+        Score a hypothesis corpus against the whole reference corpus of the server.
+        The result is the same as ``compute_score_on_corpus``.
+
+        :param hypothesis_corpus: a list of hypothesis sets, one for each query.
+        :param batch_size: the number of hypothesis sets per request.
+        :return: LSDSCCScore.
+        """
+        accumulator = ScoreAccumulator()
+        for start in range(0, len(hypothesis_corpus), batch_size):
+            chunk = hypothesis_corpus[start : start + batch_size]
+            for score in self.score(chunk, range(start, start + len(chunk))):
+                accumulator.add(score)
+        return accumulator.mean()
+
+    def stats(self):
+        """
+        :return: the statistics of the server. See ``EvaluationServer.stats``.
+        """
+        return self._request("GET", "/stats")
+
+    def health(self):
+        """
+        :return: dict with the status and the number of queries of the server.
+        """
+        return self._request("GET", "/health")
+
+
+if __name__ == "__main__":
+    from lsdscc.compiled import load_cached_reference_corpus
+    from lsdscc.ds import ReferenceSet
+
+    parser = argparse.ArgumentParser(
+        prog="python -m lsdscc.server",
+        description="serve the LSDSCC metrics over HTTP with the references loaded once",
+    )
+    parser.add_argument(
+        "--reference_file", "-r", help="reference corpus in json format"
+    )
+    parser.add_argument("--host", default="127.0.0.1", help="default to 127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000, help="default to 8000")
+    parser.add_argument("--cache_dir", help="where to cache compiled reference corpora")
+    parser.add_argument(
+        "--no_cache", action="store_true", help="parse the json reference corpus"
+    )
+    parser.add_argument(
+        "--max_batch_size",
+        type=int,
+        default=DEFAULT_MAX_BATCH_SIZE,
+        help="max hypothesis sets per batch. default to %d" % DEFAULT_MAX_BATCH_SIZE,
+    )
+    parser.add_argument(
+        "--max_wait",
+        type=float,
+        default=DEFAULT_MAX_WAIT,
+        help="max seconds to wait for a batch to fill. default to %g"
+        % DEFAULT_MAX_WAIT,
+    )
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+    if args.no_cache:
+        reference_corpus = ReferenceSet.load_json_corpus(args.reference_file)
+    else:
+        reference_corpus = load_cached_reference_corpus(
+            args.reference_file, args.cache_dir
+        )
+    server = EvaluationServer(
+        reference_corpus,
+        host=args.host,
+        port=args.port,
+        max_batch_size=args.max_batch_size,
+        max_wait=args.max_wait,
+    )
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,241 @@
+# MIT License
+#
+# Copyright (c) 2019 Cong Feng.
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+"""
+The sharding module: score a deterministic slice of a corpus and merge the partial
+aggregates of all the slices into the score of the whole corpus.
+
+Shard i of N covers the contiguous block of queries ``shard_range(n_queries, i, N)``.
+Its partial aggregate is a ScoreAccumulator per system that keeps the score of each query,
+saved as a small json file, so ``merge_partials`` gives exactly the score of a single run.
+"""
+import collections
+import itertools
+import json
+import sys
+
+from lsdscc.metrics import ScoreAccumulator, compute_query_scores_on_systems
+
+__all__ = [
+    "Partial",
+    "parse_shard",
+    "shard_range",
+    "score_shard",
+    "save_partial",
+    "load_partial",
+    "merge_partials",
+]
+
+PARTIAL_FORMAT = "lsdscc-partial"
+PARTIAL_VERSION = 1
+
+Partial = collections.namedtuple(
+    "Partial", ["shard", "n_shards", "n_queries", "reference", "accumulators"]
+)
+Partial.__doc__ = """
+The partial aggregate of a shard: its index, the number of shards, the number of queries
+of the corpus, an optional fingerprint of the reference corpus and a dict mapping the name
+of each system to its ScoreAccumulator.
+"""
+
+
+def parse_shard(text):
+    """
+    Parse a shard given as "i/N", where i counts from 0.
+
+    :param text: str.
+    :return: (i, N).
+    """
+    try:
+        shard, n_shards = map(int, text.split("/"))
+    except ValueError:
+        raise ValueError("expect a shard as i/N, not %r" % text)
+    if not 0 <= shard < n_shards:
+        raise ValueError("shard %d is not in 0..%d" % (shard, n_shards - 1))
+    return shard, n_shards
+
+
+def shard_range(n_queries, shard, n_shards):
+    """
+    Return the range of the queries of a shard. The shards are contiguous, in order and
+    differ in size by at most one.
+
+    :param n_queries: the number of queries of the corpus.
+    :param shard: the index of the shard.
+    :param n_shards: the number of shards.
+    :return: range.
+    """
+    return range(shard * n_queries // n_shards, (shard + 1) * n_queries // n_shards)
+
+
+def _take(corpus, queries):
+    if hasattr(corpus, "__getitem__") and hasattr(corpus, "__len__"):
+        return corpus[queries.start : queries.stop]
+    return itertools.islice(corpus, queries.start, queries.stop)
+
+
+def score_shard(
+    hypothesis_corpora,
+    reference_corpus,
+    shard,
+    n_shards,
+    n_queries=None,
+    aligner=None,
+    n_jobs=None,
+    executor=None,
+    cache=None,
+    prune=False,
+):
+    """
+    Score the queries of a shard for each system.
+
+    :param hypothesis_corpora: a dict mapping the name of each system to its hypothesis
+    corpus. A corpus that can be sliced, such as ``HypothesisSet.open_corpus`` gives, is
+    sliced instead of read up to the shard.
+    :param reference_corpus: a list of reference_set, or any iterable if n_queries is given.
+    :param shard: the index of the shard.
+    :param n_shards: the number of shards.
+    :param n_queries: the number of queries. Default to the length of reference_corpus.
+    :param aligner: a callable to compute the semantic similarity of a hypothesis
+    and a list of references.
+    :param n_jobs: the number of worker processes. See ``compute_score_on_corpus``.
+    :param executor: an optional ``concurrent.futures.Executor`` to run the workers on.
+    :param cache: an optional ScoreCache to look up the scores of the hypotheses.
+    :param prune: whether to prune the groups that cannot be the best one of a hypothesis.
+    :return: Dict[str, ScoreAccumulator], which keep the score of each query.
+    """
+    if n_queries is None:
+        n_queries = len(reference_corpus)
+    for name, corpus in hypothesis_corpora.items():
+        if hasattr(corpus, "__len__") and len(corpus) != n_queries:
+            raise ValueError(
+                "%s has %d hypothesis sets, expect %d" % (name, len(corpus), n_queries)
+            )
+    queries = shard_range(n_queries, shard, n_shards)
+    query_scores = compute_query_scores_on_systems(
+        {name: _take(corpus, queries) for name, corpus in hypothesis_corpora.items()},
+        list(_take(reference_corpus, queries)),
+        aligner,
+        n_jobs=n_jobs,
+        executor=executor,
+        cache=cache,
+        prune=prune,
+    )
+    accumulators = {}
+    for name, scores in query_scores.items():
+        accumulator = ScoreAccumulator(keep_scores=True, start=queries.start)
+        for score in scores:
+            accumulator.add(score)
+        accumulators[name] = accumulator
+    return accumulators
+
+
+def save_partial(filename, partial):
+    """
+    Save the partial aggregate of a shard in json.
+
+    :param filename: the output file. "-" means the standard output.
+    :param partial: Partial.
+    """
+    data = {
+        "format": PARTIAL_FORMAT,
+        "version": PARTIAL_VERSION,
+        "shard": partial.shard,
+        "n_shards": partial.n_shards,
+        "n_queries": partial.n_queries,
+        "reference": partial.reference,
+        "systems": {
+            name: accumulator.to_dict()
+            for name, accumulator in partial.accumulators.items()
+        },
+    }
+    if str(filename) == "-":
+        json.dump(data, sys.stdout)
+        print()
+        return
+    with open(filename, "w") as f:
+        json.dump(data, f)
+
+
+def load_partial(filename):
+    """
+    Load the partial aggregate of a shard saved by ``save_partial``.
+
+    :param filename: the file.
+    :return: Partial.
+    """
+    with open(filename) as f:
+        data = json.load(f)
+    if data.get("format") != PARTIAL_FORMAT or data.get("version") != PARTIAL_VERSION:
+        raise ValueError("%s is not a partial aggregate of a known version" % filename)
+    return Partial(
+        shard=data["shard"],
+        n_shards=data["n_shards"],
+        n_queries=data["n_queries"],
+        reference=data["reference"],
+        accumulators={
+            name: ScoreAccumulator.from_dict(state)
+            for name, state in data["systems"].items()
+        },
+    )
+
+
+def merge_partials(partials):
+    """
+    Merge the partial aggregates of all the shards of a corpus, given in any order.
+
+    The shards must agree on the number of shards and queries, the reference corpus and
+    the systems, and every shard must be given once.
+
+    :param partials: a list of Partial.
+    :return: Dict[str, ScoreAccumulator], whose means are the scores of the systems.
+    """
+    if not partials:
+        raise ValueError("no partial aggregate to merge")
+    first = partials[0]
+    for partial in partials:
+        key = (partial.n_shards, partial.n_queries, partial.reference)
+        if key != (first.n_shards, first.n_queries, first.reference):
+            raise ValueError("the partial aggregates are from different runs")
+        if list(partial.accumulators) != list(first.accumulators):
+            raise ValueError("the partial aggregates have different systems")
+    shards = sorted(partial.shard for partial in partials)
+    if shards != list(range(first.n_shards)):
+        missing = sorted(set(range(first.n_shards)) - set(shards))
+        if missing:
+            raise ValueError("missing shards: %s" % ", ".join(map(str, missing)))
+        raise ValueError("a shard is given more than once")
+
+    merged = {}
+    for partial in sorted(partials, key=lambda p: p.shard):
+        for name, accumulator in partial.accumulators.items():
+            if name not in merged:
+                merged[name] = ScoreAccumulator(
+                    keep_scores=accumulator.scores is not None
+                )
+            merged[name].merge(accumulator)
+    for name, accumulator in merged.items():
+        if len(accumulator) != first.n_queries:
+            raise ValueError(
+                "%s has %d queries, expect %d"
+                % (name, len(accumulator), first.n_queries)
+            )
+    return merged
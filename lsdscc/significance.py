@@ -0,0 +1,211 @@
+# MIT License
+#
+# Copyright (c) 2019 Cong Feng.
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+"""
+The significance module: bootstrap confidence intervals of the metrics and paired tests of
+the difference between two systems.
+
+The corpus metrics are means over the queries, so every resample is computed from the
+per-query scores alone (see ``compute_query_scores_on_systems`` or
+``iter_scores_on_corpus``), which are computed once. The resamples are drawn as a matrix of
+query indices (or signs) and reduced with numpy, in blocks to bound the memory.
+"""
+import collections
+
+import numpy as np
+
+from lsdscc.metrics import LSDSCCScore, ScoreAccumulator
+
+__all__ = [
+    "ConfidenceInterval",
+    "SignificanceResult",
+    "bootstrap_confidence_interval",
+    "paired_bootstrap_test",
+    "approximate_randomization_test",
+    "SIGNIFICANCE_TESTS",
+]
+
+DEFAULT_N_RESAMPLES = 1000
+
+# The number of values in a block of resamples, i.e., n_resamples * n_queries.
+_BLOCK_SIZE = 1 << 22
+
+ConfidenceInterval = collections.namedtuple(
+    "ConfidenceInterval", ["estimate", "low", "high"]
+)
+ConfidenceInterval.__doc__ = """
+A bootstrap confidence interval of the three metrics, each field being an LSDSCCScore.
+The estimate is the score of the corpus.
+"""
+
+SignificanceResult = collections.namedtuple(
+    "SignificanceResult", ["difference", "p_value"]
+)
+SignificanceResult.__doc__ = """
+The result of a paired test of two systems, each field being an LSDSCCScore: the
+difference of the scores of the corpus (the second system minus the first one) and the
+two-sided p-value of each metric.
+"""
+
+
+def _as_array(scores):
+    """
+    Turn a list of per-query LSDSCCScores into an array of shape (n_queries, 3).
+    """
+    scores = np.asarray(scores, dtype=np.float64)
+    if scores.ndim != 2 or scores.shape[1] != len(LSDSCCScore._fields):
+        raise ValueError("expect a list of LSDSCCScore, one for each query")
+    if not len(scores):
+        raise ValueError("expect the score of at least one query")
+    return scores
+
+
+def _corpus_score(scores):
+    # The same summation as compute_score_on_corpus.
+    accumulator = ScoreAccumulator()
+    for score in scores.tolist():
+        accumulator.add(score)
+    return accumulator.mean()
+
+
+def _blocks(n_resamples, n_queries):
+    """
+    Split the resamples into blocks of at most ``_BLOCK_SIZE`` values.
+    """
+    block = max(1, _BLOCK_SIZE // n_queries)
+    for start in range(0, n_resamples, block):
+        yield min(block, n_resamples - start)
+
+
+def _bootstrap_means(values, n_resamples, rng):
+    """
+    Compute the means of the columns of values over bootstrap resamples of the rows.
+    Each resample is turned into the number of times each row is drawn, so the means of a
+    block of resamples are a single matrix product.
+
+    :param values: array of shape (n_queries, n_columns).
+    :return: array of shape (n_resamples, n_columns).
+    """
+    n_queries = len(values)
+    means = []
+    for size in _blocks(n_resamples, n_queries):
+        indices = rng.integers(0, n_queries, size=(size, n_queries))
+        indices += np.arange(size)[:, None] * n_queries
+        counts = np.bincount(indices.ravel(), minlength=size * n_queries)
+        counts = counts.reshape(size, n_queries).astype(np.float64)
+        means.append(counts @ values / n_queries)
+    return np.concatenate(means)
+
+
+def _two_sided_p_value(statistics, observed):
+    """
+    The p-value of observed under the null distribution given by the resampled statistics,
+    with the add-one correction so that it is never 0.
+    """
+    extreme = np.abs(statistics) >= np.abs(observed)
+    return LSDSCCScore(*((extreme.sum(axis=0) + 1) / (len(statistics) + 1)).tolist())
+
+
+def bootstrap_confidence_interval(
+    scores, n_resamples=DEFAULT_N_RESAMPLES, confidence=0.95, seed=0
+):
+    """
+    Compute the bootstrap percentile confidence interval of the three metrics of a corpus.
+
+    :param scores: a list of LSDSCCScore, one for each query.
+    :param n_resamples: the number of bootstrap resamples of the queries.
+    :param confidence: the confidence level of the interval.
+    :param seed: the seed of the resampling. The same seed gives the same interval.
+    :return: ConfidenceInterval.
+    """
+    if not 0 < confidence < 1:
+        raise ValueError("confidence must be between 0 and 1")
+    scores = _as_array(scores)
+    rng = np.random.default_rng(seed)
+    means = _bootstrap_means(scores, n_resamples, rng)
+    alpha = (1 - confidence) / 2
+    low, high = np.quantile(means, [alpha, 1 - alpha], axis=0).tolist()
+    return ConfidenceInterval(
+        _corpus_score(scores), LSDSCCScore(*low), LSDSCCScore(*high)
+    )
+
+
+def _paired_differences(scores_a, scores_b):
+    scores_a = _as_array(scores_a)
+    scores_b = _as_array(scores_b)
+    if scores_a.shape != scores_b.shape:
+        raise ValueError("the systems must be scored on the same queries")
+    observed = np.subtract(_corpus_score(scores_b), _corpus_score(scores_a))
+    return scores_b - scores_a, observed
+
+
+def paired_bootstrap_test(scores_a, scores_b, n_resamples=DEFAULT_N_RESAMPLES, seed=0):
+    """
+    Test whether the scores of two systems on the same queries differ, by the paired
+    bootstrap: the queries are resampled and the differences of the resamples, centred on
+    the observed difference, give the null distribution.
+
+    :param scores_a: a list of LSDSCCScore of the first system, one for each query.
+    :param scores_b: a list of LSDSCCScore of the second system, on the same queries.
+    :param n_resamples: the number of bootstrap resamples of the queries.
+    :param seed: the seed of the resampling.
+    :return: SignificanceResult.
+    """
+    differences, observed = _paired_differences(scores_a, scores_b)
+    rng = np.random.default_rng(seed)
+    means = _bootstrap_means(differences, n_resamples, rng)
+    return SignificanceResult(
+        LSDSCCScore(*observed.tolist()), _two_sided_p_value(means - observed, observed)
+    )
+
+
+def approximate_randomization_test(
+    scores_a, scores_b, n_resamples=DEFAULT_N_RESAMPLES, seed=0
+):
+    """
+    Test whether the scores of two systems on the same queries differ, by approximate
+    randomization: the scores of the two systems on each query are swapped at random,
+    which flips the sign of their difference, to give the null distribution.
+
+    :param scores_a: a list of LSDSCCScore of the first system, one for each query.
+    :param scores_b: a list of LSDSCCScore of the second system, on the same queries.
+    :param n_resamples: the number of random permutations.
+    :param seed: the seed of the permutations.
+    :return: SignificanceResult.
+    """
+    differences, observed = _paired_differences(scores_a, scores_b)
+    rng = np.random.default_rng(seed)
+    n_queries = len(differences)
+    statistics = []
+    for size in _blocks(n_resamples, n_queries):
+        signs = rng.integers(0, 2, size=(size, n_queries)) * 2.0 - 1.0
+        statistics.append(signs @ differences / n_queries)
+    statistics = np.concatenate(statistics)
+    return SignificanceResult(
+        LSDSCCScore(*observed.tolist()), _two_sided_p_value(statistics, observed)
+    )
+
+
+# The paired tests, by name.
+SIGNIFICANCE_TESTS = {
+    "bootstrap": paired_bootstrap_test,
+    "randomization": approximate_randomization_test,
+}
@@ -0,0 +1,239 @@
+# MIT License
+#
+# Copyright (c) 2019 Cong Feng.
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+"""
+The module to evaluate many systems against one reference corpus.
+
+Each system is given by a hypothesis file. The results are rendered as a table with one row
+per system, in text, json or csv, optionally with the confidence intervals of the scores and
+the p-values of the tests against a baseline system (see ``lsdscc.significance``).
+"""
+import csv
+import glob
+import io
+import json
+
+from lsdscc.ds import HypothesisSet
+from lsdscc.metrics import compute_query_scores_on_systems, compute_score_on_systems
+
+__all__ = [
+    "expand_hypothesis_files",
+    "compute_score_on_files",
+    "compute_query_scores_on_files",
+    "format_score_table",
+    "TABLE_FORMATS",
+]
+
+TABLE_FORMATS = ("text", "json", "csv")
+
+# The headers of the metrics in the text table, as printed for a single system.
+_TEXT_HEADERS = {"max_bleu": "MaxBLEU", "mds": "MDS", "pds": "PDS"}
+_COLUMNS = ("max_bleu", "mds", "pds")
+
+
+def expand_hypothesis_files(patterns):
+    """
+    Expand the glob patterns among a list of hypothesis files.
+
+    A pattern is replaced by the files it matches in sorted order. Other names, including
+    "-" for the standard input, are kept as they are. A file given twice is kept once.
+
+    :param patterns: a list of filenames or glob patterns.
+    :return: List[str]
+    """
+    filenames = []
+    for pattern in patterns:
+        pattern = str(pattern)
+        if pattern != "-" and glob.has_magic(pattern):
+            matches = sorted(glob.glob(pattern))
+            if not matches:
+                raise ValueError("no hypothesis file matches %r" % pattern)
+            filenames.extend(matches)
+        else:
+            filenames.append(pattern)
+    filenames = list(dict.fromkeys(filenames))
+    if filenames.count("-") > 1:
+        raise ValueError("the standard input can only be read once")
+    return filenames
+
+
+def _load_files(hypothesis_files, eos, serial):
+    hypothesis_corpora = {}
+    for filename in expand_hypothesis_files(hypothesis_files):
+        if serial:
+            corpus = HypothesisSet.iter_corpus(filename, eos)
+        elif filename == "-":
+            corpus = HypothesisSet.load_corpus(filename, eos)
+        else:
+            # The workers read and tokenize their own queries from the mapped file.
+            corpus = HypothesisSet.open_corpus(filename, eos)
+        hypothesis_corpora[filename] = corpus
+    return hypothesis_corpora
+
+
+def compute_score_on_files(
+    hypothesis_files,
+    reference_corpus,
+    eos=None,
+    aligner=None,
+    n_jobs=None,
+    executor=None,
+    cache=None,
+    prune=False,
+):
+    """
+    Compute the three metrics of each hypothesis file against one reference corpus.
+
+    In the serial case the files are read in parallel, one query at a time. Otherwise they
+    are memory-mapped and the workers read the queries they score from the files.
+    See ``compute_score_on_systems``.
+
+    :param hypothesis_files: a list of filenames or glob patterns. "-" means the standard input.
+    :param reference_corpus: a list of reference_set, or any iterable in the serial case.
+    :param eos: the end-of-sentence indicator of the hypothesis files.
+    :param aligner: a callable to compute the semantic similarity of a hypothesis
+    and a list of references.
+    :param n_jobs: the number of worker processes. See ``compute_score_on_corpus``.
+    :param executor: an optional ``concurrent.futures.Executor`` to run the workers on.
+    :param cache: an optional ScoreCache to look up the scores of the hypotheses.
+    :param prune: whether to prune the groups that cannot be the best one of a hypothesis.
+    :return: Dict[str, LSDSCCScore], mapping each file to its score.
+    """
+    serial = n_jobs in (None, 1) and executor is None
+    return compute_score_on_systems(
+        _load_files(hypothesis_files, eos, serial),
+        reference_corpus,
+        aligner,
+        n_jobs=n_jobs,
+        executor=executor,
+        cache=cache,
+        prune=prune,
+    )
+
+
+def compute_query_scores_on_files(
+    hypothesis_files,
+    reference_corpus,
+    eos=None,
+    aligner=None,
+    n_jobs=None,
+    executor=None,
+    cache=None,
+    prune=False,
+):
+    """
+    Compute the three metrics of each query for each hypothesis file against one reference
+    corpus. The parameters are the same as ``compute_score_on_files``.
+
+    :return: Dict[str, List[LSDSCCScore]], mapping each file to the scores of its queries.
+    """
+    serial = n_jobs in (None, 1) and executor is None
+    return compute_query_scores_on_systems(
+        _load_files(hypothesis_files, eos, serial),
+        reference_corpus,
+        aligner,
+        n_jobs=n_jobs,
+        executor=executor,
+        cache=cache,
+        prune=prune,
+    )
+
+
+def _format_interval(score, interval, column):
+    cell = "%f" % getattr(score, column)
+    if interval is not None:
+        cell += " [%f, %f]" % (
+            getattr(interval.low, column),
+            getattr(interval.high, column),
+        )
+    return cell
+
+
+def format_score_table(scores, fmt="text", intervals=None, tests=None):
+    """
+    Render the scores of several systems as a table with one row per system.
+
+    :param scores: a dict mapping the name of each system to its LSDSCCScore.
+    :param fmt: one of ``TABLE_FORMATS``. The text table has the precision of the
+    output for a single system, json and csv have the full precision.
+    :param intervals: an optional dict mapping the name of each system to its
+    ConfidenceInterval, rendered as the bounds of each metric.
+    :param tests: an optional dict mapping the name of some systems to the SignificanceResult
+    of their test against a baseline, rendered as the p-value of each metric. The other
+    systems have no p-value.
+    :return: str, ending with a newline.
+    """
+    intervals = intervals or {}
+    tests = tests or {}
+    columns = []
+    for c in _COLUMNS:
+        columns.append(c)
+        if intervals:
+            columns.extend((c + "_low", c + "_high"))
+    if tests:
+        columns.extend(c + "_p" for c in _COLUMNS)
+
+    def values(name, score):
+        row = {c: getattr(score, c) for c in _COLUMNS}
+        if name in intervals:
+            for c in _COLUMNS:
+                row[c + "_low"] = getattr(intervals[name].low, c)
+                row[c + "_high"] = getattr(intervals[name].high, c)
+        if name in tests:
+            for c in _COLUMNS:
+                row[c + "_p"] = getattr(tests[name].p_value, c)
+        return [row.get(c) for c in columns]
+
+    if fmt == "json":
+        rows = [
+            dict(system=name, **dict(zip(columns, values(name, score))))
+            for name, score in scores.items()
+        ]
+        return json.dumps(rows, indent=2) + "\n"
+    if fmt == "csv":
+        with io.StringIO() as f:
+            writer = csv.writer(f, lineterminator="\n")
+            writer.writerow(["system"] + columns)
+            for name, score in scores.items():
+                writer.writerow([name] + values(name, score))
+            return f.getvalue()
+    if fmt != "text":
+        raise ValueError("unknown table format %r" % fmt)
+    rows = [["system"] + [_TEXT_HEADERS[c] for c in _COLUMNS]]
+    if tests:
+        rows[0].extend("p(%s)" % _TEXT_HEADERS[c] for c in _COLUMNS)
+    for name, score in scores.items():
+        row = [name]
+        row.extend(_format_interval(score, intervals.get(name), c) for c in _COLUMNS)
+        if tests:
+            test = tests.get(name)
+            row.extend(
+                "-" if test is None else "%f" % getattr(test.p_value, c)
+                for c in _COLUMNS
+            )
+        rows.append(row)
+    widths = [max(len(row[i]) for row in rows) for i in range(len(rows[0]))]
+    with io.StringIO() as f:
+        for row in rows:
+            cells = [row[0].ljust(widths[0])]
+            cells.extend(cell.rjust(width) for cell, width in zip(row[1:], widths[1:]))
+            print("  ".join(cells).rstrip(), file=f)
+        return f.getvalue()
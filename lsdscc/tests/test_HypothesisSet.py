@@ -41,3 +41,9 @@ class TestHypothesisSet(unittest.TestCase):
         self.assertEqual(len(hs), N_HYPOTHESES)
         print(hs)
         print(repr(hs))
+
+    def test_iter_corpus(self):
+        corpus = HypothesisSet.load_corpus(HYPOTHESIS_FILE)
+        _corpus = HypothesisSet.iter_corpus(HYPOTHESIS_FILE)
+        self.assertNotIsInstance(_corpus, list)
+        self.assertEqual([list(hs) for hs in corpus], [list(hs) for hs in _corpus])
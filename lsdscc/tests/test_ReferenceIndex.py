@@ -0,0 +1,64 @@
+# MIT License
+#
+# Copyright (c) 2019 Cong Feng.
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+import unittest
+from lsdscc.align import BleuAligner
+from lsdscc.ds import HypothesisSet, ReferenceSet
+from lsdscc.index import ReferenceIndex
+from lsdscc.metrics import compute_score_on_corpus
+from lsdscc.tests.data import HYPOTHESIS_FILE, REFERENCE_FILE, N_REFERENCES
+
+
+class TestReferenceIndex(unittest.TestCase):
+    def setUp(self):
+        self.hypothesis_corpus = HypothesisSet.load_corpus(HYPOTHESIS_FILE)
+        self.reference_corpus = ReferenceSet.load_json_corpus(REFERENCE_FILE)
+
+    def test_group_sizes(self):
+        index = ReferenceIndex(self.reference_corpus[0])
+        self.assertEqual(len(index), len(self.reference_corpus[0]))
+        self.assertEqual(index.n_references, N_REFERENCES)
+        self.assertEqual(sum(index.group_sizes), N_REFERENCES)
+
+    def test_merged_ngrams_cached(self):
+        index = ReferenceIndex(self.reference_corpus[0])
+        self.assertIs(index.merged_ngrams(), index.merged_ngrams(4))
+        self.assertIsNot(index.merged_ngrams(4), index.merged_ngrams(5))
+
+    def test_bit_identical(self):
+        reference_set = self.reference_corpus[0]
+        index = ReferenceIndex(reference_set)
+        for n in (None, 2, 5):
+            aligner = BleuAligner(n)
+            for h in self.hypothesis_corpus[0]:
+                expected = [aligner(h, refs) for refs in reference_set]
+                self.assertEqual(aligner.score_index(h, index), expected)
+
+    def test_reuse_across_calls(self):
+        index = ReferenceIndex.from_corpus(self.reference_corpus)
+        score = compute_score_on_corpus(
+            self.hypothesis_corpus, self.reference_corpus, index=index
+        )
+        _score = compute_score_on_corpus(
+            self.hypothesis_corpus, self.reference_corpus, index=index
+        )
+        self.assertEqual(score, _score)
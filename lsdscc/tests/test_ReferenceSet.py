@@ -20,9 +20,11 @@
 # OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
 # SOFTWARE.
 
+import io
+import json
 import unittest
 from lsdscc.tests.data import REFERENCE_FILE, N_REF_SETS, N_REFERENCES
-from lsdscc.ds import ReferenceSet
+from lsdscc.ds import ReferenceSet, _iter_json_items
 
 BUILTIN_N_REF_SETS = 299
 
@@ -73,3 +75,21 @@ class TestReferenceSet(unittest.TestCase):
         ]
         _refset = ReferenceSet.from_json(json_dict)
         self.assertEqual(refset, _refset._reference_set)
+
+    def test_iter_json_corpus(self):
+        corpus = ReferenceSet.load_json_corpus()
+        _corpus = list(ReferenceSet.iter_json_corpus())
+        self.assertEqual(len(corpus), len(_corpus))
+        for refset, _refset in zip(corpus, _corpus):
+            self.assertEqual(refset.query, _refset.query)
+            self.assertEqual(refset._reference_set, _refset._reference_set)
+
+    def test_iter_json_items(self):
+        json_dict = {"a": {"1": ["x y"]}, "b \\\" c": {}, "": [1, 23, "}"]}
+        text = json.dumps(json_dict, indent=2)
+        for chunk_size in (1, 2, 7, 1 << 16):
+            items = list(_iter_json_items(io.StringIO(text), chunk_size))
+            self.assertEqual(items, list(json_dict.items()))
+        self.assertEqual(list(_iter_json_items(io.StringIO(" { } "))), [])
+        with self.assertRaises(ValueError):
+            list(_iter_json_items(io.StringIO('{"a": 1')))
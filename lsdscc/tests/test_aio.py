@@ -0,0 +1,140 @@
+# MIT License
+#
+# Copyright (c) 2019 Cong Feng.
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+import asyncio
+import concurrent.futures
+import threading
+import unittest
+from lsdscc.aio import aiter_scores_on_corpus, ascore_corpus, ascore_hypothesis_set
+from lsdscc.benchmark import SyntheticCorpusConfig, generate_corpora
+from lsdscc.metrics import compute_score_on_corpus, compute_score_on_hypothesis_set
+
+CONFIG = SyntheticCorpusConfig(
+    n_queries=20, n_groups=3, refs_per_group=2, hyps_per_set=3, vocab_size=100
+)
+
+
+class BlockingAligner:
+    """
+    An aligner that counts its calls and blocks until it is released.
+    """
+
+    def __init__(self):
+        self.calls = 0
+        self.released = threading.Event()
+
+    def __call__(self, hypothesis, refs):
+        self.released.wait()
+        self.calls += 1
+        return float(len(hypothesis))
+
+
+class TestAio(unittest.IsolatedAsyncioTestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.hypothesis_corpus, cls.reference_corpus = generate_corpora(CONFIG)
+        cls.expected = compute_score_on_corpus(
+            cls.hypothesis_corpus, cls.reference_corpus
+        )
+
+    async def test_ascore_corpus(self):
+        score = await ascore_corpus(
+            self.hypothesis_corpus, self.reference_corpus, chunk_size=3
+        )
+        self.assertEqual(score, self.expected)
+        score = await ascore_hypothesis_set(
+            self.hypothesis_corpus[0], self.reference_corpus[0]
+        )
+        self.assertEqual(
+            score,
+            compute_score_on_hypothesis_set(
+                self.hypothesis_corpus[0], self.reference_corpus[0]
+            ),
+        )
+
+    async def test_async_iterables(self):
+        async def generate():
+            for hypothesis_set in self.hypothesis_corpus:
+                await asyncio.sleep(0)
+                yield hypothesis_set
+
+        with concurrent.futures.ThreadPoolExecutor(2) as executor:
+            score = await ascore_corpus(
+                generate(), self.reference_corpus, executor=executor, chunk_size=4
+            )
+        self.assertEqual(score, self.expected)
+
+        with self.assertRaises(AssertionError):
+            await ascore_corpus(generate(), self.reference_corpus[:-1])
+
+    async def test_unordered(self):
+        query_ids = [
+            query_id
+            async for query_id, _ in aiter_scores_on_corpus(
+                self.hypothesis_corpus,
+                self.reference_corpus,
+                chunk_size=3,
+                ordered=False,
+            )
+        ]
+        self.assertEqual(sorted(query_ids), list(range(CONFIG.n_queries)))
+
+    async def test_back_pressure(self):
+        n_read = 0
+
+        def read():
+            nonlocal n_read
+            for hypothesis_set in self.hypothesis_corpus:
+                n_read += 1
+                yield hypothesis_set
+
+        aligner = BlockingAligner()
+        scores = aiter_scores_on_corpus(
+            read(), self.reference_corpus, aligner, chunk_size=2, max_pending=2
+        )
+        task = asyncio.ensure_future(scores.__anext__())
+        await asyncio.sleep(0.05)
+        # Two chunks in flight and one more waiting for a slot.
+        self.assertEqual(n_read, 6)
+        aligner.released.set()
+        await task
+        await scores.aclose()
+
+    async def test_cancel(self):
+        aligner = BlockingAligner()
+        with concurrent.futures.ThreadPoolExecutor(1) as executor:
+            task = asyncio.ensure_future(
+                ascore_corpus(
+                    self.hypothesis_corpus,
+                    self.reference_corpus,
+                    aligner,
+                    executor=executor,
+                    chunk_size=1,
+                    max_pending=4,
+                )
+            )
+            await asyncio.sleep(0.05)
+            task.cancel()
+            with self.assertRaises(asyncio.CancelledError):
+                await task
+            aligner.released.set()
+        # Only the chunk that was running when cancelled is scored.
+        self.assertEqual(aligner.calls, CONFIG.hyps_per_set * CONFIG.n_groups)
@@ -0,0 +1,140 @@
+# MIT License
+#
+# Copyright (c) 2019 Cong Feng.
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+import unittest
+import nltk.translate.bleu_score as bleu_score
+from lsdscc.align import (
+    BleuAligner,
+    NativeBleuAligner,
+    NativeNistAligner,
+    NLTKBleuAligner,
+    NLTKNistAligner,
+)
+from lsdscc.ds import HypothesisSet, ReferenceSet
+from lsdscc.index import ReferenceIndex
+from lsdscc.metrics import compute_score_on_hypothesis_set
+from lsdscc.tests.data import HYPOTHESIS_FILE, REFERENCE_FILE
+
+
+class _BatchAligner:
+    """
+    A third-party aligner implementing the batch protocol.
+    """
+
+    def __init__(self):
+        self.prepared = []
+
+    def prepare(self, reference_set):
+        vocabularies = [{w for ref in refs for w in ref} for refs in reference_set]
+        self.prepared.append(vocabularies)
+        return vocabularies
+
+    def score_matrix(self, hypotheses, vocabularies):
+        return [[len(set(h) & vocab) for vocab in vocabularies] for h in hypotheses]
+
+
+class TestAligners(unittest.TestCase):
+    def setUp(self):
+        self.hypothesis_set = HypothesisSet.load_corpus(HYPOTHESIS_FILE)[0]
+        self.reference_set = ReferenceSet.load_json_corpus(REFERENCE_FILE)[0]
+
+    def test_score_matrix(self):
+        smooth_function = bleu_score.SmoothingFunction().method1
+        for aligner in (
+            BleuAligner(),
+            NLTKBleuAligner(smooth_function),
+            NLTKNistAligner(n=3),
+        ):
+            matrix = aligner.score_matrix(
+                list(self.hypothesis_set), aligner.prepare(self.reference_set)
+            )
+            expected = [
+                [aligner(h, refs) for refs in self.reference_set]
+                for h in self.hypothesis_set
+            ]
+            self.assertEqual(matrix.tolist(), expected)
+            # A plain reference set works too.
+            self.assertEqual(
+                aligner.score_matrix(self.hypothesis_set, self.reference_set).tolist(),
+                expected,
+            )
+
+    def test_native_aligners(self):
+        smooth_function = bleu_score.SmoothingFunction(epsilon=0.2).method1
+        hypothesis_set = [h for h in self.hypothesis_set if len(h) >= 3]
+        for native, aligner in (
+            (NativeBleuAligner(), NLTKBleuAligner()),
+            (NativeBleuAligner(smooth_function), NLTKBleuAligner(smooth_function)),
+            (NativeNistAligner(n=3), NLTKNistAligner(n=3)),
+        ):
+            index = native.prepare(self.reference_set)
+            matrix = native.score_matrix(hypothesis_set, index)
+            for i, h in enumerate(hypothesis_set):
+                for j, refs in enumerate(self.reference_set):
+                    expected = aligner(h, refs)
+                    self.assertAlmostEqual(matrix[i, j], expected, delta=1e-9)
+                    self.assertAlmostEqual(native(h, refs), expected, delta=1e-9)
+            score = compute_score_on_hypothesis_set(
+                hypothesis_set, self.reference_set, native
+            )
+            expected = compute_score_on_hypothesis_set(
+                hypothesis_set, self.reference_set, aligner
+            )
+            for value, expected_value in zip(score, expected):
+                self.assertAlmostEqual(value, expected_value, delta=1e-9)
+
+    def test_native_bleu_aligner_smoothing(self):
+        self.assertEqual(
+            NativeBleuAligner("method1").cache_key(),
+            NativeBleuAligner(bleu_score.SmoothingFunction().method1).cache_key(),
+        )
+        self.assertNotEqual(
+            NativeBleuAligner("method1").cache_key(),
+            NativeBleuAligner(
+                bleu_score.SmoothingFunction(epsilon=0.2).method1
+            ).cache_key(),
+        )
+        for smooth_function in ("method8", lambda p_n, **kwargs: p_n):
+            with self.assertRaises(ValueError):
+                NativeBleuAligner(smooth_function)
+
+    def test_prepare(self):
+        index = ReferenceIndex(self.reference_set)
+        self.assertIs(BleuAligner().prepare(index), index)
+        self.assertEqual(list(index), list(self.reference_set))
+
+    def test_third_party_batch_aligner(self):
+        aligner = _BatchAligner()
+        score = compute_score_on_hypothesis_set(
+            self.hypothesis_set, self.reference_set, aligner
+        )
+        self.assertEqual(len(aligner.prepared), 1)
+
+        def scalar_aligner(h, refs):
+            return len(set(h) & {w for ref in refs for w in ref})
+
+        self.assertEqual(
+            score,
+            compute_score_on_hypothesis_set(
+                self.hypothesis_set, self.reference_set, scalar_aligner
+            ),
+        )
@@ -0,0 +1,181 @@
+# MIT License
+#
+# Copyright (c) 2019 Cong Feng.
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+import unittest
+import warnings
+from nltk.translate.bleu_score import corpus_bleu as nltk_corpus_bleu
+from nltk.translate.bleu_score import sentence_bleu
+from lsdscc.align import BleuAligner
+from lsdscc.batch import (
+    EncodedReferences,
+    bleu_score_matrices,
+    bleu_score_matrix,
+    bleu_statistics,
+    corpus_bleu,
+    match_counts,
+    match_counts_across,
+)
+from lsdscc.bleu import _bleu_without_bp
+from lsdscc.ds import HypothesisSet, ReferenceSet
+from lsdscc.tests.data import HYPOTHESIS_FILE, REFERENCE_FILE
+
+
+class TestBleuScoreMatrix(unittest.TestCase):
+    def assertParity(self, hypothesis_set, reference_set, max_order, smooth=True):
+        encoded = EncodedReferences(reference_set, max_order)
+        matrix = bleu_score_matrix(hypothesis_set, encoded, max_order, smooth)
+        self.assertEqual(matrix.shape, (len(hypothesis_set), len(reference_set)))
+        for i, h in enumerate(hypothesis_set):
+            for j, refs in enumerate(reference_set):
+                expected = _bleu_without_bp([h], [refs], max_order, smooth)
+                self.assertEqual(matrix[i, j], expected)
+
+    def test_parity_on_test_data(self):
+        hypothesis_set = HypothesisSet.load_corpus(HYPOTHESIS_FILE)[0]
+        reference_set = ReferenceSet.load_json_corpus(REFERENCE_FILE)[0]
+        for max_order in (1, 2, 4, 5):
+            self.assertParity(hypothesis_set, reference_set, max_order)
+            self.assertParity(hypothesis_set, reference_set, max_order, smooth=False)
+
+    def test_edge_cases(self):
+        hypothesis_set = [
+            [],
+            "unknown words only".split(),
+            "the the the the the".split(),
+            "a b a b a b a b".split(),
+            "a".split(),
+        ]
+        reference_set = [
+            ["the cat".split(), "the the".split()],
+            ["a b a".split()],
+            ["a".split(), []],
+        ]
+        self.assertParity(hypothesis_set, reference_set, 4)
+        self.assertParity(hypothesis_set, reference_set, 4, smooth=False)
+
+    def test_across_reference_sets(self):
+        hypothesis_set = HypothesisSet.load_corpus(HYPOTHESIS_FILE)[0]
+        reference_sets = [
+            ReferenceSet.load_json_corpus(REFERENCE_FILE)[0],
+            [["the cat".split(), "the the".split()], ["a b a".split()]],
+            [["a".split(), []]],
+        ]
+        encoded = [EncodedReferences(refs, 5) for refs in reference_sets]
+        hypothesis_sets = [
+            hypothesis_set,
+            [[], "the the cat".split(), "a b a b".split()],
+            hypothesis_set[:3],
+            [],
+            ["a b a a".split()],
+        ]
+        # The reference set of each hypothesis set. The first one is used twice.
+        choice = [0, 1, 0, 2, 2]
+        for max_order in (1, 4, 5):
+            for smooth in (True, False):
+                matrices = bleu_score_matrices(
+                    hypothesis_sets, [encoded[k] for k in choice], max_order, smooth
+                )
+                for matrix, h, k in zip(matrices, hypothesis_sets, choice):
+                    self.assertEqual(
+                        matrix.tolist(),
+                        bleu_score_matrix(h, encoded[k], max_order, smooth).tolist(),
+                    )
+        counts = match_counts_across(hypothesis_sets, [encoded[k] for k in choice])
+        for (matches, possibles, _), h, k in zip(counts, hypothesis_sets, choice):
+            expected_matches, expected_possibles, _ = match_counts(h, encoded[k])
+            self.assertEqual(matches.tolist(), expected_matches.tolist())
+            self.assertEqual(possibles.tolist(), expected_possibles.tolist())
+        self.assertEqual(bleu_score_matrices([], []), [])
+
+    def test_lower_order(self):
+        hypothesis_set = HypothesisSet.load_corpus(HYPOTHESIS_FILE)[0]
+        reference_set = ReferenceSet.load_json_corpus(REFERENCE_FILE)[0]
+        encoded = EncodedReferences(reference_set, 5)
+        _encoded = EncodedReferences(reference_set, 2)
+        self.assertEqual(
+            bleu_score_matrix(hypothesis_set, encoded, 2).tolist(),
+            bleu_score_matrix(hypothesis_set, _encoded, 2).tolist(),
+        )
+
+
+class TestBleuStatistics(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.hypothesis_set = [
+            [],
+            "unknown words only".split(),
+            "the cat sat on the mat".split(),
+            "a b a b a b a b".split(),
+            "a".split(),
+        ]
+        cls.reference_set = [
+            ["the cat".split(), "the cat is on the mat".split()],
+            ["a b a".split(), "a b a b a b a".split()],
+            ["a".split(), []],
+        ]
+        cls.encoded = EncodedReferences(cls.reference_set, 5)
+        cls.statistics = bleu_statistics(cls.hypothesis_set, cls.encoded, 5)
+
+    def test_orders(self):
+        for max_order in (1, 2, 4, 5):
+            for smooth in (True, False):
+                self.assertEqual(
+                    self.statistics.bleu(max_order, smooth).tolist(),
+                    bleu_score_matrix(
+                        self.hypothesis_set, self.encoded, max_order, smooth
+                    ).tolist(),
+                )
+        with self.assertRaises(ValueError):
+            self.statistics.bleu(6)
+        with self.assertRaises(ValueError):
+            self.statistics.bleu(brevity_penalty="longest")
+
+    def test_brevity_penalty(self):
+        self.assertEqual(self.statistics.shortest_reference_lengths.tolist(), [2, 3, 0])
+        self.assertEqual(
+            self.statistics.closest_reference_lengths[2].tolist(), [6, 7, 1]
+        )
+        scores = self.statistics.bleu(4, smooth=False, brevity_penalty="closest")
+        with warnings.catch_warnings():
+            warnings.simplefilter("ignore")
+            for i, h in enumerate(self.hypothesis_set[1:], 1):
+                for j, refs in enumerate(self.reference_set):
+                    self.assertAlmostEqual(
+                        scores[i, j], sentence_bleu(refs, h), places=12
+                    )
+        self.assertEqual(scores[0].tolist(), [0.0, 0.0, 0.0])
+
+    def test_corpus_bleu(self):
+        hypothesis_set = [h for h in self.hypothesis_set if len(h) >= 4]
+        statistics = bleu_statistics(hypothesis_set, self.encoded)
+        groups = statistics.bleu().argmax(axis=1)
+        # Split the hypotheses into two queries.
+        halves = [
+            BleuAligner().statistics(hypothesis_set[:1], self.reference_set),
+            BleuAligner().statistics(hypothesis_set[1:], self.reference_set),
+        ]
+        score = corpus_bleu(halves, [groups[:1], groups[1:]])
+        self.assertAlmostEqual(
+            score,
+            nltk_corpus_bleu([self.reference_set[k] for k in groups], hypothesis_set),
+            places=12,
+        )
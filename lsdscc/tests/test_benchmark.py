@@ -0,0 +1,164 @@
+# MIT License
+#
+# Copyright (c) 2019 Cong Feng.
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+import io
+import json
+import os
+import tempfile
+import unittest
+from contextlib import redirect_stderr, redirect_stdout
+from lsdscc.benchmark import (
+    SyntheticCorpusConfig,
+    compare_results,
+    generate_corpora,
+    run_benchmark,
+    run_server_benchmark,
+    write_hypothesis_corpus,
+    write_reference_corpus,
+)
+from lsdscc.benchmark.__main__ import main
+from lsdscc.ds import HypothesisSet, ReferenceSet
+
+CONFIG = SyntheticCorpusConfig(
+    n_queries=3, n_groups=4, refs_per_group=2, hyps_per_set=5, vocab_size=100
+)
+
+
+class TestSyntheticCorpus(unittest.TestCase):
+    def test_shape(self):
+        hypothesis_corpus, reference_corpus = generate_corpora(CONFIG)
+        self.assertEqual(len(hypothesis_corpus), CONFIG.n_queries)
+        self.assertEqual(len(reference_corpus), CONFIG.n_queries)
+        for hypothesis_set, reference_set in zip(hypothesis_corpus, reference_corpus):
+            self.assertEqual(len(hypothesis_set), CONFIG.hyps_per_set)
+            self.assertEqual(len(reference_set), CONFIG.n_groups)
+            for refs in reference_set:
+                self.assertEqual(len(refs), CONFIG.refs_per_group)
+            references = [ref for refs in reference_set for ref in refs]
+            for sentence in list(hypothesis_set) + references:
+                self.assertGreaterEqual(len(sentence), CONFIG.min_length)
+
+    def test_seed(self):
+        def as_lists(corpora):
+            hypothesis_corpus, reference_corpus = corpora
+            return (
+                [list(hs) for hs in hypothesis_corpus],
+                [list(rs) for rs in reference_corpus],
+            )
+
+        corpora = as_lists(generate_corpora(CONFIG))
+        self.assertEqual(corpora, as_lists(generate_corpora(CONFIG)))
+        self.assertNotEqual(
+            corpora, as_lists(generate_corpora(CONFIG._replace(seed=1)))
+        )
+
+    def test_round_trip(self):
+        hypothesis_corpus, reference_corpus = generate_corpora(CONFIG)
+        with tempfile.TemporaryDirectory() as workdir:
+            reference_file = os.path.join(workdir, "reference.json")
+            hypothesis_file = os.path.join(workdir, "hypothesis.txt")
+            write_reference_corpus(reference_corpus, reference_file)
+            write_hypothesis_corpus(hypothesis_corpus, hypothesis_file)
+            self.assertEqual(
+                [list(rs) for rs in ReferenceSet.load_json_corpus(reference_file)],
+                [list(rs) for rs in reference_corpus],
+            )
+            self.assertEqual(
+                [list(hs) for hs in HypothesisSet.load_corpus(hypothesis_file)],
+                [list(hs) for hs in hypothesis_corpus],
+            )
+
+
+class TestBenchmark(unittest.TestCase):
+    def test_run_benchmark(self):
+        results = run_benchmark(
+            CONFIG, aligners=["bleu", "native_nist", "multi_bleu"], repeats=1
+        )
+        self.assertEqual(results["config"], CONFIG._asdict())
+        self.assertEqual(
+            set(results["stages"]),
+            {
+                "load/json",
+                "load/compiled",
+                "ngrams",
+                "align/bleu",
+                "align/native_nist",
+                "align/multi_bleu",
+                "aggregate",
+                "corpus/bleu",
+                "corpus/native_nist",
+                "corpus/multi_bleu",
+            },
+        )
+        for stage in results["stages"].values():
+            self.assertEqual(len(stage["times"]), 1)
+            self.assertGreater(stage["items"], 0)
+        # The results must survive a round trip through json.
+        self.assertEqual(json.loads(json.dumps(results)), results)
+
+    def test_run_server_benchmark(self):
+        results = run_server_benchmark(CONFIG, n_clients=2, sets_per_request=2)
+        self.assertTrue(results["same_as_direct"])
+        self.assertEqual(results["requests"], 2)
+        self.assertEqual(results["latency"]["count"], 2)
+        self.assertEqual(results["server"]["requests"]["count"], 2)
+        self.assertEqual(json.loads(json.dumps(results)), results)
+
+    def test_compare_results(self):
+        def results(seconds, **config):
+            return {
+                "config": CONFIG._replace(**config)._asdict(),
+                "stages": {
+                    stage: {"seconds": value} for stage, value in seconds.items()
+                },
+            }
+
+        baseline = results({"ngrams": 1.0, "aggregate": 1.0, "align/bleu": 1.0})
+        rows = compare_results(
+            results({"ngrams": 1.05, "aggregate": 1.5, "corpus/bleu": 1.0}), baseline
+        )
+        self.assertEqual([row["stage"] for row in rows], ["ngrams", "aggregate"])
+        self.assertEqual([row["regression"] for row in rows], [False, True])
+        self.assertAlmostEqual(rows[1]["ratio"], 1.5)
+        with self.assertRaises(ValueError):
+            compare_results(results({}, seed=1), baseline)
+
+    def test_main(self):
+        with tempfile.TemporaryDirectory() as workdir:
+            output = os.path.join(workdir, "results.json")
+            argv = [
+                "--n_queries=2",
+                "--n_groups=2",
+                "--sweep=hyps_per_set=1,3",
+                "--aligners=bleu",
+                "--repeats=1",
+                "--output=%s" % output,
+            ]
+            with redirect_stderr(io.StringIO()):
+                self.assertEqual(main(argv), 0)
+            with open(output) as f:
+                runs = json.load(f)["runs"]
+            self.assertEqual([run["config"]["hyps_per_set"] for run in runs], [1, 3])
+
+            # Comparing against itself with a huge tolerance finds no regression.
+            argv += ["--baseline=%s" % output, "--tolerance=1000"]
+            with redirect_stderr(io.StringIO()), redirect_stdout(io.StringIO()):
+                self.assertEqual(main(argv), 0)
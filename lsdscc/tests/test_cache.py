@@ -0,0 +1,98 @@
+# MIT License
+#
+# Copyright (c) 2019 Cong Feng.
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+import copy
+import os
+import pickle
+import tempfile
+import unittest
+from lsdscc.align import BleuAligner, NLTKBleuAligner
+from lsdscc.cache import ScoreCache
+from lsdscc.ds import HypothesisSet, ReferenceSet
+from lsdscc.index import ReferenceIndex
+from lsdscc.metrics import compute_score_on_corpus
+from lsdscc.tests.data import HYPOTHESIS_FILE, REFERENCE_FILE
+
+
+class TestScoreCache(unittest.TestCase):
+    def setUp(self):
+        self._tmpdir = tempfile.TemporaryDirectory()
+        self.filename = os.path.join(self._tmpdir.name, "scores.db")
+        self.hypothesis_corpus = HypothesisSet.load_corpus(HYPOTHESIS_FILE)
+        self.reference_corpus = ReferenceSet.load_json_corpus(REFERENCE_FILE)
+
+    def tearDown(self):
+        self._tmpdir.cleanup()
+
+    def test_same_score(self):
+        score = compute_score_on_corpus(self.hypothesis_corpus, self.reference_corpus)
+        with ScoreCache(self.filename) as cache:
+            _score = compute_score_on_corpus(
+                self.hypothesis_corpus, self.reference_corpus, cache=cache
+            )
+            self.assertEqual(cache.stats()["hits"], 0)
+            self.assertEqual(cache.stats()["misses"], 8)
+        self.assertEqual(score, _score)
+
+        with ScoreCache(self.filename) as cache:
+            _score = compute_score_on_corpus(
+                self.hypothesis_corpus, self.reference_corpus, cache=cache
+            )
+            self.assertEqual(cache.stats()["hit_rate"], 1.0)
+        self.assertEqual(score, _score)
+
+    def test_keys(self):
+        index = ReferenceIndex(self.reference_corpus[0])
+        prefix = ScoreCache.key_prefix(BleuAligner(), index)
+        self.assertEqual(prefix, ScoreCache.key_prefix(BleuAligner(4), index))
+        self.assertNotEqual(prefix, ScoreCache.key_prefix(BleuAligner(2), index))
+        self.assertIsNone(ScoreCache.key_prefix(lambda h, refs: 0.0, index))
+        self.assertIsNone(
+            ScoreCache.key_prefix(NLTKBleuAligner(lambda *args: args), index)
+        )
+        self.assertNotEqual(
+            ScoreCache.key(prefix, "a b".split()), ScoreCache.key(prefix, ["a b"])
+        )
+
+    def test_eviction(self):
+        with ScoreCache(self.filename, max_entries=2) as cache:
+            cache.put_many([(b"a", [1.0]), (b"b", [2.0]), (b"c", [3.0])])
+            cache.get_many([b"a"])
+            cache.evict()
+            self.assertEqual(len(cache), 2)
+            self.assertEqual(set(cache.get_many([b"a", b"b", b"c"])), {b"a", b"c"})
+
+        # A copy closed without eviction leaves the excess entries to the original.
+        with ScoreCache(self.filename, max_entries=2) as cache:
+            _cache = copy.copy(cache)
+            _cache.put_many([(b"d", [4.0])])
+            _cache.close(evict=False)
+            self.assertEqual(len(cache), 3)
+        with ScoreCache(self.filename, max_entries=2) as cache:
+            self.assertEqual(len(cache), 2)
+
+    def test_pickle(self):
+        with ScoreCache(self.filename) as cache:
+            cache.put_many([(b"a", [1.0, 0.5])])
+            _cache = pickle.loads(pickle.dumps(cache))
+            self.assertEqual(_cache.get_many([b"a"])[b"a"].tolist(), [1.0, 0.5])
+            _cache.close()
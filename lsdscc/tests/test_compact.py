@@ -0,0 +1,81 @@
+# MIT License
+#
+# Copyright (c) 2019 Cong Feng.
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+import pickle
+import unittest
+from lsdscc.compact import CompactHypothesisCorpus, CompactReferenceCorpus, Vocabulary
+from lsdscc.ds import HypothesisSet, ReferenceSet
+from lsdscc.metrics import compute_score_on_corpus
+from lsdscc.tests.data import HYPOTHESIS_FILE, REFERENCE_FILE
+
+
+class TestCompact(unittest.TestCase):
+    def test_vocabulary(self):
+        vocab = Vocabulary("a b a".split())
+        self.assertEqual(len(vocab), 2)
+        self.assertEqual(vocab.encode("b a c".split()), [1, 0, 2])
+        self.assertEqual(vocab.decode([2, 0]), ["c", "a"])
+        self.assertIn("c", vocab)
+
+    def test_reference_corpus(self):
+        corpus = ReferenceSet.load_json_corpus()
+        compact = CompactReferenceCorpus.load_json_corpus()
+        self.assertEqual(len(compact), len(corpus))
+        for refset, _refset in zip(corpus, compact):
+            self.assertEqual(refset.query, _refset.query)
+            self.assertEqual(refset.n_references, _refset.n_references)
+            self.assertEqual(len(refset), len(_refset))
+            self.assertEqual(list(refset), [list(refs) for refs in _refset])
+        self.assertEqual(compact[-1][0][0], corpus[-1][0][0])
+        with self.assertRaises(IndexError):
+            compact[len(corpus)]
+
+    def test_hypothesis_corpus(self):
+        corpus = HypothesisSet.load_corpus(HYPOTHESIS_FILE)
+        compact = CompactHypothesisCorpus.load_corpus(HYPOTHESIS_FILE)
+        self.assertEqual(len(compact), len(corpus))
+        self.assertEqual(list(compact[0]), list(corpus[0]))
+        self.assertEqual(compact[0][1:3], corpus[0][1:3])
+
+    def test_shared_vocab(self):
+        compact = CompactReferenceCorpus.load_json_corpus(REFERENCE_FILE)
+        _compact = CompactHypothesisCorpus.load_corpus(
+            HYPOTHESIS_FILE, vocab=compact.vocab
+        )
+        self.assertIs(compact.vocab, _compact.vocab)
+
+    def test_pickle_as_plain(self):
+        compact = CompactReferenceCorpus.load_json_corpus(REFERENCE_FILE)
+        refset = pickle.loads(pickle.dumps(compact[0]))
+        self.assertIsInstance(refset, ReferenceSet)
+        self.assertEqual(refset.query, compact[0].query)
+        self.assertEqual(refset._reference_set, [list(refs) for refs in compact[0]])
+
+    def test_same_score(self):
+        hypothesis_corpus = HypothesisSet.load_corpus(HYPOTHESIS_FILE)
+        reference_corpus = ReferenceSet.load_json_corpus(REFERENCE_FILE)
+        score = compute_score_on_corpus(hypothesis_corpus, reference_corpus)
+        _score = compute_score_on_corpus(
+            CompactHypothesisCorpus.load_corpus(HYPOTHESIS_FILE),
+            CompactReferenceCorpus.load_json_corpus(REFERENCE_FILE),
+        )
+        self.assertEqual(score, _score)
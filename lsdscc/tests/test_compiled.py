@@ -0,0 +1,110 @@
+# MIT License
+#
+# Copyright (c) 2019 Cong Feng.
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+import os
+import tempfile
+import unittest
+from unittest import mock
+import lsdscc.compiled as compiled
+from lsdscc.compact import CompactReferenceCorpus
+from lsdscc.compiled import (
+    file_digest,
+    load_cached_reference_corpus,
+    load_reference_corpus,
+    save_reference_corpus,
+)
+from lsdscc.ds import ReferenceSet
+from lsdscc.tests.data import REFERENCE_FILE
+
+
+class TestCompiled(unittest.TestCase):
+    def setUp(self):
+        self._tmpdir = tempfile.TemporaryDirectory()
+        self.tmpdir = self._tmpdir.name
+
+    def tearDown(self):
+        self._tmpdir.cleanup()
+
+    def assertSameCorpus(self, corpus, _corpus):
+        self.assertEqual(len(corpus), len(_corpus))
+        for refset, _refset in zip(corpus, _corpus):
+            self.assertEqual(refset.query, _refset.query)
+            self.assertEqual(list(refset), [list(refs) for refs in _refset])
+
+    def test_save_and_load(self):
+        corpus = CompactReferenceCorpus.load_json_corpus()
+        filename = os.path.join(self.tmpdir, "corpus.lsdscc")
+        save_reference_corpus(corpus, filename)
+        compiled = load_reference_corpus(filename)
+        self.assertSameCorpus(ReferenceSet.load_json_corpus(), compiled)
+
+        # A loaded corpus can be saved again.
+        _filename = os.path.join(self.tmpdir, "_corpus.lsdscc")
+        save_reference_corpus(compiled, _filename)
+        with open(filename, "rb") as f, open(_filename, "rb") as _f:
+            self.assertEqual(f.read(), _f.read())
+
+    def test_bad_file(self):
+        filename = os.path.join(self.tmpdir, "bad.lsdscc")
+        with open(filename, "wb") as f:
+            f.write(b"not a corpus")
+        with self.assertRaises(ValueError):
+            load_reference_corpus(filename)
+
+    def test_truncated_file(self):
+        filename = os.path.join(self.tmpdir, "corpus.lsdscc")
+        save_reference_corpus(CompactReferenceCorpus.load_json_corpus(), filename)
+        with open(filename, "rb") as f:
+            data = f.read()
+        for size in (0, 10, 20, len(data) // 2, len(data) - 1):
+            with open(filename, "wb") as f:
+                f.write(data[:size])
+            with self.assertRaises(ValueError):
+                load_reference_corpus(filename)
+
+        # A truncated cache entry is compiled again.
+        corpus = load_cached_reference_corpus(REFERENCE_FILE, self.tmpdir)
+        (entry,) = [name for name in os.listdir(self.tmpdir) if name != "corpus.lsdscc"]
+        entry = os.path.join(self.tmpdir, entry)
+        with open(entry, "r+b") as f:
+            f.truncate(os.path.getsize(entry) // 2)
+        with self.assertLogs("lsdscc.compiled", "WARNING"):
+            _corpus = load_cached_reference_corpus(REFERENCE_FILE, self.tmpdir)
+        self.assertSameCorpus(corpus, _corpus)
+        load_reference_corpus(entry)
+
+    def test_cache(self):
+        corpus = load_cached_reference_corpus(REFERENCE_FILE, self.tmpdir)
+        self.assertEqual(len(os.listdir(self.tmpdir)), 1)
+        _corpus = load_cached_reference_corpus(REFERENCE_FILE, self.tmpdir)
+        self.assertEqual(len(os.listdir(self.tmpdir)), 1)
+        self.assertIsInstance(_corpus.tokens, memoryview)
+        self.assertSameCorpus(ReferenceSet.load_json_corpus(REFERENCE_FILE), corpus)
+        self.assertSameCorpus(ReferenceSet.load_json_corpus(REFERENCE_FILE), _corpus)
+        # The entry is named by the digest of the json file.
+        (entry,) = os.listdir(self.tmpdir)
+        self.assertTrue(entry.startswith(file_digest(REFERENCE_FILE)))
+        with mock.patch.object(compiled, "file_digest") as digest:
+            load_cached_reference_corpus(
+                REFERENCE_FILE, self.tmpdir, file_digest(REFERENCE_FILE)
+            )
+            digest.assert_not_called()
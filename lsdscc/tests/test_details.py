@@ -0,0 +1,122 @@
+# MIT License
+#
+# Copyright (c) 2019 Cong Feng.
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+import os
+import tempfile
+import unittest
+import numpy as np
+from lsdscc.align import BleuAligner, MultiBleuAligner, NLTKBleuAligner
+from lsdscc.benchmark import SyntheticCorpusConfig, generate_corpora
+from lsdscc.details import (
+    AlignmentDetails,
+    BleuVariant,
+    compute_bleu_variants_on_corpus,
+    compute_details_on_hypothesis_set,
+    iter_details_on_corpus,
+    load_details,
+    save_details,
+    score_corpus_from_details,
+)
+from lsdscc.metrics import compute_result_on_hypothesis_set, compute_score_on_corpus
+
+
+class TestDetails(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        config = SyntheticCorpusConfig(n_queries=12, n_groups=3, hyps_per_set=4)
+        cls.hypothesis_corpus, cls.reference_corpus = generate_corpora(config)
+        cls.details = list(
+            iter_details_on_corpus(cls.hypothesis_corpus, cls.reference_corpus)
+        )
+
+    def test_details(self):
+        hypothesis_set = [["a", "b"], ["c"], ["a", "b"]]
+        reference_set = [[["a", "b"]], [["c"], ["d"]], [["e"]]]
+        details = compute_details_on_hypothesis_set(hypothesis_set, reference_set)
+        self.assertEqual(details.score_matrix.shape, (3, 3))
+        self.assertEqual(details.aligned_groups.tolist(), [0, 1, 0])
+        self.assertEqual(details.group_sizes.tolist(), [1, 2, 1])
+        self.assertEqual(details.lengths, [2, 1, 2])
+        self.assertEqual(details.coverage().tolist(), [True, True, False])
+        self.assertEqual(details.score().mds, 2 / 3)
+        self.assertEqual(details.score().pds, 3 / 4)
+        with self.assertRaises(ValueError):
+            details.score_matrix[0, 0] = 0.0
+
+    def test_same_as_result(self):
+        for aligner in (None, MultiBleuAligner(), NLTKBleuAligner()):
+            for hypothesis_set, reference_set in zip(
+                self.hypothesis_corpus, self.reference_corpus
+            ):
+                details = compute_details_on_hypothesis_set(
+                    hypothesis_set, reference_set, aligner
+                )
+                self.assertEqual(
+                    details.to_result(),
+                    compute_result_on_hypothesis_set(
+                        hypothesis_set, reference_set, aligner
+                    ),
+                )
+        self.assertEqual(
+            score_corpus_from_details(self.details),
+            compute_score_on_corpus(self.hypothesis_corpus, self.reference_corpus),
+        )
+
+    def test_threshold(self):
+        details = AlignmentDetails([[0.5, 0.1], [0.0, 0.05]], [1, 3])
+        self.assertEqual(details.coverage().tolist(), [True, True])
+        self.assertEqual(details.coverage(0.1).tolist(), [True, False])
+        score = details.score(0.1)
+        self.assertEqual((score.mds, score.pds), (0.5, 0.25))
+        self.assertEqual(score.max_bleu, details.score().max_bleu)
+        strict = score_corpus_from_details(self.details, lambda d: d.score(1.0))
+        self.assertLessEqual(strict.mds, score_corpus_from_details(self.details).mds)
+
+    def test_save_load(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            filename = os.path.join(tmp, "details.npz")
+            save_details(filename, self.details)
+            loaded = load_details(filename)
+        self.assertEqual(len(loaded), len(self.details))
+        for details, expected in zip(loaded, self.details):
+            np.testing.assert_array_equal(details.score_matrix, expected.score_matrix)
+            self.assertEqual(details.to_result(), expected.to_result())
+
+    def test_bleu_variants(self):
+        variants = [BleuVariant(), BleuVariant(2), BleuVariant(5, False, "closest")]
+        scores = compute_bleu_variants_on_corpus(
+            self.hypothesis_corpus, self.reference_corpus, variants
+        )
+        self.assertEqual(list(scores), variants)
+        for n in (4, 2):
+            self.assertEqual(
+                scores[BleuVariant(n)],
+                compute_score_on_corpus(
+                    self.hypothesis_corpus, self.reference_corpus, BleuAligner(n)
+                ),
+            )
+        # Neither smoothing nor a brevity penalty can raise a score.
+        self.assertLessEqual(
+            scores[variants[2]].max_bleu,
+            compute_score_on_corpus(
+                self.hypothesis_corpus, self.reference_corpus, BleuAligner(5)
+            ).max_bleu,
+        )
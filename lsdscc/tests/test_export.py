@@ -0,0 +1,129 @@
+# MIT License
+#
+# Copyright (c) 2019 Cong Feng.
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+import csv
+import json
+import os
+import tempfile
+import unittest
+import numpy as np
+from lsdscc.ds import HypothesisSet, ReferenceSet
+from lsdscc.export import export_results_on_corpus, open_result_writer
+from lsdscc.metrics import (
+    compute_result_on_hypothesis_set,
+    compute_score_on_corpus,
+    iter_results_on_corpus,
+)
+from lsdscc.tests.data import HYPOTHESIS_FILE, REFERENCE_FILE
+
+
+class TestExport(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.reference_corpus = ReferenceSet.load_json_corpus(REFERENCE_FILE)
+        cls.hypothesis_corpus = HypothesisSet.load_corpus(HYPOTHESIS_FILE)
+        cls.score = compute_score_on_corpus(cls.hypothesis_corpus, cls.reference_corpus)
+        cls.results = list(
+            iter_results_on_corpus(cls.hypothesis_corpus, cls.reference_corpus)
+        )
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def export(self, fmt):
+        filename = os.path.join(self.tmp.name, "results." + fmt)
+        score = export_results_on_corpus(
+            iter(self.hypothesis_corpus), iter(self.reference_corpus), filename
+        )
+        self.assertEqual(score, self.score)
+        return filename
+
+    def test_query_result(self):
+        hypothesis_set = [["a", "b"], ["c"], ["a", "b"]]
+        reference_set = [[["a", "b"]], [["c"], ["d"]]]
+        result = compute_result_on_hypothesis_set(hypothesis_set, reference_set)
+        self.assertEqual(result.aligned_groups, [0, 1, 0])
+        self.assertEqual(result.group_sizes, [1, 2])
+        self.assertEqual(result.lengths, [2, 1, 2])
+        self.assertEqual(result.score.mds, 1.0)
+        self.assertEqual(result.score.max_bleu, np.mean(result.max_scores))
+
+        # The metrics can be recomputed from the alignment.
+        for result in self.results:
+            aligned = set(result.aligned_groups)
+            self.assertEqual(result.score.mds, len(aligned) / len(result.group_sizes))
+            self.assertEqual(
+                result.score.pds,
+                sum(result.group_sizes[k] for k in aligned) / sum(result.group_sizes),
+            )
+
+    def test_jsonl(self):
+        with open(self.export("jsonl")) as f:
+            records = [json.loads(line) for line in f]
+        self.assertEqual(len(records), len(self.results))
+        for i, (record, result) in enumerate(zip(records, self.results)):
+            self.assertEqual(record["query_id"], i)
+            self.assertEqual(record["query"], result.query)
+            self.assertEqual(
+                (record["mds"], record["pds"], record["max_bleu"]), result.score
+            )
+            self.assertEqual(record["aligned_groups"], result.aligned_groups)
+            self.assertEqual(record["max_scores"], result.max_scores)
+
+    def test_csv(self):
+        with open(self.export("csv"), newline="") as f:
+            rows = list(csv.DictReader(f))
+        self.assertEqual(len(rows), sum(len(hs) for hs in self.hypothesis_corpus))
+        max_scores = [[] for _ in self.results]
+        for row in rows:
+            result = self.results[int(row["query_id"])]
+            self.assertEqual(row["query"], result.query)
+            self.assertEqual(float(row["max_bleu"]), result.score.max_bleu)
+            k = int(row["aligned_group"])
+            self.assertEqual(int(row["aligned_group_size"]), result.group_sizes[k])
+            max_scores[int(row["query_id"])].append(float(row["max_score"]))
+        for scores, result in zip(max_scores, self.results):
+            self.assertEqual(scores, result.max_scores)
+
+    def test_npz(self):
+        with np.load(self.export("npz")) as data:
+            self.assertEqual(np.mean(data["mds"]), self.score.mds)
+            offsets = data["hypothesis_offsets"]
+            for i, result in enumerate(self.results):
+                begin, end = offsets[i], offsets[i + 1]
+                self.assertEqual(
+                    data["aligned_group"][begin:end].tolist(), result.aligned_groups
+                )
+                self.assertEqual(
+                    np.mean(data["max_score"][begin:end]), data["max_bleu"][i]
+                )
+                group_sizes = data["group_size"][
+                    data["group_offsets"][i] : data["group_offsets"][i + 1]
+                ]
+                self.assertEqual(group_sizes.tolist(), result.group_sizes)
+            self.assertEqual(data["query"][0], self.results[0].query)
+
+    def test_unknown_format(self):
+        with self.assertRaises(ValueError):
+            open_result_writer(os.path.join(self.tmp.name, "results.txt"))
@@ -0,0 +1,113 @@
+# MIT License
+#
+# Copyright (c) 2019 Cong Feng.
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+import os
+import tempfile
+import unittest
+from lsdscc import instrument
+from lsdscc.align import BleuAligner
+from lsdscc.compact import CompactReferenceCorpus
+from lsdscc.compiled import load_reference_corpus, save_reference_corpus
+from lsdscc.ds import HypothesisSet, ReferenceSet
+from lsdscc.instrument import Profiler, add_hook, remove_hook
+from lsdscc.memo import ngram_memo
+from lsdscc.metrics import compute_score_on_corpus
+from lsdscc.tests.data import HYPOTHESIS_FILE, REFERENCE_FILE
+
+
+class TestInstrument(unittest.TestCase):
+    def setUp(self):
+        self.hypothesis_corpus = HypothesisSet.load_corpus(HYPOTHESIS_FILE)
+        self.reference_corpus = ReferenceSet.load_json_corpus(REFERENCE_FILE)
+        ngram_memo.clear()
+
+    def test_hooks(self):
+        events = []
+
+        def hook(stage, seconds, count, info):
+            events.append((stage, count))
+
+        add_hook(hook)
+        try:
+            score = compute_score_on_corpus(
+                self.hypothesis_corpus, self.reference_corpus
+            )
+        finally:
+            remove_hook(hook)
+        self.assertEqual(instrument.hooks, [])
+        self.assertIn(("aligner", 8 * 4), events)
+        self.assertIn(("argmax", 8), events)
+        self.assertIn(("aggregation", 8), events)
+        self.assertIn(("query", 8), events)
+
+        # Nothing is reported once the hook is removed, and the result does not change.
+        events.clear()
+        self.assertEqual(
+            score,
+            compute_score_on_corpus(self.hypothesis_corpus, self.reference_corpus),
+        )
+        self.assertEqual(events, [])
+
+    def test_profiler(self):
+        corpus_size = 3
+        with Profiler(slowest=2) as profiler:
+            hypothesis_corpus = HypothesisSet.load_corpus(HYPOTHESIS_FILE) * corpus_size
+            reference_corpus = ReferenceSet.load_json_corpus(REFERENCE_FILE)
+            compute_score_on_corpus(
+                hypothesis_corpus, reference_corpus * corpus_size, prune=True
+            )
+        report = profiler.report()
+        stages = report["stages"]
+        self.assertEqual(
+            set(stages), {"load", "tokenize", "ngram", "aligner", "aggregation"}
+        )
+        self.assertEqual(stages["load"]["calls"], 2)
+        self.assertEqual(stages["tokenize"]["calls"], 2)
+        self.assertEqual(stages["aligner"]["count"], corpus_size * 8 * 4)
+        self.assertEqual(report["n_queries"], corpus_size)
+        slowest = report["slowest_queries"]
+        self.assertEqual(len(slowest), 2)
+        self.assertGreaterEqual(slowest[0]["seconds"], slowest[1]["seconds"])
+        self.assertEqual(slowest[0]["n_groups"], 4)
+        self.assertIsNone(report["peak_memory_bytes"])
+        self.assertGreaterEqual(
+            report["wall_seconds"], max(stage["seconds"] for stage in stages.values())
+        )
+
+    def test_trace_memory(self):
+        with Profiler(trace_memory=True) as profiler:
+            compute_score_on_corpus(
+                self.hypothesis_corpus, self.reference_corpus, BleuAligner()
+            )
+        self.assertGreater(profiler.report()["peak_memory_bytes"], 0)
+
+    def test_compiled_load(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            filename = os.path.join(tmp, "refs.lsdscc")
+            save_reference_corpus(
+                CompactReferenceCorpus.load_json_corpus(REFERENCE_FILE), filename
+            )
+            with Profiler() as profiler:
+                corpus = load_reference_corpus(filename)
+        load = profiler.report()["stages"]["load"]
+        self.assertEqual(load["calls"], 1)
+        self.assertEqual(load["count"], len(corpus))
+        self.assertLessEqual(load["seconds"], profiler.report()["wall_seconds"])
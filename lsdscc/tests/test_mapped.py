@@ -0,0 +1,153 @@
+# MIT License
+#
+# Copyright (c) 2019 Cong Feng.
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+import os
+import pickle
+import tempfile
+import unittest
+from unittest import mock
+import lsdscc.mapped as mapped
+from lsdscc.ds import HypothesisSet, ReferenceSet
+from lsdscc.mapped import INDEX_SUFFIX, MappedHypothesisCorpus
+from lsdscc.metrics import compute_score_on_corpus
+from lsdscc.tests.data import HYPOTHESIS_FILE, REFERENCE_FILE
+
+
+def _lists(corpus):
+    return [list(hypothesis_set) for hypothesis_set in corpus]
+
+
+class TestMappedHypothesisCorpus(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+
+    def _write(self, text, name="hypothesis.txt"):
+        filename = os.path.join(self.tmp.name, name)
+        with open(filename, "w", newline="") as f:
+            f.write(text)
+        return filename
+
+    def test_same_as_load_corpus(self):
+        for text in (
+            "",
+            "a b </s> c\n",
+            "a b </s> c\nd e",
+            "a b </s> c\r\n\r\n d </s>\n",
+            "é ü </s> ß\n\n",
+        ):
+            filename = self._write(text)
+            expected = HypothesisSet.load_corpus(filename)
+            corpus = HypothesisSet.open_corpus(filename)
+            self.assertEqual(len(corpus), len(expected))
+            self.assertEqual(_lists(corpus), _lists(expected))
+            self.assertEqual(
+                [len(h) for h in HypothesisSet.open_corpus(filename)],
+                [len(h) for h in expected],
+            )
+
+        corpus = HypothesisSet.open_corpus(HYPOTHESIS_FILE)
+        reference_corpus = ReferenceSet.load_json_corpus(REFERENCE_FILE)
+        self.assertEqual(
+            compute_score_on_corpus(corpus, reference_corpus),
+            compute_score_on_corpus(
+                HypothesisSet.load_corpus(HYPOTHESIS_FILE), reference_corpus
+            ),
+        )
+
+    def test_random_access(self):
+        lines = ["q%d a </s> q%d b" % (i, i) for i in range(10)]
+        filename = self._write("\n".join(lines) + "\n")
+        corpus = MappedHypothesisCorpus(filename)
+        hypothesis_set = corpus[7]
+        self.assertIsNone(hypothesis_set._tokens)
+        self.assertEqual(len(hypothesis_set), 2)
+        self.assertIsNone(hypothesis_set._tokens)
+        self.assertEqual(hypothesis_set.raw(), (lines[7] + "\n").encode())
+        self.assertEqual(list(hypothesis_set), [["q7", "a"], ["q7", "b"]])
+        self.assertEqual(list(corpus[-1][0]), ["q9", "a"])
+
+        view = corpus[2:9:3]
+        self.assertEqual(len(view), 3)
+        self.assertEqual([h[0][0] for h in view], ["q2", "q5", "q8"])
+        self.assertEqual([h[0][0] for h in view[::-1]], ["q8", "q5", "q2"])
+        with self.assertRaises(IndexError):
+            corpus[10]
+
+    def test_pickle(self):
+        filename = self._write("".join("q%d </s> x\n" % i for i in range(100)))
+        corpus = MappedHypothesisCorpus(filename)
+        for view in (corpus, corpus[40:50], corpus[3:90:11], corpus[::-7]):
+            self.assertEqual(_lists(pickle.loads(pickle.dumps(view))), _lists(view))
+        self.assertEqual(len(pickle.loads(pickle.dumps(corpus[40:50])).offsets), 11)
+        self.assertEqual(list(pickle.loads(pickle.dumps(corpus[42]))), [["q42"], ["x"]])
+
+    def test_pickle_replaced_file(self):
+        filename = self._write("a </s> b\nc\n")
+        old = pickle.dumps(MappedHypothesisCorpus(filename))
+        # The unpickled view keeps the buffer of the old file in the cache.
+        unpickled = pickle.loads(old)
+        os.replace(self._write("d e\nf </s> g\nh\n", "new.txt"), filename)
+        new = pickle.loads(pickle.dumps(MappedHypothesisCorpus(filename)))
+        self.assertEqual(_lists(new), [[["d", "e"]], [["f"], ["g"]], [["h"]]])
+        self.assertEqual(_lists(unpickled), [[["a"], ["b"]], [["c"]]])
+        self.assertEqual(_lists(pickle.loads(old)), _lists(unpickled))
+        # Once the old buffer is not used, the old file cannot be read again.
+        del unpickled
+        self.assertEqual(
+            len([key for key in mapped._buffers.keys() if key[0] == filename]), 1
+        )
+        with self.assertRaises(ValueError):
+            pickle.loads(old)
+
+    def test_index_file(self):
+        filename = self._write("a </s> b\nc\n")
+        index_file = filename + INDEX_SUFFIX
+        corpus = MappedHypothesisCorpus(filename, index_file=True)
+        self.assertTrue(os.path.exists(index_file))
+        self.assertEqual(corpus.offsets.tolist(), [0, 9, 11])
+
+        with mock.patch.object(mapped, "_scan_offsets") as scan:
+            corpus = MappedHypothesisCorpus(filename, index_file=index_file)
+            scan.assert_not_called()
+        self.assertEqual(_lists(corpus), [[["a"], ["b"]], [["c"]]])
+
+        # A modified file invalidates the index.
+        with open(filename, "a") as f:
+            f.write("d e\n")
+        corpus = MappedHypothesisCorpus(filename, index_file=index_file)
+        self.assertEqual(_lists(corpus)[-1], [["d", "e"]])
+        with mock.patch.object(mapped, "_scan_offsets") as scan:
+            MappedHypothesisCorpus(filename, index_file=index_file)
+            scan.assert_not_called()
+
+    def test_scan_in_chunks(self):
+        text = "".join("%s\n" % ("x " * i) for i in range(50))
+        filename = self._write(text)
+        expected = MappedHypothesisCorpus(filename).offsets.tolist()
+        with mock.patch.object(mapped, "_SCAN_SIZE", 7):
+            self.assertEqual(
+                MappedHypothesisCorpus(filename).offsets.tolist(), expected
+            )
+
+    def test_stdin(self):
+        with self.assertRaises(ValueError):
+            MappedHypothesisCorpus("-")
@@ -0,0 +1,85 @@
+# MIT License
+#
+# Copyright (c) 2019 Cong Feng.
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+import unittest
+from lsdscc.bleu import _count_ngrams, _get_ngrams
+from lsdscc.memo import NgramProfileMemo, ngram_memo
+from lsdscc.metrics import compute_score_on_hypothesis_set
+
+
+class TestNgramProfileMemo(unittest.TestCase):
+    def test_lru(self):
+        memo = NgramProfileMemo(maxsize=2)
+        a, b, c = "a".split(), "b b".split(), "c c c".split()
+        memo.get(a, 4, _count_ngrams)
+        memo.get(b, 4, _count_ngrams)
+        self.assertIs(memo.get(a, 4, _count_ngrams), memo.get(a, 4, _count_ngrams))
+        memo.get(c, 4, _count_ngrams)
+        stats = memo.stats()
+        self.assertEqual((stats["hits"], stats["misses"]), (2, 3))
+        self.assertEqual(stats["entries"], 2)
+        self.assertGreater(stats["nbytes"], 0)
+
+        # b is the least recently used one.
+        memo.get(b, 4, _count_ngrams)
+        self.assertEqual(memo.stats()["misses"], 4)
+        # The max order is part of the key.
+        self.assertNotEqual(
+            memo.get(c, 1, _count_ngrams), memo.get(c, 4, _count_ngrams)
+        )
+
+        memo.resize(1)
+        self.assertEqual(len(memo), 1)
+        memo.clear()
+        self.assertEqual(memo.stats()["nbytes"], 0)
+
+    def test_disabled(self):
+        memo = NgramProfileMemo(maxsize=0)
+        memo.get("a".split(), 4, _count_ngrams)
+        self.assertEqual(len(memo), 0)
+
+    def test_get_ngrams(self):
+        segment = "the cat sat on the mat".split()
+        self.assertEqual(_get_ngrams(segment, 3), _count_ngrams(segment, 3))
+        hits = ngram_memo.hits
+        _get_ngrams(list(segment), 3)
+        self.assertEqual(ngram_memo.hits, hits + 1)
+
+
+class _CountingAligner:
+    def __init__(self):
+        self.hypotheses = []
+
+    def __call__(self, hypothesis_sentence, reference_corpus):
+        self.hypotheses.append(tuple(hypothesis_sentence))
+        return len(set(hypothesis_sentence) & set(reference_corpus[0]))
+
+
+class TestDeduplication(unittest.TestCase):
+    def test_scored_once(self):
+        hypothesis_set = ["a b".split(), "c".split(), "a b".split(), "a b".split()]
+        reference_set = [["a b".split()], ["c".split()]]
+        aligner = _CountingAligner()
+        score = compute_score_on_hypothesis_set(hypothesis_set, reference_set, aligner)
+        self.assertEqual(sorted(set(aligner.hypotheses)), [("a", "b"), ("c",)])
+        self.assertEqual(len(aligner.hypotheses), 4)
+        self.assertEqual(score, (1.0, 1.0, 1.75))
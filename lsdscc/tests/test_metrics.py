@@ -23,9 +23,12 @@
 import unittest
 from lsdscc.metrics import compute_score_on_hypothesis_set
 from lsdscc.metrics import compute_score_on_corpus
+from lsdscc.metrics import iter_scores_on_corpus, ScoreAccumulator
 from lsdscc.ds import HypothesisSet, ReferenceSet
 from lsdscc.tests.data import HYPOTHESIS_FILE, REFERENCE_FILE
 from lsdscc.align import BleuAligner
+from lsdscc.bleu import _best_group
+from lsdscc.index import ReferenceIndex
 
 
 class TestMetrics(unittest.TestCase):
@@ -73,3 +76,58 @@ class TestMetrics(unittest.TestCase):
             hypothesis_corpus, reference_corpus, aligner=BleuAligner(n=5)
         )
         print(_score)
+
+    def test_iter_scores_on_corpus(self):
+        reference_corpus = ReferenceSet.load_json_corpus()
+        hypothesis_corpus = [
+            [ref[1:] for refs in reference_set for ref in refs]
+            for reference_set in reference_corpus
+        ]
+        accumulator = ScoreAccumulator()
+        for score in iter_scores_on_corpus(
+            iter(hypothesis_corpus), ReferenceSet.iter_json_corpus()
+        ):
+            accumulator.add(score)
+        self.assertEqual(len(accumulator), len(reference_corpus))
+        self.assertEqual(
+            accumulator.mean(),
+            compute_score_on_corpus(hypothesis_corpus, reference_corpus),
+        )
+
+        with self.assertRaises(AssertionError):
+            list(iter_scores_on_corpus(hypothesis_corpus, reference_corpus[1:]))
+
+    def test_prune(self):
+        reference_corpus = ReferenceSet.load_json_corpus()
+        hypothesis_corpus = [
+            [ref[::2] for refs in reference_set for ref in refs] + [[], ["?"]]
+            for reference_set in reference_corpus
+        ]
+        for aligner in (BleuAligner(), BleuAligner(n=2)):
+            for hypothesis_set, reference_set in zip(
+                hypothesis_corpus, reference_corpus
+            ):
+                self.assertEqual(
+                    compute_score_on_hypothesis_set(
+                        hypothesis_set, reference_set, aligner, prune=True
+                    ),
+                    compute_score_on_hypothesis_set(
+                        hypothesis_set, reference_set, aligner
+                    ),
+                )
+
+    def test_best_group(self):
+        # Many groups, only one of which shares words with the hypothesis.
+        reference_set = [[("w%d x%d" % (k, k)).split()] for k in range(30)]
+        reference_set.insert(7, ["the cat sat on the mat".split()])
+        reference_set.append(["the cat sat on the mat".split()])
+        index = ReferenceIndex(reference_set)
+        k, score, n_scored = _best_group(
+            "the cat sat".split(),
+            index.merged_ngrams(),
+            index.merged_ngrams(1),
+            smooth=True,
+        )
+        scores = BleuAligner().score_index("the cat sat".split(), index)
+        self.assertEqual((k, score), (7, max(scores)))
+        self.assertEqual(n_scored, 1)
@@ -0,0 +1,153 @@
+# MIT License
+#
+# Copyright (c) 2019 Cong Feng.
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+import os
+import pathlib
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import unittest
+from lsdscc.align import MultiBleuAligner
+from lsdscc.ds import HypothesisSet, ReferenceSet
+from lsdscc.index import ReferenceIndex
+from lsdscc.metrics import compute_score_on_hypothesis_set
+from lsdscc.multi_bleu import (
+    PERL_SCRIPT,
+    corpus_multi_bleu,
+    format_multi_bleu,
+    perl_lowercase,
+    run_multi_bleu_perl,
+)
+from lsdscc.tests.data import HYPOTHESIS_FILE, REFERENCE_FILE
+
+PROJECT_ROOT = pathlib.Path(__file__).parents[2]
+_HAS_PERL = shutil.which("perl") is not None and os.path.exists(PERL_SCRIPT)
+
+
+def _random_corpus(rng, n_sentences):
+    words = ["a", "b", "c", "the", "The", "THE", "Élan", "élan"]
+
+    def sentence(min_length):
+        return [rng.choice(words) for _ in range(rng.randint(min_length, 8))]
+
+    hypotheses = [sentence(0) for _ in range(n_sentences)]
+    references = [
+        [sentence(1) for _ in range(rng.randint(1, 3))] for _ in range(n_sentences)
+    ]
+    return hypotheses, references
+
+
+class TestMultiBleu(unittest.TestCase):
+    def setUp(self):
+        self.hypothesis_set = HypothesisSet.load_corpus(HYPOTHESIS_FILE)[0]
+        self.reference_set = ReferenceSet.load_json_corpus(REFERENCE_FILE)[0]
+
+    def test_corpus_multi_bleu(self):
+        hypotheses = [["the", "cat", "sat"], ["a", "dog"]]
+        references = [[["the", "cat", "sat", "down"]], [["a", "dog"], ["dog"]]]
+        score = corpus_multi_bleu(hypotheses, references)
+        self.assertEqual(score.precisions, [1.0, 1.0, 1.0, 0])
+        self.assertEqual(score.bleu[:3], [1.0, 1.0, 1.0])
+        self.assertEqual(score.bleu[3], 0.0)
+        self.assertEqual((score.hyp_len, score.ref_len), (5, 6))
+        self.assertEqual(
+            format_multi_bleu(score),
+            "BLEU = 100.0/100.0/100.0/0.0 (BP=1.000, ratio=0.833, hyp_len=5, ref_len=6)",
+        )
+
+    def test_lowercase(self):
+        self.assertEqual(perl_lowercase(["The", "ÉLAN"]), ["the", "Élan"])
+        score = corpus_multi_bleu([["The"]], [[["the"]]], lowercase=True)
+        self.assertEqual(score.bleu[0], 1.0)
+        self.assertEqual(corpus_multi_bleu([["The"]], [[["the"]]]).bleu[0], 0.0)
+
+    def test_score_matrix(self):
+        rng = random.Random(0)
+        for _ in range(20):
+            hypotheses, reference_set = _random_corpus(rng, 4)
+            index = ReferenceIndex(reference_set)
+            for n in (1, 2, 4):
+                for lowercase in (False, True):
+                    aligner = MultiBleuAligner(n, lowercase)
+                    matrix = aligner.score_matrix(hypotheses, aligner.prepare(index))
+                    for i, h in enumerate(hypotheses):
+                        for j, refs in enumerate(reference_set):
+                            expected = corpus_multi_bleu([h], [refs], lowercase)
+                            self.assertEqual(matrix[i, j], expected.bleu[n - 1])
+                            self.assertEqual(aligner(h, refs), expected.bleu[n - 1])
+
+    def test_aligner(self):
+        aligner = MultiBleuAligner(lowercase=True)
+        self.assertEqual(aligner.cache_key(), "MultiBleuAligner(n=4, lowercase=True)")
+        score = compute_score_on_hypothesis_set(
+            self.hypothesis_set, self.reference_set, aligner
+        )
+        self.assertEqual(
+            score,
+            compute_score_on_hypothesis_set(
+                self.hypothesis_set,
+                self.reference_set,
+                lambda h, refs: corpus_multi_bleu([h], [refs], True).bleu[3],
+            ),
+        )
+
+    @unittest.skipUnless(_HAS_PERL, "perl or multi-bleu.pl is not available")
+    def test_perl_parity(self):
+        rng = random.Random(1)
+        for _ in range(10):
+            hypotheses, references = _random_corpus(rng, 5)
+            for lowercase in (False, True):
+                self.assertEqual(
+                    run_multi_bleu_perl(hypotheses, references, lowercase),
+                    format_multi_bleu(
+                        corpus_multi_bleu(hypotheses, references, lowercase)
+                    ),
+                )
+        hypotheses = list(self.hypothesis_set)
+        references = [list(self.reference_set[0])] * len(hypotheses)
+        self.assertEqual(
+            run_multi_bleu_perl(hypotheses, references),
+            format_multi_bleu(corpus_multi_bleu(hypotheses, references)),
+        )
+
+    @unittest.skipUnless(_HAS_PERL, "perl or multi-bleu.pl is not available")
+    def test_main(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            stem = os.path.join(tmp, "ref")
+            for k in range(2):
+                with open(stem + str(k), "w") as f:
+                    for refs in self.reference_set:
+                        print(" ".join(refs[k % len(refs)]).upper(), file=f)
+            with open(os.path.join(tmp, "hyp"), "w") as f:
+                for h in self.hypothesis_set[: len(self.reference_set)]:
+                    print(" ".join(h), file=f)
+            with open(os.path.join(tmp, "hyp")) as stdin:
+                result = subprocess.run(
+                    [sys.executable, "-m", "lsdscc.multi_bleu", "-lc", stem, "--check"],
+                    stdin=stdin,
+                    stdout=subprocess.PIPE,
+                    universal_newlines=True,
+                    env=dict(os.environ, PYTHONPATH=str(PROJECT_ROOT)),
+                )
+        self.assertEqual(result.returncode, 0)
+        self.assertTrue(result.stdout.startswith("BLEU = "))
@@ -0,0 +1,143 @@
+# MIT License
+#
+# Copyright (c) 2019 Cong Feng.
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+import unittest
+import warnings
+
+import nltk.translate.bleu_score as bleu_score
+import nltk.translate.nist_score as nist_score
+from lsdscc.batch import EncodedReferences
+from lsdscc.ds import HypothesisSet, ReferenceSet
+from lsdscc.nltk_compat import (
+    SMOOTHING_METHODS,
+    NistTables,
+    nist_score_matrix,
+    nltk_bleu_score_matrix,
+)
+from lsdscc.tests.data import HYPOTHESIS_FILE, REFERENCE_FILE
+
+_BASE = "a b c a b d a b c e f a c b d e a b".split()
+
+HYPOTHESIS_SET = [
+    _BASE[:12],
+    _BASE[3:15] + "x y".split(),
+    _BASE[2:9],
+    "a b c a b c a b c".split(),
+    "a".split(),
+    "b a".split(),
+    [],
+    "x y z w".split(),
+]
+
+REFERENCE_SET = [
+    [_BASE[:14], _BASE[4:]],
+    [_BASE[2:16]],
+    ["a b c d e f".split(), "f e d c b a".split(), "a b".split()],
+]
+
+
+class TestNLTKBleuScoreMatrix(unittest.TestCase):
+    def assertParity(self, hypothesis_set, reference_set, weights, smoothing):
+        encoded = EncodedReferences(reference_set, max(len(weights), 5))
+        matrix = nltk_bleu_score_matrix(
+            hypothesis_set,
+            encoded,
+            weights=weights,
+            method=smoothing.__name__,
+            epsilon=smoothing.__self__.epsilon,
+            alpha=smoothing.__self__.alpha,
+            k=smoothing.__self__.k,
+        )
+        self.assertEqual(matrix.shape, (len(hypothesis_set), len(reference_set)))
+        with warnings.catch_warnings():
+            warnings.simplefilter("ignore")
+            for i, h in enumerate(hypothesis_set):
+                for j, refs in enumerate(reference_set):
+                    expected = bleu_score.sentence_bleu(refs, h, weights, smoothing)
+                    self.assertAlmostEqual(matrix[i, j], expected, delta=1e-9)
+
+    def test_parity(self):
+        smoothing_function = bleu_score.SmoothingFunction(epsilon=0.2, alpha=3, k=4)
+        for method in SMOOTHING_METHODS:
+            if method == "method6":
+                continue
+            for weights in [(0.25, 0.25, 0.25, 0.25), (0.5, 0.5), (0.2,) * 5]:
+                self.assertParity(
+                    HYPOTHESIS_SET,
+                    REFERENCE_SET,
+                    weights,
+                    getattr(smoothing_function, method),
+                )
+
+    def test_parity_on_test_data(self):
+        hypothesis_set = HypothesisSet.load_corpus(HYPOTHESIS_FILE)[0]
+        reference_set = ReferenceSet.load_json_corpus(REFERENCE_FILE)[0]
+        smoothing_function = bleu_score.SmoothingFunction()
+        for method in ("method0", "method1", "method4", "method7"):
+            self.assertParity(
+                hypothesis_set,
+                reference_set,
+                (0.25, 0.25, 0.25, 0.25),
+                getattr(smoothing_function, method),
+            )
+
+    def test_method6(self):
+        # method6 requires a trigram match for every pair with a unigram match.
+        hypothesis_set = [_BASE[:12], _BASE[2:10], _BASE[5:17]]
+        reference_set = [[_BASE[:15], _BASE[3:]], [_BASE[2:16]]]
+        smoothing_function = bleu_score.SmoothingFunction()
+        for weights in [(0.25, 0.25, 0.25, 0.25), (0.2,) * 5]:
+            self.assertParity(
+                hypothesis_set, reference_set, weights, smoothing_function.method6
+            )
+        with self.assertRaises(ValueError):
+            nltk_bleu_score_matrix(
+                HYPOTHESIS_SET, EncodedReferences(REFERENCE_SET), method="method6"
+            )
+
+
+class TestNistScoreMatrix(unittest.TestCase):
+    def assertParity(self, hypothesis_set, reference_set, n):
+        encoded = EncodedReferences(reference_set, n)
+        matrix = nist_score_matrix(hypothesis_set, encoded, NistTables(encoded, n))
+        self.assertEqual(matrix.shape, (len(hypothesis_set), len(reference_set)))
+        for i, h in enumerate(hypothesis_set):
+            for j, refs in enumerate(reference_set):
+                expected = nist_score.sentence_nist(refs, h, n)
+                self.assertAlmostEqual(matrix[i, j], expected, delta=1e-9)
+
+    def test_parity(self):
+        for n in (1, 2, 3, 5):
+            hypothesis_set = [h for h in HYPOTHESIS_SET if len(h) >= n]
+            self.assertParity(hypothesis_set, REFERENCE_SET, n)
+
+    def test_parity_on_test_data(self):
+        hypothesis_set = HypothesisSet.load_corpus(HYPOTHESIS_FILE)[0]
+        reference_set = ReferenceSet.load_json_corpus(REFERENCE_FILE)[0]
+        for n in (1, 3):
+            self.assertParity(
+                [h for h in hypothesis_set if len(h) >= n], reference_set, n
+            )
+
+    def test_short_hypothesis(self):
+        encoded = EncodedReferences(REFERENCE_SET, 3)
+        with self.assertRaises(ZeroDivisionError):
+            nist_score_matrix(["a b".split()], encoded, NistTables(encoded, 3))
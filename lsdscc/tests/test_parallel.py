@@ -0,0 +1,92 @@
+# MIT License
+#
+# Copyright (c) 2019 Cong Feng.
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+import concurrent.futures
+import unittest
+from lsdscc.align import BleuAligner
+from lsdscc.ds import ReferenceSet
+from lsdscc.index import ReferenceIndex
+from lsdscc.metrics import compute_score_on_corpus, compute_score_on_systems
+from lsdscc.parallel import SharedReferenceCorpus, parallel_scores, _score_chunk
+
+
+def _make_hypothesis_corpus(reference_corpus):
+    # Every reference of a query is used as a hypothesis, with the words reversed.
+    return [
+        [ref[::-1] for refs in reference_set for ref in refs]
+        for reference_set in reference_corpus
+    ]
+
+
+class TestParallel(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.reference_corpus = ReferenceSet.load_json_corpus()[:40]
+        cls.hypothesis_corpus = _make_hypothesis_corpus(cls.reference_corpus)
+
+    def test_shared_reference_corpus(self):
+        index = ReferenceIndex.from_corpus(self.reference_corpus)
+        with SharedReferenceCorpus(index) as shared:
+            self.assertEqual(len(shared), len(index))
+            query_ids, scores, _ = _score_chunk(
+                shared.name,
+                shared.offsets,
+                [3, 1],
+                [[self.hypothesis_corpus[3], self.hypothesis_corpus[1]]],
+                BleuAligner(),
+            )
+        self.assertEqual(query_ids, [3, 1])
+        self.assertEqual(len(scores), 1)
+        self.assertEqual(len(scores[0]), 2)
+
+    def test_same_as_serial(self):
+        serial = compute_score_on_corpus(self.hypothesis_corpus, self.reference_corpus)
+        for n_jobs in (2, 3):
+            score = compute_score_on_corpus(
+                self.hypothesis_corpus, self.reference_corpus, n_jobs=n_jobs
+            )
+            self.assertEqual(score, serial)
+
+    def test_no_jobs(self):
+        with self.assertRaises(ValueError):
+            compute_score_on_corpus(
+                self.hypothesis_corpus, self.reference_corpus, n_jobs=0
+            )
+        with self.assertRaises(ValueError):
+            compute_score_on_systems(
+                {"a": self.hypothesis_corpus}, self.reference_corpus, n_jobs=0
+            )
+
+    def test_executor(self):
+        aligner = BleuAligner(n=2)
+        serial = [
+            compute_score_on_corpus([hs], [rs], aligner)
+            for hs, rs in zip(self.hypothesis_corpus, self.reference_corpus)
+        ]
+        with concurrent.futures.ThreadPoolExecutor(2) as executor:
+            scores = parallel_scores(
+                self.hypothesis_corpus,
+                self.reference_corpus,
+                aligner,
+                executor=executor,
+            )
+        self.assertEqual(scores, serial)
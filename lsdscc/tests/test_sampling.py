@@ -0,0 +1,129 @@
+# MIT License
+#
+# Copyright (c) 2019 Cong Feng.
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+import os
+import subprocess
+import sys
+import tempfile
+import unittest
+from lsdscc.benchmark import SyntheticCorpusConfig, generate_corpora
+from lsdscc.benchmark.synthetic import write_hypothesis_corpus, write_reference_corpus
+from lsdscc.metrics import compute_score_on_corpus
+from lsdscc.sampling import _allocate, _strata, estimate_score_on_corpus
+from lsdscc.tests.test_shard import PROJECT_ROOT, SCRIPT
+
+
+class TestSampling(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        # Two sizes of reference sets make two strata by groups.
+        cls.hypothesis_corpus = []
+        cls.reference_corpus = []
+        for n_groups, seed in ((2, 0), (4, 1)):
+            config = SyntheticCorpusConfig(
+                n_queries=30, n_groups=n_groups, hyps_per_set=3, seed=seed
+            )
+            hypothesis_corpus, reference_corpus = generate_corpora(config)
+            cls.hypothesis_corpus.extend(hypothesis_corpus)
+            cls.reference_corpus.extend(reference_corpus)
+        cls.expected = compute_score_on_corpus(
+            cls.hypothesis_corpus, cls.reference_corpus
+        )
+
+    def test_deterministic(self):
+        estimate = estimate_score_on_corpus(
+            self.hypothesis_corpus, self.reference_corpus, 20, seed=3
+        )
+        self.assertEqual(estimate.n_sampled, 20)
+        self.assertEqual(estimate.n_queries, 60)
+        self.assertEqual(
+            estimate,
+            estimate_score_on_corpus(
+                self.hypothesis_corpus, self.reference_corpus, 20, seed=3
+            ),
+        )
+        self.assertNotEqual(
+            estimate,
+            estimate_score_on_corpus(
+                self.hypothesis_corpus, self.reference_corpus, 20, seed=4
+            ),
+        )
+        self.assertTrue(all(error > 0 for error in estimate.standard_error))
+
+    def test_full_sample(self):
+        for stratify in ("groups", "references", None):
+            estimate = estimate_score_on_corpus(
+                self.hypothesis_corpus, self.reference_corpus, 100, stratify=stratify
+            )
+            self.assertEqual(estimate.score, self.expected)
+            self.assertEqual(tuple(estimate.standard_error), (0.0, 0.0, 0.0))
+            self.assertEqual(estimate.n_sampled, 60)
+
+    def test_target_error(self):
+        small = estimate_score_on_corpus(
+            self.hypothesis_corpus, self.reference_corpus, 10
+        )
+        target = max(small.standard_error) / 2
+        estimate = estimate_score_on_corpus(
+            self.hypothesis_corpus, self.reference_corpus, 10, target_error=target
+        )
+        self.assertGreater(estimate.n_sampled, small.n_sampled)
+        self.assertLessEqual(max(estimate.standard_error), target)
+
+    def test_strata(self):
+        self.assertEqual(_strata([2, 1, 2, 1], 8), [[1, 3], [0, 2]])
+        strata = _strata(list(range(10)), 3)
+        self.assertEqual(strata, [[0, 1, 2], [3, 4, 5], [6, 7, 8, 9]])
+        self.assertEqual(_allocate([50, 30, 20], 10), [5, 3, 2])
+        self.assertEqual(_allocate([98, 1, 1], 10), [8, 1, 1])
+        self.assertEqual(_allocate([3, 3], 100), [3, 3])
+
+    def test_errors(self):
+        with self.assertRaises(ValueError):
+            estimate_score_on_corpus(
+                self.hypothesis_corpus[:-1], self.reference_corpus, 10
+            )
+        with self.assertRaises(ValueError):
+            estimate_score_on_corpus(
+                self.hypothesis_corpus, self.reference_corpus, 10, stratify="length"
+            )
+
+    def test_script(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            hypothesis_file = os.path.join(tmp, "hyp.txt")
+            reference_file = os.path.join(tmp, "ref.json")
+            # The queries of the two halves share their names.
+            write_hypothesis_corpus(self.hypothesis_corpus[:30], hypothesis_file)
+            write_reference_corpus(self.reference_corpus[:30], reference_file)
+            output = subprocess.run(
+                [sys.executable, str(SCRIPT), hypothesis_file, "-r", reference_file]
+                + ["--sample", "100", "--no_cache"],
+                capture_output=True,
+                check=True,
+                text=True,
+                env=dict(os.environ, PYTHONPATH=str(PROJECT_ROOT)),
+            )
+        expected = compute_score_on_corpus(
+            self.hypothesis_corpus[:30], self.reference_corpus[:30]
+        )
+        lines = output.stdout.splitlines()
+        self.assertEqual(lines[0], "MaxBLEU: %f +- 0.000000" % expected.max_bleu)
+        self.assertIn("estimated on 30 of 30 queries", output.stderr)
@@ -0,0 +1,193 @@
+# MIT License
+#
+# Copyright (c) 2019 Cong Feng.
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+import http.client
+import threading
+import unittest
+from lsdscc.align import NativeNistAligner
+from lsdscc.benchmark import SyntheticCorpusConfig, generate_corpora
+from lsdscc.index import ReferenceIndex
+from lsdscc.metrics import compute_score_on_corpus, compute_score_on_hypothesis_set
+from lsdscc.server import (
+    EvaluationClient,
+    EvaluationServer,
+    LatencyStats,
+    MicroBatcher,
+)
+
+
+class TestLatencyStats(unittest.TestCase):
+    def test_summary(self):
+        stats = LatencyStats(window=100)
+        self.assertEqual(stats.summary()["p50"], None)
+        for i in range(1, 201):
+            stats.add(i / 1000)
+        summary = stats.summary()
+        self.assertEqual(summary["count"], 200)
+        self.assertAlmostEqual(summary["mean"], 0.1005)
+        self.assertEqual(summary["max"], 0.2)
+        # The percentiles are over the last 100 requests.
+        self.assertEqual(summary["p50"], 0.15)
+        self.assertEqual(summary["p99"], 0.199)
+
+
+class TestServer(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.hypothesis_corpus, cls.reference_corpus = generate_corpora(
+            SyntheticCorpusConfig(n_queries=8, n_groups=4, hyps_per_set=5)
+        )
+
+    def test_micro_batcher(self):
+        index = ReferenceIndex.from_corpus(self.reference_corpus)
+        # A long wait so that everything submitted makes a single batch.
+        batcher = MicroBatcher(index, max_wait=1.0, max_batch_size=3)
+        try:
+            futures = [
+                batcher.submit(0, self.hypothesis_corpus[0]),
+                batcher.submit(1, self.hypothesis_corpus[1]),
+                batcher.submit(0, self.hypothesis_corpus[0][:2]),
+            ]
+            for future, hypothesis_set, query_id in zip(
+                futures,
+                [self.hypothesis_corpus[0], self.hypothesis_corpus[1]]
+                + [self.hypothesis_corpus[0][:2]],
+                [0, 1, 0],
+            ):
+                self.assertEqual(
+                    future.result(),
+                    compute_score_on_hypothesis_set(
+                        hypothesis_set, self.reference_corpus[query_id]
+                    ),
+                )
+            # The hypothesis sets of both queries are scored together.
+            self.assertEqual(
+                batcher.stats(),
+                {"count": 1, "mean_size": 3, "max_size": 3, "aligner_calls": 1},
+            )
+            with self.assertRaises(ValueError):
+                batcher.submit(len(index), [])
+
+            # A bad hypothesis set fails alone.
+            bad = batcher.submit(2, [["a", ["b"]]])
+            good = [
+                batcher.submit(1, self.hypothesis_corpus[1]),
+                batcher.submit(0, self.hypothesis_corpus[0][:2]),
+            ]
+            self.assertEqual(good[0].result(), futures[1].result())
+            self.assertEqual(good[1].result(), futures[2].result())
+            with self.assertRaises(TypeError):
+                bad.result()
+        finally:
+            batcher.close()
+
+    def test_micro_batcher_by_query(self):
+        index = ReferenceIndex.from_corpus(self.reference_corpus)
+        aligner = NativeNistAligner(n=2)
+        batcher = MicroBatcher(index, aligner, max_wait=1.0, max_batch_size=3)
+        try:
+            futures = [
+                batcher.submit(query_id, self.hypothesis_corpus[query_id])
+                for query_id in (0, 1, 0)
+            ]
+            for future, query_id in zip(futures, (0, 1, 0)):
+                self.assertEqual(
+                    future.result(),
+                    compute_score_on_hypothesis_set(
+                        self.hypothesis_corpus[query_id],
+                        self.reference_corpus[query_id],
+                        aligner,
+                    ),
+                )
+            # Without score_matrices, the hypothesis sets of query 0 are scored together.
+            self.assertEqual(batcher.stats()["aligner_calls"], 2)
+        finally:
+            batcher.close()
+
+    def test_client(self):
+        expected = compute_score_on_corpus(
+            self.hypothesis_corpus, self.reference_corpus
+        )
+        with EvaluationServer(self.reference_corpus) as server:
+            with EvaluationClient(server.url) as client:
+                self.assertEqual(client.health(), {"status": "ok", "n_queries": 8})
+                self.assertEqual(
+                    client.score_corpus(self.hypothesis_corpus, batch_size=3), expected
+                )
+                query = self.reference_corpus[2].query
+                (score,) = client.score([self.hypothesis_corpus[2]], [query])
+                self.assertEqual(
+                    score,
+                    compute_score_on_hypothesis_set(
+                        self.hypothesis_corpus[2], self.reference_corpus[2]
+                    ),
+                )
+                with self.assertRaises(ValueError):
+                    client.score([[["a"]]], ["no such query"])
+                with self.assertRaises(ValueError):
+                    client.score([[["a"]]], [8])
+                with self.assertRaises(ValueError):
+                    client.score([[["a"]]], [True])
+                with self.assertRaises(ValueError):
+                    client.score([[]], [0])
+                stats = client.stats()
+            self.assertEqual(stats["requests"]["count"], 4)
+            # The aligner is called once per batch.
+            self.assertEqual(
+                stats["batches"]["aligner_calls"], stats["batches"]["count"]
+            )
+
+            # Strings of tokens are accepted, and unknown paths are not found.
+            connection = http.client.HTTPConnection(*server.url[7:].split(":"))
+            body = '{"hypothesis_sets": [{"query_id": 0, "hypotheses": ["a b"]}]}'
+            connection.request("POST", "/score", body)
+            self.assertEqual(connection.getresponse().read()[:10], b'{"scores":')
+            connection.request("GET", "/nothing")
+            response = connection.getresponse()
+            response.read()
+            self.assertEqual(response.status, 404)
+            connection.close()
+
+    def test_concurrent_clients(self):
+        aligner = NativeNistAligner(n=2)
+        expected = [
+            compute_score_on_hypothesis_set(hs, rs, aligner)
+            for hs, rs in zip(self.hypothesis_corpus, self.reference_corpus)
+        ]
+        scores = [None] * len(expected)
+
+        def client(query_ids):
+            with EvaluationClient(server.url) as evaluation_client:
+                for i in query_ids:
+                    (scores[i],) = evaluation_client.score(
+                        [self.hypothesis_corpus[i]], [i]
+                    )
+
+        with EvaluationServer(self.reference_corpus, aligner) as server:
+            threads = [
+                threading.Thread(target=client, args=(range(k, len(scores), 4),))
+                for k in range(4)
+            ]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+        self.assertEqual(scores, expected)
@@ -0,0 +1,167 @@
+# MIT License
+#
+# Copyright (c) 2019 Cong Feng.
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+import json
+import os
+import pathlib
+import random
+import subprocess
+import sys
+import tempfile
+import unittest
+from lsdscc.benchmark import SyntheticCorpusConfig, generate_corpora
+from lsdscc.benchmark.synthetic import write_hypothesis_corpus, write_reference_corpus
+from lsdscc.metrics import ScoreAccumulator, compute_score_on_systems
+from lsdscc.shard import (
+    Partial,
+    load_partial,
+    merge_partials,
+    parse_shard,
+    save_partial,
+    score_shard,
+    shard_range,
+)
+
+PROJECT_ROOT = pathlib.Path(__file__).parents[2]
+SCRIPT = PROJECT_ROOT / "bin" / "lsdscc_metrics.py"
+
+
+class TestShard(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        config = SyntheticCorpusConfig(n_queries=23, n_groups=3, hyps_per_set=3)
+        hypothesis_corpus, cls.reference_corpus = generate_corpora(config)
+        cls.hypothesis_corpora = {
+            "original": hypothesis_corpus,
+            "truncated": [[h[:2] for h in hs] for hs in hypothesis_corpus],
+        }
+        cls.expected = compute_score_on_systems(
+            cls.hypothesis_corpora, cls.reference_corpus
+        )
+
+    def _partials(self, n_shards):
+        return [
+            Partial(
+                shard,
+                n_shards,
+                len(self.reference_corpus),
+                "reference",
+                score_shard(
+                    self.hypothesis_corpora, self.reference_corpus, shard, n_shards
+                ),
+            )
+            for shard in range(n_shards)
+        ]
+
+    def test_shard_range(self):
+        self.assertEqual(parse_shard("2/5"), (2, 5))
+        for text in ("5/5", "-1/5", "1", "a/b"):
+            with self.assertRaises(ValueError):
+                parse_shard(text)
+        for n_queries, n_shards in ((10, 3), (2, 5), (0, 2), (7, 7)):
+            queries = [
+                i
+                for shard in range(n_shards)
+                for i in shard_range(n_queries, shard, n_shards)
+            ]
+            self.assertEqual(queries, list(range(n_queries)))
+
+    def test_merge_is_exact(self):
+        for n_shards in (1, 4, 30):
+            partials = self._partials(n_shards)
+            random.Random(n_shards).shuffle(partials)
+            merged = merge_partials(partials)
+            self.assertEqual(
+                {name: accumulator.mean() for name, accumulator in merged.items()},
+                self.expected,
+            )
+
+    def test_save_and_load(self):
+        partial = self._partials(3)[1]
+        with tempfile.TemporaryDirectory() as tmp:
+            filename = os.path.join(tmp, "partial.json")
+            save_partial(filename, partial)
+            loaded = load_partial(filename)
+        self.assertEqual(loaded[:4], partial[:4])
+        for name, accumulator in partial.accumulators.items():
+            self.assertEqual(loaded.accumulators[name].to_dict(), accumulator.to_dict())
+            self.assertEqual(loaded.accumulators[name].mean(), accumulator.mean())
+
+    def test_merge_errors(self):
+        partials = self._partials(3)
+        with self.assertRaises(ValueError):
+            merge_partials(partials[:2])
+        with self.assertRaises(ValueError):
+            merge_partials(partials + partials[:1])
+        with self.assertRaises(ValueError):
+            merge_partials(partials[:2] + [partials[2]._replace(reference="other")])
+        with self.assertRaises(ValueError):
+            merge_partials([])
+
+    def test_accumulator_merge(self):
+        scores = list(self.expected.values()) * 3
+        head, tail = ScoreAccumulator(), ScoreAccumulator(start=2)
+        for score in scores[:2]:
+            head.add(score)
+        for score in scores[2:]:
+            tail.add(score)
+        head.merge(tail)
+        self.assertEqual(len(head), len(scores))
+        self.assertIsNone(head.scores)
+        with self.assertRaises(ValueError):
+            head.merge(ScoreAccumulator(start=2))
+
+    def test_script(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            reference_file = os.path.join(tmp, "reference.json")
+            write_reference_corpus(self.reference_corpus, reference_file)
+            hypothesis_file = os.path.join(tmp, "hypothesis.txt")
+            write_hypothesis_corpus(
+                self.hypothesis_corpora["original"], hypothesis_file
+            )
+            common = [hypothesis_file, "-r", reference_file, "--no_cache"]
+            partial_files = []
+            for shard in range(3):
+                partial_files.append(os.path.join(tmp, "partial%d.json" % shard))
+                _run_script(
+                    *common,
+                    "--shard",
+                    "%d/3" % shard,
+                    "--shard_output",
+                    partial_files[-1],
+                )
+            merged = _run_script("merge", "--format", "json", *partial_files)
+            expected = _run_script(*common, "--format", "json")
+        self.assertEqual(merged, expected)
+        self.assertEqual(
+            json.loads(merged)[0]["max_bleu"], self.expected["original"].max_bleu
+        )
+
+
+def _run_script(*args):
+    env = dict(os.environ, PYTHONPATH=str(PROJECT_ROOT))
+    return subprocess.run(
+        [sys.executable, str(SCRIPT), *args],
+        env=env,
+        stdout=subprocess.PIPE,
+        universal_newlines=True,
+        check=True,
+    ).stdout
@@ -0,0 +1,169 @@
+# MIT License
+#
+# Copyright (c) 2019 Cong Feng.
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+import concurrent.futures
+import csv
+import io
+import json
+import unittest
+from unittest import mock
+import numpy as np
+import lsdscc.significance as significance
+from lsdscc.benchmark import SyntheticCorpusConfig, generate_corpora
+from lsdscc.metrics import (
+    LSDSCCScore,
+    compute_query_scores_on_systems,
+    compute_score_on_systems,
+)
+from lsdscc.significance import (
+    approximate_randomization_test,
+    bootstrap_confidence_interval,
+    paired_bootstrap_test,
+)
+from lsdscc.systems import format_score_table
+
+
+class TestSignificance(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        config = SyntheticCorpusConfig(n_queries=60, n_groups=3, hyps_per_set=4)
+        hypothesis_corpus, cls.reference_corpus = generate_corpora(config)
+        cls.hypothesis_corpora = {
+            "original": hypothesis_corpus,
+            "truncated": [[h[:2] for h in hs] for hs in hypothesis_corpus],
+        }
+        cls.query_scores = compute_query_scores_on_systems(
+            cls.hypothesis_corpora, cls.reference_corpus
+        )
+        cls.scores = compute_score_on_systems(
+            cls.hypothesis_corpora, cls.reference_corpus
+        )
+
+    def test_query_scores(self):
+        self.assertEqual(list(self.query_scores), list(self.hypothesis_corpora))
+        for scores in self.query_scores.values():
+            self.assertEqual(len(scores), len(self.reference_corpus))
+            self.assertIsInstance(scores[0], LSDSCCScore)
+        with concurrent.futures.ThreadPoolExecutor(2) as executor:
+            query_scores = compute_query_scores_on_systems(
+                self.hypothesis_corpora, self.reference_corpus, executor=executor
+            )
+        self.assertEqual(query_scores, self.query_scores)
+
+    def test_confidence_interval(self):
+        scores = self.query_scores["original"]
+        interval = bootstrap_confidence_interval(scores, n_resamples=500)
+        self.assertEqual(interval.estimate, self.scores["original"])
+        for field in LSDSCCScore._fields:
+            low = getattr(interval.low, field)
+            high = getattr(interval.high, field)
+            self.assertLessEqual(low, getattr(interval.estimate, field))
+            self.assertGreaterEqual(high, getattr(interval.estimate, field))
+            self.assertLess(low, high)
+        self.assertEqual(bootstrap_confidence_interval(scores, 500), interval)
+        self.assertNotEqual(
+            bootstrap_confidence_interval(scores, 500, seed=1), interval
+        )
+        narrow = bootstrap_confidence_interval(scores, 500, confidence=0.5)
+        self.assertGreater(narrow.low.max_bleu, interval.low.max_bleu)
+        with self.assertRaises(ValueError):
+            bootstrap_confidence_interval(scores, confidence=1)
+        with self.assertRaises(ValueError):
+            bootstrap_confidence_interval([])
+
+    def test_blocks(self):
+        # The resamples are the same however they are split into blocks.
+        a, b = self.query_scores.values()
+        expected = (
+            bootstrap_confidence_interval(a, 100),
+            paired_bootstrap_test(a, b, 100),
+            approximate_randomization_test(a, b, 100),
+        )
+        with mock.patch.object(significance, "_BLOCK_SIZE", 7 * len(a)):
+            actual = (
+                bootstrap_confidence_interval(a, 100),
+                paired_bootstrap_test(a, b, 100),
+                approximate_randomization_test(a, b, 100),
+            )
+        for x, y in zip(actual, expected):
+            np.testing.assert_allclose(x, y)
+
+    def test_paired_tests(self):
+        a, b = self.query_scores.values()
+        for test in (paired_bootstrap_test, approximate_randomization_test):
+            result = test(a, b, n_resamples=500)
+            self.assertEqual(
+                result.difference,
+                LSDSCCScore(
+                    *(
+                        y - x
+                        for x, y in zip(
+                            self.scores["original"], self.scores["truncated"]
+                        )
+                    )
+                ),
+            )
+            # Truncating every hypothesis to two tokens is clearly worse.
+            self.assertLess(result.p_value.max_bleu, 0.01)
+            self.assertEqual(test(a, b, n_resamples=500), result)
+
+            same = test(a, a, n_resamples=500)
+            self.assertEqual(same.difference, LSDSCCScore(0.0, 0.0, 0.0))
+            self.assertEqual(same.p_value, LSDSCCScore(1.0, 1.0, 1.0))
+
+            with self.assertRaises(ValueError):
+                test(a, b[:-1])
+
+        swapped = approximate_randomization_test(b, a, n_resamples=500)
+        result = approximate_randomization_test(a, b, n_resamples=500)
+        self.assertEqual(swapped.p_value, result.p_value)
+
+    def test_format_score_table(self):
+        a, b = self.query_scores.values()
+        intervals = {
+            name: bootstrap_confidence_interval(scores, 100)
+            for name, scores in self.query_scores.items()
+        }
+        tests = {"truncated": paired_bootstrap_test(a, b, 100)}
+
+        text = format_score_table(self.scores, "text", intervals, tests).splitlines()
+        self.assertEqual(text[0].split()[-3:], ["p(MaxBLEU)", "p(MDS)", "p(PDS)"])
+        interval = intervals["original"]
+        self.assertIn(
+            "%f [%f, %f]"
+            % (interval.estimate.mds, interval.low.mds, interval.high.mds),
+            text[1],
+        )
+        self.assertEqual(text[1].split()[-3:], ["-"] * 3)
+
+        rows = json.loads(format_score_table(self.scores, "json", intervals, tests))
+        self.assertEqual(rows[0]["pds_high"], intervals["original"].high.pds)
+        self.assertIsNone(rows[0]["pds_p"])
+        self.assertEqual(rows[1]["pds_p"], tests["truncated"].p_value.pds)
+
+        rows = list(
+            csv.DictReader(
+                io.StringIO(format_score_table(self.scores, "csv", tests=tests))
+            )
+        )
+        self.assertNotIn("mds_low", rows[0])
+        self.assertEqual(rows[0]["mds_p"], "")
+        self.assertEqual(float(rows[1]["mds_p"]), tests["truncated"].p_value.mds)
@@ -0,0 +1,108 @@
+# MIT License
+#
+# Copyright (c) 2019 Cong Feng.
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+import os
+import pathlib
+import subprocess
+import sys
+import time
+import unittest
+import lsdscc
+from lsdscc.tests.data import HYPOTHESIS_FILE, REFERENCE_FILE
+
+PROJECT_ROOT = pathlib.Path(__file__).parents[2]
+SCRIPT = PROJECT_ROOT / "bin" / "lsdscc_metrics.py"
+
+# The wall time allowed for ``lsdscc_metrics.py --help``, which takes about 0.05s
+# (0.02s of which is the interpreter) on a laptop.
+HELP_BUDGET_SECONDS = 0.5
+
+
+def _run_python(*args):
+    env = dict(os.environ, PYTHONPATH=str(PROJECT_ROOT))
+    return subprocess.run(
+        [sys.executable, *map(str, args)],
+        env=env,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+        universal_newlines=True,
+        check=True,
+    )
+
+
+def _imported_modules(code):
+    """
+    Run the code in a fresh interpreter and return the names of the modules it imported.
+    """
+    code += "\nimport sys\nprint(' '.join(sorted(sys.modules)))"
+    return set(_run_python("-c", code).stdout.split())
+
+
+class TestStartup(unittest.TestCase):
+    def test_import_is_lazy(self):
+        modules = _imported_modules("import lsdscc")
+        self.assertNotIn("numpy", modules)
+        self.assertEqual({m for m in modules if m.startswith("lsdscc")}, {"lsdscc"})
+
+        modules = _imported_modules("from lsdscc import *\nHypothesisSet")
+        self.assertIn("lsdscc.metrics", modules)
+        self.assertNotIn("numpy", modules)
+
+    def test_submodule_attributes(self):
+        output = _run_python(
+            "-c",
+            "import lsdscc\n"
+            "print(lsdscc.metrics.compute_score_on_corpus.__name__)\n"
+            "print(lsdscc.ds.HypothesisSet.__name__, lsdscc.align.__name__)",
+        ).stdout
+        self.assertEqual(
+            output.split(), ["compute_score_on_corpus", "HypothesisSet", "lsdscc.align"]
+        )
+        import lsdscc
+
+        with self.assertRaises(AttributeError) as context:
+            lsdscc.no_such_module
+        self.assertIsNone(context.exception.__cause__)
+        self.assertTrue(context.exception.__suppress_context__)
+
+    def test_metrics_names(self):
+        for name in lsdscc.metrics.__all__:
+            self.assertIn(name, lsdscc.__all__)
+            self.assertIs(getattr(lsdscc, name), getattr(lsdscc.metrics, name))
+
+    def test_prune_does_not_need_numpy(self):
+        modules = _imported_modules(
+            "from lsdscc import *\n"
+            "hypothesis_corpus = HypothesisSet.load_corpus(%r)\n"
+            "reference_corpus = ReferenceSet.load_json_corpus(%r)\n"
+            "compute_score_on_corpus(hypothesis_corpus, reference_corpus, prune=True)"
+            % (str(HYPOTHESIS_FILE), str(REFERENCE_FILE))
+        )
+        self.assertNotIn("numpy", modules)
+
+    def test_help_budget(self):
+        elapsed = float("inf")
+        for _ in range(3):
+            start = time.perf_counter()
+            output = _run_python(SCRIPT, "--help").stdout
+            elapsed = min(elapsed, time.perf_counter() - start)
+        self.assertIn("usage", output)
+        self.assertLess(elapsed, HELP_BUDGET_SECONDS)
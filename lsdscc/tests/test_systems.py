@@ -0,0 +1,127 @@
+# MIT License
+#
+# Copyright (c) 2019 Cong Feng.
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+import concurrent.futures
+import csv
+import io
+import json
+import os
+import tempfile
+import unittest
+from lsdscc.align import BleuAligner
+from lsdscc.ds import HypothesisSet, ReferenceSet
+from lsdscc.metrics import compute_score_on_corpus, compute_score_on_systems
+from lsdscc.systems import (
+    compute_score_on_files,
+    expand_hypothesis_files,
+    format_score_table,
+)
+from lsdscc.tests.data import HYPOTHESIS_FILE, REFERENCE_FILE
+
+
+class TestSystems(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.reference_corpus = ReferenceSet.load_json_corpus(REFERENCE_FILE)
+        hypothesis_corpus = HypothesisSet.load_corpus(HYPOTHESIS_FILE)
+        cls.hypothesis_corpora = {
+            "original": hypothesis_corpus,
+            "reversed": [[h[::-1] for h in hs] for hs in hypothesis_corpus],
+            "truncated": [[h[:3] for h in hs] for hs in hypothesis_corpus],
+        }
+        cls.expected = {
+            name: compute_score_on_corpus(corpus, cls.reference_corpus)
+            for name, corpus in cls.hypothesis_corpora.items()
+        }
+
+    def test_same_as_corpus(self):
+        scores = compute_score_on_systems(
+            self.hypothesis_corpora, self.reference_corpus
+        )
+        self.assertEqual(scores, self.expected)
+        self.assertEqual(list(scores), list(self.hypothesis_corpora))
+
+    def test_iterables(self):
+        scores = compute_score_on_systems(
+            {name: iter(corpus) for name, corpus in self.hypothesis_corpora.items()},
+            iter(self.reference_corpus),
+        )
+        self.assertEqual(scores, self.expected)
+
+    def test_executor(self):
+        aligner = BleuAligner()
+        with concurrent.futures.ThreadPoolExecutor(2) as executor:
+            scores = compute_score_on_systems(
+                self.hypothesis_corpora,
+                self.reference_corpus,
+                aligner,
+                executor=executor,
+            )
+        self.assertEqual(scores, self.expected)
+
+    def test_length_mismatch(self):
+        with self.assertRaises(AssertionError):
+            compute_score_on_systems(
+                {"short": self.hypothesis_corpora["original"][:-1]},
+                self.reference_corpus,
+            )
+
+    def test_files(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            for name, corpus in self.hypothesis_corpora.items():
+                with open(os.path.join(tmp, name + ".txt"), "w") as f:
+                    for hypothesis_set in corpus:
+                        print(" </s> ".join(map(" ".join, hypothesis_set)), file=f)
+            pattern = os.path.join(tmp, "*.txt")
+            original = os.path.join(tmp, "original.txt")
+            filenames = expand_hypothesis_files([original, pattern])
+            self.assertEqual(
+                filenames,
+                [os.path.join(tmp, name + ".txt") for name in self.hypothesis_corpora],
+            )
+            with self.assertRaises(ValueError):
+                expand_hypothesis_files([os.path.join(tmp, "*.json")])
+            scores = compute_score_on_files([pattern], self.reference_corpus)
+        self.assertEqual(list(scores.values()), list(self.expected.values()))
+
+    def test_format_score_table(self):
+        text = format_score_table(self.expected).splitlines()
+        self.assertEqual(text[0].split(), ["system", "MaxBLEU", "MDS", "PDS"])
+        score = self.expected["original"]
+        self.assertEqual(
+            text[1].split(),
+            ["original"] + ["%f" % v for v in (score.max_bleu, score.mds, score.pds)],
+        )
+        self.assertEqual(len({len(line) for line in text}), 1)
+
+        rows = json.loads(format_score_table(self.expected, "json"))
+        self.assertEqual([row["system"] for row in rows], list(self.expected))
+        self.assertEqual(rows[1]["mds"], self.expected["reversed"].mds)
+
+        rows = list(
+            csv.DictReader(io.StringIO(format_score_table(self.expected, "csv")))
+        )
+        self.assertEqual(
+            float(rows[2]["max_bleu"]), self.expected["truncated"].max_bleu
+        )
+
+        with self.assertRaises(ValueError):
+            format_score_table(self.expected, "xml")
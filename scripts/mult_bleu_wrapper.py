@@ -53,6 +53,9 @@ def compute_multi_bleu(translation, references, ignore_case=False):
     """
     Compute BLEU-1 to BLEU-4 using the moses multi-bleu.pl script.
 
+    This forks the script for every call. ``lsdscc.align.MultiBleuAligner`` and
+    ``lsdscc.multi_bleu.corpus_multi_bleu`` give the same scores in-process.
+
     Reference file and system output have to be sentence-aligned (line X in the reference file corresponds to line X
     in the system output). If multiple reference translation exist, these have to be stored in separated files and
     named reference0, reference1, reference2, etc. All the texts need to be tokenized.
@@ -40,6 +40,7 @@ setup(
     ],
     packages=[
         'lsdscc',
+        'lsdscc.benchmark',
         'lsdscc.tests',
     ],
     package_data={